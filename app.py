@@ -1,213 +1,1168 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, session, Response, stream_with_context, g
+import bisect
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import io
+import ipaddress
+import itertools
 import json
-import random
+import marshal
+import math
+import mmap
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
 
-app = Flask(__name__)
-app.secret_key = 'healthai_secret_2025'
-
-# Mock symptom database with conditions, severity, and recommendations
-SYMPTOM_DATABASE = {
-    "fever": {
-        "conditions": ["Common Cold", "Flu", "Malaria", "Dengue", "Typhoid"],
-        "severity_weight": 2
-    },
-    "cough": {
-        "conditions": ["Common Cold", "Flu", "Bronchitis", "Tuberculosis", "COVID-19"],
-        "severity_weight": 2
-    },
-    "headache": {
-        "conditions": ["Migraine", "Tension Headache", "Dengue", "Hypertension", "Sinusitis"],
-        "severity_weight": 1
-    },
-    "chest pain": {
-        "conditions": ["Angina", "Heart Attack", "Pneumonia", "Anxiety", "GERD"],
-        "severity_weight": 5
-    },
-    "shortness of breath": {
-        "conditions": ["Asthma", "Pneumonia", "Heart Failure", "COVID-19", "Anemia"],
-        "severity_weight": 5
-    },
-    "fatigue": {
-        "conditions": ["Anemia", "Diabetes", "Thyroid Disorder", "Depression", "Malaria"],
-        "severity_weight": 1
-    },
-    "nausea": {
-        "conditions": ["Gastroenteritis", "Food Poisoning", "Migraine", "Pregnancy", "Appendicitis"],
-        "severity_weight": 2
-    },
-    "vomiting": {
-        "conditions": ["Gastroenteritis", "Food Poisoning", "Appendicitis", "Migraine"],
-        "severity_weight": 3
-    },
-    "diarrhea": {
-        "conditions": ["Gastroenteritis", "Food Poisoning", "Cholera", "IBS", "Typhoid"],
-        "severity_weight": 3
-    },
-    "abdominal pain": {
-        "conditions": ["Appendicitis", "Gastritis", "IBS", "Kidney Stones", "Peptic Ulcer"],
-        "severity_weight": 3
-    },
-    "rash": {
-        "conditions": ["Dengue", "Chickenpox", "Allergy", "Measles", "Typhoid"],
-        "severity_weight": 2
-    },
-    "joint pain": {
-        "conditions": ["Arthritis", "Dengue", "Chikungunya", "Gout", "Lupus"],
-        "severity_weight": 2
-    },
-    "back pain": {
-        "conditions": ["Muscle Strain", "Kidney Infection", "Herniated Disc", "Osteoporosis"],
-        "severity_weight": 2
-    },
-    "dizziness": {
-        "conditions": ["Vertigo", "Low Blood Pressure", "Anemia", "Dehydration", "Inner Ear Infection"],
-        "severity_weight": 2
-    },
-    "sore throat": {
-        "conditions": ["Strep Throat", "Tonsillitis", "Common Cold", "Flu"],
-        "severity_weight": 1
-    },
-    "runny nose": {
-        "conditions": ["Common Cold", "Flu", "Allergic Rhinitis", "Sinusitis"],
-        "severity_weight": 1
-    },
-    "high fever": {
-        "conditions": ["Malaria", "Dengue", "Typhoid", "Sepsis", "Severe Flu"],
-        "severity_weight": 4
-    },
-    "unconscious": {
-        "conditions": ["Stroke", "Heart Attack", "Severe Hypoglycemia", "Seizure", "Severe Dehydration"],
-        "severity_weight": 10
-    },
-    "blurred vision": {
-        "conditions": ["Diabetes", "Hypertension", "Migraine", "Glaucoma", "Stroke"],
-        "severity_weight": 4
-    },
-    "swelling": {
-        "conditions": ["Heart Failure", "Kidney Disease", "Liver Disease", "DVT", "Allergy"],
-        "severity_weight": 3
-    }
+import numpy as np
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Routes are registered on this blueprint; create_app() (end of file) builds the app
+bp = Blueprint('healthai', __name__)
+
+# ─── Shared helpers ────────────────────────────────────────────────────────────
+def parse_flag(value):
+    # CSV cells arrive as text, so "no"/"false"/"0" must not count as yes
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+class VersionedDict(dict):
+    # Any top-level write bumps `version`, letting caches built from a table
+    # notice it changed. Replace whole entries instead of editing nested values.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+class VersionedList(list):
+    # List counterpart of VersionedDict
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, value):
+        super().append(value)
+        self._changed()
+
+    def extend(self, values):
+        super().extend(values)
+        self._changed()
+
+    def insert(self, index, value):
+        super().insert(index, value)
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def remove(self, value):
+        super().remove(value)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+class LRUCache:
+    # Thread-safe bounded mapping with least-recently-used eviction
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+# ─── Metrics ───────────────────────────────────────────────────────────────────
+# Request metrics are on unless METRICS=0; per-function timers are opt-in with
+# METRICS_HOT_PATHS=1. When off, no hooks are registered and @timed returns the
+# function unchanged, so disabled metrics cost nothing per request.
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+METRICS_HOT_PATHS = METRICS_ENABLED and os.environ.get('METRICS_HOT_PATHS', '0') == '1'
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric:
+    # Minimal Prometheus counter/gauge/histogram keyed by a tuple of label values
+    def __init__(self, name, help_text, kind, labels, buckets=None):
+        self.name, self.help_text, self.kind, self.labels = name, help_text, kind, labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), then the running sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def dump(self):
+        with self._lock:
+            return [[list(k), list(v) if isinstance(v, list) else v] for k, v in self._series.items()]
+
+    def render(self, other_dumps=()):
+        # other_dumps: series from the other worker processes, added in
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        merged = {}
+        for dump in [self.dump(), *other_dumps]:
+            for label_values, value in dump:
+                key = tuple(label_values)
+                if key not in merged:
+                    merged[key] = value
+                elif isinstance(value, list):
+                    merged[key] = [a + b for a, b in zip(merged[key], value)]
+                else:
+                    merged[key] += value
+        series = sorted(merged.items())
+        for label_values, value in series:
+            labels = ','.join(f'{k}="{_label_value(v)}"' for k, v in zip(self.labels, label_values))
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{{{labels}}} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {value[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+REQUEST_LATENCY = Metric('healthai_http_request_duration_seconds', 'Time to build the response', 'histogram', ('endpoint', 'method'), LATENCY_BUCKETS)
+REQUESTS_TOTAL = Metric('healthai_http_requests_total', 'Responses by status code', 'counter', ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Metric('healthai_http_requests_in_flight', 'Requests being handled (open streams included)', 'gauge', ('endpoint',))
+REQUEST_SIZE = Metric('healthai_http_request_size_bytes', 'Request body size', 'histogram', ('endpoint',), SIZE_BUCKETS)
+RESPONSE_SIZE = Metric('healthai_http_response_size_bytes', 'Response body size (non-streamed)', 'histogram', ('endpoint',), SIZE_BUCKETS)
+FUNCTION_LATENCY = Metric('healthai_function_duration_seconds', 'Hot-path function time (METRICS_HOT_PATHS=1)', 'histogram', ('function',), LATENCY_BUCKETS)
+ADMISSION_WAIT = Metric('healthai_admission_wait_seconds', 'Time admitted requests queued for a slot', 'histogram', ('class',), LATENCY_BUCKETS)
+ADMISSION_REJECTED = Metric('healthai_admission_rejected_total', 'Requests turned away (429 rate limit, 503 overload)', 'counter', ('class', 'status'))
+METRICS = [REQUEST_LATENCY, REQUESTS_TOTAL, REQUESTS_IN_FLIGHT, REQUEST_SIZE, RESPONSE_SIZE, FUNCTION_LATENCY, ADMISSION_WAIT, ADMISSION_REJECTED]
+
+def timed(name):
+    def decorate(fn):
+        if not METRICS_HOT_PATHS:
+            return fn
+        label = (name,)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                FUNCTION_LATENCY.observe(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def _metrics_endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def _metrics_before_request():
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc((_metrics_endpoint(),))
+
+def _metrics_after_request(response):
+    endpoint = _metrics_endpoint()
+    REQUEST_LATENCY.observe((endpoint, request.method), time.perf_counter() - g.metrics_start)
+    REQUESTS_TOTAL.inc((endpoint, request.method, str(response.status_code)))
+    if request.content_length:
+        REQUEST_SIZE.observe((endpoint,), request.content_length)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_SIZE.observe((endpoint,), response.content_length)
+    g.metrics_recorded = True
+    return response
+
+def _metrics_teardown_request(exc):
+    if 'metrics_start' not in g:
+        return
+    endpoint = _metrics_endpoint()
+    REQUESTS_IN_FLIGHT.inc((endpoint,), -1)
+    if not g.get('metrics_recorded'):
+        # Unhandled exception: after_request never ran
+        REQUEST_LATENCY.observe((endpoint, request.method), time.perf_counter() - g.metrics_start)
+        REQUESTS_TOTAL.inc((endpoint, request.method, '500'))
+
+# ─── Admission Control ─────────────────────────────────────────────────────────
+# Each worker admits at most ADMISSION_MAX_INFLIGHT requests at once. The rest
+# queue by class priority, so a surge of content traffic can't hold up triage
+# and booking. Other classes may use only part of the in-flight limit, and
+# each client has a token bucket per class. Such a request is turned away with
+# Retry-After when its client is over rate (429), or when its expected or
+# actual wait for a slot exceeds its class's latency budget (503). Triage is
+# never turned away: clinics behind one NAT or proxy share an address, so it
+# has no per-client limit, and once it has waited its budget it runs anyway.
+# Waiters yield once before slots are handed out, so under gevent every request
+# that has arrived is in the queue when the next one is picked; triage takes a
+# free slot straight away, since nothing would be picked before it.
+# class: (priority, share of the in-flight limit, queue budget in seconds,
+#         per-client requests/second, burst); rate None: never rejected
+ADMISSION_CLASSES = {
+    "triage": (0, 1.0, 2.0, None, None),
+    "standard": (1, 0.75, 1.0, 20, 60),
+    "content": (2, 0.5, 0.25, 10, 30),
+}
+# Endpoints outside the default "standard" class; None is never queued
+# (long-lived streams and monitoring)
+ADMISSION_ROUTE_CLASSES = {
+    "analyze": "triage", "save_history": "triage", "get_doctor_slots": "triage", "book_appointment": "triage",
+    "get_education": "content", "search_education": "content", "api_chatbot": "content", "translate": "content",
+    "get_medicines": "content", "knowledge_base_info": "content",
+    "event_stream": None, "metrics": None, "cache_stats": None,
 }
+ADMISSION_MAX_CLIENTS = 100000  # token buckets kept (least recently seen dropped first)
 
-CONDITION_INFO = {
-    "Common Cold": {"type": "mild", "description": "Viral infection of upper respiratory tract"},
-    "Flu": {"type": "moderate", "description": "Influenza - contagious respiratory illness"},
-    "Malaria": {"type": "severe", "description": "Mosquito-borne parasitic infection - needs immediate attention"},
-    "Dengue": {"type": "severe", "description": "Mosquito-borne viral infection - monitor platelet count"},
-    "Typhoid": {"type": "severe", "description": "Bacterial infection spread through contaminated food/water"},
-    "Tuberculosis": {"type": "severe", "description": "Bacterial lung infection - requires long-term treatment"},
-    "Bronchitis": {"type": "moderate", "description": "Inflammation of bronchial tubes"},
-    "COVID-19": {"type": "severe", "description": "Coronavirus infection - isolate and consult doctor"},
-    "Migraine": {"type": "moderate", "description": "Severe recurring headaches often with nausea"},
-    "Heart Attack": {"type": "emergency", "description": "EMERGENCY - Call ambulance immediately"},
-    "Stroke": {"type": "emergency", "description": "EMERGENCY - Call ambulance immediately"},
-    "Pneumonia": {"type": "severe", "description": "Lung infection - needs immediate medical attention"},
-    "Appendicitis": {"type": "emergency", "description": "EMERGENCY - Requires immediate surgery"},
-    "Asthma": {"type": "moderate", "description": "Chronic airway inflammation - use inhaler if prescribed"},
-    "Anemia": {"type": "moderate", "description": "Low blood iron/hemoglobin - diet and supplements needed"},
-    "Diabetes": {"type": "moderate", "description": "Blood sugar regulation disorder - needs monitoring"},
-    "Gastroenteritis": {"type": "mild", "description": "Stomach bug - rest and hydration recommended"},
-    "Food Poisoning": {"type": "moderate", "description": "Foodborne illness - hydration is key"},
-    "Cholera": {"type": "severe", "description": "Severe bacterial diarrhea - needs immediate rehydration"},
-    "Chickenpox": {"type": "moderate", "description": "Viral infection with itchy rash - isolate from others"},
-    "Arthritis": {"type": "moderate", "description": "Joint inflammation - physiotherapy and medication needed"},
-    "Dengue": {"type": "severe", "description": "Mosquito-borne fever - monitor for warning signs"},
-    "Vertigo": {"type": "moderate", "description": "Balance disorder - avoid sudden movements"},
-    "Hypertension": {"type": "moderate", "description": "High blood pressure - lifestyle changes and medication"},
-    "Allergy": {"type": "mild", "description": "Immune response to allergens - antihistamines may help"},
+def admission_class(endpoint):
+    if endpoint is None or not endpoint.startswith(bp.name + '.'):
+        return None  # 404s and static files
+    return ADMISSION_ROUTE_CLASSES.get(endpoint[len(bp.name) + 1:], "standard")
+
+def admission_client(remote_addr):
+    # Rate-limit key: the client's address (behind a proxy, PROXY_COUNT makes
+    # ProxyFix put the real one in remote_addr). IPv6 clients are keyed by their
+    # /64, which one device or household holds
+    if remote_addr and ':' in remote_addr:
+        try:
+            return str(ipaddress.ip_network(f"{remote_addr}/64", strict=False))
+        except ValueError:
+            pass
+    return remote_addr
+
+class AdmissionController:
+    GAP_ALPHA = 0.2  # EWMA weight of the latest time between completions
+
+    def __init__(self, max_inflight=16, rate_limits=True):
+        self.max_inflight = max_inflight
+        self.rate_limits = rate_limits
+        self.caps = {cls: max(1, int(max_inflight * share)) for cls, (_, share, *_) in ADMISSION_CLASSES.items()}
+        self._inflight = 0
+        self._by_class = dict.fromkeys(ADMISSION_CLASSES, 0)
+        self._queued = dict.fromkeys(ADMISSION_CLASSES, 0)
+        self._ahead_of = {cls: [c for c, spec in ADMISSION_CLASSES.items() if spec[0] <= ADMISSION_CLASSES[cls][0]]
+                          for cls in ADMISSION_CLASSES}
+        self._waiting = []  # heap of [priority, seq, class, Event, state]
+        self._seq = itertools.count()
+        self._gap = 0.0     # seconds between completions while requests were queued
+        self._last_done = time.monotonic()
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rate_limited(self, client, cls, now):
+        # Seconds until the client's bucket for cls has a token (0: took one)
+        _, _, _, rate, burst = ADMISSION_CLASSES[cls]
+        bucket = self._buckets.get((client, cls))
+        if bucket is None:
+            bucket = self._buckets[(client, cls)] = [burst, now]
+            if len(self._buckets) > ADMISSION_MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((client, cls))
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def acquire(self, cls, client):
+        # (seconds queued, None) once admitted, or (None, (status, retry after seconds))
+        priority, _, budget, rate, _ = ADMISSION_CLASSES[cls]
+        start = time.monotonic()
+        with self._lock:
+            if rate and self.rate_limits:
+                wait = self._rate_limited(client, cls, start)
+                if wait:
+                    return None, (429, wait)
+            ahead = sum(self._queued[c] for c in self._ahead_of[cls])
+            if rate and ahead * self._gap > budget:
+                return None, (503, ahead * self._gap)
+            if not priority and not ahead and self._inflight < self.max_inflight:
+                self._admit(cls)  # nothing could be picked before the top class
+                return 0.0, None
+            waiter = [priority, next(self._seq), cls, threading.Event(), "waiting"]
+            heapq.heappush(self._waiting, waiter)
+            self._queued[cls] += 1
+        time.sleep(0)  # let requests that arrived alongside this one queue too
+        self._dispatch()
+        if not waiter[3].wait(max(0.0, budget - (time.monotonic() - start))):
+            with self._lock:
+                if waiter[4] == "waiting":
+                    waiter[4] = "cancelled"  # dropped lazily by _dispatch
+                    self._queued[cls] -= 1
+                    if rate:
+                        return None, (503, max(budget, self._gap))
+                    self._admit(cls)  # out of budget: runs over the limit rather than fail
+        return time.monotonic() - start, None
+
+    def release(self, cls):
+        with self._lock:
+            self._inflight -= 1
+            self._by_class[cls] -= 1
+            now = time.monotonic()
+            if self._waiting:
+                self._gap += self.GAP_ALPHA * ((now - self._last_done) - self._gap)
+            self._last_done = now
+        self._dispatch()
+
+    def _admit(self, cls):
+        self._inflight += 1
+        self._by_class[cls] += 1
+
+    def _dispatch(self):
+        # Hand free slots to the best waiters whose class is under its cap
+        with self._lock:
+            skipped = []
+            while self._waiting and self._inflight < self.max_inflight:
+                waiter = heapq.heappop(self._waiting)
+                if waiter[4] != "waiting":
+                    continue
+                if self._by_class[waiter[2]] >= self.caps[waiter[2]]:
+                    skipped.append(waiter)
+                    continue
+                waiter[4] = "admitted"
+                self._queued[waiter[2]] -= 1
+                self._admit(waiter[2])
+                waiter[3].set()
+            for waiter in skipped:
+                heapq.heappush(self._waiting, waiter)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": dict(self._by_class), "queued": dict(self._queued), "completion_gap_ms": round(self._gap * 1000, 3)}
+
+def _admission_before_request():
+    cls = admission_class(request.endpoint)
+    if cls is None:
+        return None
+    waited, rejected = state().admission.acquire(cls, admission_client(request.remote_addr))
+    if rejected:
+        status, retry_after = rejected
+        if METRICS_ENABLED:
+            ADMISSION_REJECTED.inc((cls, str(status)))
+        message = "Too many requests" if status == 429 else "Server busy, please retry"
+        retry_after = max(1, math.ceil(retry_after))
+        response = jsonify({"error": message, "retry_after": retry_after})
+        response.status_code = status
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.admission_class = cls
+    if METRICS_ENABLED:
+        ADMISSION_WAIT.observe((cls,), waited)
+    return None
+
+def _admission_teardown_request(exc):
+    # Streamed responses (batch NDJSON) keep their slot until the stream ends
+    if 'admission_class' in g:
+        state().admission.release(g.pop('admission_class'))
+
+# Pre-forked workers (serve.py --workers) each flush their series to METRICS_DIR,
+# and whichever worker answers /metrics adds the others' files to its own
+def _metrics_file(pid):
+    return os.path.join(os.environ['METRICS_DIR'], f"worker-{pid}.json")
+
+def flush_metrics():
+    if not METRICS_ENABLED or not os.environ.get('METRICS_DIR'):
+        return
+    path = _metrics_file(os.getpid())
+    with open(path + '.tmp', 'w') as f:
+        json.dump({metric.name: metric.dump() for metric in METRICS}, f)
+    os.replace(path + '.tmp', path)
+
+def other_worker_metrics():
+    directory = os.environ.get('METRICS_DIR')
+    if not directory:
+        return {}
+    merged, own = {}, os.path.basename(_metrics_file(os.getpid()))
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                dumps = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric_name, dump in dumps.items():
+            merged.setdefault(metric_name, []).append(dump)
+    return merged
+
+# ─── Knowledge Base ────────────────────────────────────────────────────────────
+# Medical content lives in versioned JSON files under kb/ (KB_DIR), listed in
+# kb/manifest.json. compile_knowledge_base() validates them into one binary
+# snapshot: a JSON header, then one marshal blob per table with every string
+# interned, so repeated keys and names are stored and loaded once. Start-up
+# memory-maps the snapshot instead of parsing JSON, recompiling it first if the
+# sources no longer match its digest. A pre-forking server loads it once and its
+# workers share the tables copy-on-write.
+KB_DIR = os.environ.get('KB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kb'))
+KB_SNAPSHOT = os.environ.get('KB_SNAPSHOT', os.path.join(KB_DIR, 'kb.snapshot'))
+KB_SNAPSHOT_MAGIC = b"HKBS\x01"
+# Module global -> container it is served as
+KB_TABLES = {
+    "SYMPTOM_DATABASE": VersionedDict,
+    "CONDITION_INFO": VersionedDict,
+    "SYMPTOM_SYNONYMS": dict,        # local/colloquial names -> SYMPTOM_DATABASE keys
+    "MEDICINE_SUGGESTIONS": dict,
+    "TRANSLATIONS": VersionedDict,
+    "CHATBOT_KB": VersionedDict,
+    "CHATBOT_SYNONYMS": dict,        # transliterations and local-script names -> CHATBOT_KB keys
+    "HEALTH_EDUCATION": VersionedList,
+    "TRIAGE_MESSAGES": VersionedDict,  # {lang: {message key: text}} for triage results
+    "BMI_FOR_AGE": VersionedDict,      # {sex: [[age in months, L, M, S], ...]} growth reference points
 }
+# Message keys the triage code renders; each needs English text, other languages
+# fall back to it key by key
+TRIAGE_MESSAGE_KEYS = frozenset(
+    [f"urgency.{level}" for level in ("emergency", "high", "moderate", "low")]
+    + [f"action.{level}" for level in ("emergency", "high", "moderate", "low", "age_caution")]
+    + [f"first_aid.{tip}" for tip in (
+        "call_108", "stay_with_patient", "keep_calm", "cool_cloth", "paracetamol", "fluids",
+        "ors", "no_solid_food", "dehydration_signs", "sit_upright", "ventilation",
+        "sit_comfortably", "loosen_clothing", "rush_emergency", "rest_hydrate", "monitor",
+        "no_self_medication")]
+    + ["disclaimer"]
+)
+
+# Tables offline devices keep copies of through /api/sync: dataset -> (table,
+# item id field for list tables)
+SYNC_KB_DATASETS = {
+    "education": ("HEALTH_EDUCATION", "id"),
+    "translations": ("TRANSLATIONS", None),
+    "chatbot": ("CHATBOT_KB", None),
+}
+
+class KnowledgeBaseError(ValueError):
+    pass
+
+def _kb_files(kb_dir):
+    with open(os.path.join(kb_dir, 'manifest.json'), 'rb') as f:
+        manifest_raw = f.read()
+    manifest = json.loads(manifest_raw)
+    unknown = set(manifest['tables']) - set(KB_TABLES)
+    missing = set(KB_TABLES) - set(manifest['tables'])
+    if unknown or missing:
+        raise KnowledgeBaseError(f"manifest tables: unknown {sorted(unknown)}, missing {sorted(missing)}")
+    return manifest, manifest_raw
+
+def kb_source_digest(kb_dir=KB_DIR):
+    manifest, manifest_raw = _kb_files(kb_dir)
+    digest = hashlib.sha256(manifest_raw)
+    for name, filename in sorted(manifest['tables'].items()):
+        with open(os.path.join(kb_dir, filename), 'rb') as f:
+            digest.update(f"\0{filename}\0".encode() + f.read())
+    return digest.hexdigest()
+
+def validate_kb(tables):
+    for name, kind in KB_TABLES.items():
+        if not isinstance(tables[name], list if kind is VersionedList else dict):
+            raise KnowledgeBaseError(f"{name} must be a JSON {'array' if kind is VersionedList else 'object'}")
+    for key, entry in tables["SYMPTOM_DATABASE"].items():
+        if not isinstance(entry.get("conditions"), list) or not isinstance(entry.get("severity_weight"), int):
+            raise KnowledgeBaseError(f"SYMPTOM_DATABASE[{key!r}] needs a conditions list and an integer severity_weight")
+    for key, entry in tables["CHATBOT_KB"].items():
+        if not isinstance(entry.get("answer"), str):
+            raise KnowledgeBaseError(f"CHATBOT_KB[{key!r}] needs an answer")
+    if "default" not in tables["CHATBOT_KB"]:
+        raise KnowledgeBaseError("CHATBOT_KB needs a default entry")
+    for article in tables["HEALTH_EDUCATION"]:
+        if not isinstance(article, dict) or not {"id", "title", "category"} <= set(article):
+            raise KnowledgeBaseError(f"HEALTH_EDUCATION article needs id, title and category: {article!r:.80}")
+    messages = tables["TRIAGE_MESSAGES"]
+    if not all(isinstance(strings, dict) for strings in messages.values()):
+        raise KnowledgeBaseError("TRIAGE_MESSAGES needs one {key: text} object per language")
+    missing = TRIAGE_MESSAGE_KEYS - set(messages.get("en", ()))
+    if missing:
+        raise KnowledgeBaseError(f"TRIAGE_MESSAGES['en'] is missing {sorted(missing)}")
+    for lang, strings in messages.items():
+        if set(strings) - TRIAGE_MESSAGE_KEYS:
+            raise KnowledgeBaseError(f"TRIAGE_MESSAGES[{lang!r}] has unknown keys {sorted(set(strings) - TRIAGE_MESSAGE_KEYS)}")
+    for sex in ("male", "female"):
+        points = tables["BMI_FOR_AGE"].get(sex)
+        if (not isinstance(points, list) or not all(isinstance(p, list) and len(p) == 4 for p in points)
+                or [p[0] for p in points] != sorted({p[0] for p in points})
+                or points[0][0] > 24 or points[-1][0] < 228):
+            raise KnowledgeBaseError(f"BMI_FOR_AGE[{sex!r}] needs [months, L, M, S] rows in month order covering 24-228")
+
+def read_kb_sources(kb_dir=KB_DIR):
+    manifest, _ = _kb_files(kb_dir)
+    tables = {}
+    for name, filename in manifest['tables'].items():
+        with open(os.path.join(kb_dir, filename), encoding='utf-8') as f:
+            tables[name] = json.load(f)
+    validate_kb(tables)
+    return manifest, tables
+
+def _interned(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {sys.intern(k): _interned(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_interned(v) for v in value]
+    return value
+
+def sync_items(table, id_field):
+    # {item key: item} of a synced table
+    if id_field:
+        return {str(item[id_field]): item for item in table}
+    return {str(key): value for key, value in table.items()}
+
+def kb_sync_history(tables, previous=None):
+    # Per-item change log carried from snapshot to snapshot: every synced item
+    # records the generation its content last changed in (removed items stay as
+    # tombstones), so all workers loading a snapshot agree on what changed when.
+    # A new epoch starts when there is no earlier history to continue.
+    previous = previous or {"epoch": os.urandom(4).hex(), "generation": 0, "items": {}}
+    generation = previous["generation"] + 1
+    items = {}
+    for dataset, (name, id_field) in SYNC_KB_DATASETS.items():
+        before, after = previous["items"].get(dataset, {}), {}
+        for key, value in sync_items(tables[name], id_field).items():
+            digest = hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+            old = before.get(key)
+            after[key] = old if old and old[1] == digest else [generation, digest]
+        for key, old in before.items():
+            if key not in after:
+                after[key] = old if old[1] is None else [generation, None]
+        items[dataset] = after
+    if items == previous["items"]:
+        return previous
+    return {"epoch": previous["epoch"], "generation": generation, "items": items}
+
+def _snapshot_header(mm, snapshot):
+    start = len(KB_SNAPSHOT_MAGIC)
+    if mm[:start] != KB_SNAPSHOT_MAGIC:
+        raise KnowledgeBaseError(f"{snapshot} is not a knowledge-base snapshot")
+    size = int.from_bytes(mm[start:start + 4], 'little')
+    return json.loads(mm[start + 4:start + 4 + size]), start + 4 + size
+
+def previous_sync_history(snapshot):
+    try:
+        with open(snapshot, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _snapshot_header(mm, snapshot)[0].get("sync")
+    except (OSError, ValueError):
+        return None
+
+def compile_knowledge_base(kb_dir=KB_DIR, snapshot=KB_SNAPSHOT):
+    digest = kb_source_digest(kb_dir)
+    manifest, tables = read_kb_sources(kb_dir)
+    sync = kb_sync_history(tables, previous_sync_history(snapshot))
+    blobs, index, offset = [], {}, 0
+    for name, table in tables.items():
+        blob = marshal.dumps(_interned(table))
+        index[name] = [offset, len(blob)]
+        offset += len(blob)
+        blobs.append(blob)
+    header = json.dumps({"version": manifest.get("version"), "digest": digest, "tables": index, "sync": sync}).encode()
+    tmp = f"{snapshot}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(KB_SNAPSHOT_MAGIC + len(header).to_bytes(4, 'little') + header)
+        for blob in blobs:
+            f.write(blob)
+    # Readers (and hot reload) see the old snapshot or the new one, never half of one
+    os.replace(tmp, snapshot)
+    return {"version": manifest.get("version"), "digest": digest, "bytes": os.path.getsize(snapshot)}
+
+def load_snapshot(snapshot=KB_SNAPSHOT):
+    with open(snapshot, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header, base = _snapshot_header(mm, snapshot)
+            with memoryview(mm) as view:
+                tables = {name: marshal.loads(view[base + offset:base + offset + length])
+                          for name, (offset, length) in header['tables'].items()}
+    if "sync" not in header:
+        raise KnowledgeBaseError(f"{snapshot} predates sync history; recompile it")
+    info = {"version": header["version"], "digest": header["digest"], "source": "snapshot",
+            "snapshot_stat": (stat.st_ino, stat.st_size, stat.st_mtime_ns), "sync": header["sync"]}
+    return tables, info
+
+def load_knowledge_base(kb_dir=KB_DIR, snapshot=KB_SNAPSHOT):
+    # ({global name: plain table}, info). Uses the snapshot when it matches the
+    # sources, recompiling it if not; falls back to the JSON if it can't be written
+    digest = kb_source_digest(kb_dir) if os.path.exists(os.path.join(kb_dir, 'manifest.json')) else None
+    try:
+        tables, info = load_snapshot(snapshot)
+        if digest is None or info["digest"] == digest:
+            return tables, info
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    try:
+        compile_knowledge_base(kb_dir, snapshot)
+        return load_snapshot(snapshot)
+    except OSError:
+        manifest, tables = read_kb_sources(kb_dir)
+        return tables, {"version": manifest.get("version"), "digest": digest, "source": "json", "snapshot_stat": None,
+                        "sync": kb_sync_history(tables)}
+
+def build_kb_tables(tables, previous=None):
+    # Replacement tables carry on their predecessors' version numbers, so every
+    # index and cache keyed on a version (triage, chatbot, education, responses)
+    # sees a change and rebuilds lazily
+    built = {}
+    for name, kind in KB_TABLES.items():
+        built[name] = kind(tables[name])
+        if previous is not None and hasattr(built[name], 'version'):
+            built[name].version = previous[name].version + 1
+    return built
+
+def kb_sync_state(sync, built):
+    # The sync history together with the tables it describes, swapped in as one
+    # global so /api/sync never pairs a generation with another one's content
+    return dict(sync, tables={dataset: built[name] for dataset, (name, _) in SYNC_KB_DATASETS.items()})
+
+KB_INFO = {}
+_kb_reload_lock = threading.Lock()
+_kb_rejected = {"stat": None}
+
+def reload_knowledge_base(tables=None, info=None):
+    # Swap every table in with one module-dict update: a request already running
+    # keeps the tables it looked up, the next one sees only the new set
+    if tables is None:
+        tables, info = load_snapshot()
+    validate_kb(tables)
+    info = dict(info)
+    with _kb_reload_lock:
+        module = globals()
+        sync = info.pop("sync", None) or kb_sync_history(tables, {k: v for k, v in KB_SYNC.items() if k != "tables"})
+        built = build_kb_tables(tables, {name: module[name] for name in KB_TABLES})
+        module.update(built, KB_SYNC=kb_sync_state(sync, built))
+        KB_INFO.clear()
+        KB_INFO.update(info, loaded_at=datetime.now().isoformat(timespec='seconds'))
+    return KB_INFO
+
+def reload_knowledge_base_if_changed():
+    # Polled by each worker: picks up a snapshot replaced by `cli.py kb-compile`
+    try:
+        stat = os.stat(KB_SNAPSHOT)
+    except OSError:
+        return False
+    key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if key in (KB_INFO.get("snapshot_stat"), _kb_rejected["stat"]):
+        return False
+    try:
+        reload_knowledge_base()
+    except (ValueError, EOFError, TypeError):
+        _kb_rejected["stat"] = key  # report a bad snapshot once, keep serving the current tables
+        raise
+    return True
+
+_kb_tables, _kb_info = load_knowledge_base()
+_kb = build_kb_tables(_kb_tables)
+KB_SYNC = kb_sync_state(_kb_info.pop("sync"), _kb)
+KB_INFO.update(_kb_info, loaded_at=datetime.now().isoformat(timespec='seconds'))
+SYMPTOM_DATABASE = _kb["SYMPTOM_DATABASE"]
+CONDITION_INFO = _kb["CONDITION_INFO"]
+SYMPTOM_SYNONYMS = _kb["SYMPTOM_SYNONYMS"]
+MEDICINE_SUGGESTIONS = _kb["MEDICINE_SUGGESTIONS"]
+TRANSLATIONS = _kb["TRANSLATIONS"]
+CHATBOT_KB = _kb["CHATBOT_KB"]
+CHATBOT_SYNONYMS = _kb["CHATBOT_SYNONYMS"]
+HEALTH_EDUCATION = _kb["HEALTH_EDUCATION"]
+TRIAGE_MESSAGES = _kb["TRIAGE_MESSAGES"]
+BMI_FOR_AGE = _kb["BMI_FOR_AGE"]
+del _kb, _kb_tables, _kb_info
+
+# ─── Symptom Matcher ───────────────────────────────────────────────────────────
+def build_automaton(patterns):
+    # Aho-Corasick over {pattern: value}: (goto, fail, out) where out[node] is the
+    # frozenset of values of every pattern ending at that node
+    goto, out = [{}], [set()]
+    for pattern, value in patterns.items():
+        node = 0
+        for ch in pattern:
+            if ch not in goto[node]:
+                goto[node][ch] = len(goto)
+                goto.append({})
+                out.append(set())
+            node = goto[node][ch]
+        out[node].add(value)
+
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        node = queue.popleft()
+        for ch, nxt in goto[node].items():
+            queue.append(nxt)
+            f = fail[node]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] |= out[fail[nxt]]
+    return goto, fail, [frozenset(o) for o in out]
+
+class SymptomMatcher:
+    # Reproduces `key in symptom or symptom in key` without scanning every key:
+    # an Aho-Corasick automaton finds the keys contained in the symptom text and
+    # a substring index finds the keys that contain it. Both are built once.
+    # Synonyms only count when they appear in the text ("bukhar" -> fever);
+    # a fragment of a synonym ("t", "ache") must not match its key.
+    def __init__(self, database, synonyms=None):
+        self.keys = list(database)
+        key_index = {k: i for i, k in enumerate(self.keys)}
+        patterns = dict(key_index)
+        for syn, key in (synonyms or {}).items():
+            if key in key_index:
+                patterns.setdefault(syn.lower(), key_index[key])
+
+        contains = {"": set(key_index.values())}
+        for key, idx in key_index.items():
+            for i in range(len(key)):
+                for j in range(i + 1, len(key) + 1):
+                    contains.setdefault(key[i:j], set()).add(idx)
+        self._goto, self._fail, self._out = build_automaton(patterns)
+        self._contains = {k: frozenset(v) for k, v in contains.items()}
+
+    @timed('symptom_match')
+    def match(self, symptom):
+        # Matched keys in SYMPTOM_DATABASE order, same as the original nested loop
+        found = set(self._contains.get(symptom, ()))
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in symptom:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return [self.keys[i] for i in sorted(found)]
+
+SYMPTOM_MATCHER = SymptomMatcher(SYMPTOM_DATABASE, SYMPTOM_SYNONYMS)
+
+# Urgency tiers: (minimum total severity, level, colour); the action text is the
+# "action.<level>" message
+URGENCY_LEVELS = [
+    (10, "EMERGENCY", "#dc2626"),
+    (6, "HIGH", "#ea580c"),
+    (3, "MODERATE", "#d97706"),
+    (0, "LOW", "#16a34a"),
+]
+
+def triage_urgency(total_severity, age):
+    # (urgency, colour, action message keys); "action.age_caution" takes {age}
+    for threshold, urgency, urgency_color in URGENCY_LEVELS:
+        if total_severity >= threshold:
+            break
+    action = [f"action.{urgency.lower()}"]
 
-def analyze_symptoms(symptoms_list, age, duration, additional_info=""):
+    # Age adjustments
+    if age < 5 or age > 65:
+        if urgency in ["LOW", "MODERATE"]:
+            urgency = "MODERATE" if urgency == "LOW" else "HIGH"
+            action.insert(0, "action.age_caution")
+    return urgency, urgency_color, action
+
+def condition_detail(cond, score, total_severity):
+    info = CONDITION_INFO.get(cond, {"type": "unknown", "description": "Consult a doctor for accurate diagnosis"})
+    return {
+        "name": cond,
+        "likelihood": min(round((score / max(total_severity, 1)) * 100), 95),
+        "type": info["type"],
+        "description": info["description"]
+    }
+
+def normalize_symptoms(symptoms_list):
+    # Canonical order makes results (and cache keys) independent of entry order
+    return sorted(s.lower().strip() for s in symptoms_list)
+
+def keyed_triage(urgency, urgency_color, action, conditions, first_aid):
+    # Language-neutral result: text fields are message keys until rendered
+    return {
+        "urgency": urgency,
+        "urgency_color": urgency_color,
+        "conditions": conditions,
+        "message_keys": {
+            "urgency_label": f"urgency.{urgency.lower()}",
+            "action": action,
+            "first_aid": first_aid,
+            "disclaimer": "disclaimer",
+        },
+    }
+
+@timed('analyze_symptoms')
+def analyze_symptoms(symptoms_list, age, duration, additional_info="", lang="en"):
+    refresh_triage_index()
+    lang, catalog = TRIAGE_CATALOGS.resolve(lang)
+    symptoms_lower = normalize_symptoms(symptoms_list)
+    cache_key = (tuple(symptoms_lower), age < 5 or age > 65)
+    result = TRIAGE_CACHE.get(cache_key + (lang,))
+    if result is None:
+        keyed = TRIAGE_CACHE.get(cache_key)
+        if keyed is None:
+            keyed = _analyze_symptoms(symptoms_lower, age)
+            TRIAGE_CACHE.put(cache_key, keyed)
+        result = render_triage(keyed, lang, catalog, age)
+        TRIAGE_CACHE.put(cache_key + (lang,), result)
+
+    # The cached entry is shared by the whole age bracket; only the action text
+    # mentions the exact age, so rebuild it per request
+    if cache_key[1]:
+        result = dict(result, action=render_action(catalog, result["message_keys"]["action"], age))
+    return result
+
+@timed('analyze_symptoms.compute')
+def _analyze_symptoms(symptoms_lower, age):
     matched = {}
     total_severity = 0
-    
-    symptoms_lower = [s.lower().strip() for s in symptoms_list]
-    
+
     for symptom in symptoms_lower:
-        for key, data in SYMPTOM_DATABASE.items():
-            if key in symptom or symptom in key:
-                for condition in data["conditions"]:
-                    matched[condition] = matched.get(condition, 0) + data["severity_weight"]
-                total_severity += data["severity_weight"]
+        for key in SYMPTOM_MATCHER.match(symptom):
+            data = SYMPTOM_DATABASE[key]
+            for condition in data["conditions"]:
+                matched[condition] = matched.get(condition, 0) + data["severity_weight"]
+            total_severity += data["severity_weight"]
     
     # Sort by score
     sorted_conditions = sorted(matched.items(), key=lambda x: x[1], reverse=True)[:5]
     
-    # Determine urgency
-    if total_severity >= 10:
-        urgency = "EMERGENCY"
-        urgency_color = "#dc2626"
-        action = "🚨 Go to Emergency Room IMMEDIATELY or call 108"
-    elif total_severity >= 6:
-        urgency = "HIGH"
-        urgency_color = "#ea580c"
-        action = "⚠️ Visit a hospital/doctor TODAY - Do not delay"
-    elif total_severity >= 3:
-        urgency = "MODERATE"
-        urgency_color = "#d97706"
-        action = "📋 Visit a clinic within 24-48 hours"
-    else:
-        urgency = "LOW"
-        urgency_color = "#16a34a"
-        action = "💊 Rest at home, monitor symptoms. Visit clinic if worsening"
+    urgency, urgency_color, action = triage_urgency(total_severity, age)
 
-    # Age adjustments
-    if age < 5 or age > 65:
-        if urgency in ["LOW", "MODERATE"]:
-            urgency = "MODERATE" if urgency == "LOW" else "HIGH"
-            action = f"⚠️ Given patient age ({age}), extra caution recommended. " + action
-
-    conditions_detail = []
-    for cond, score in sorted_conditions:
-        info = CONDITION_INFO.get(cond, {"type": "unknown", "description": "Consult a doctor for accurate diagnosis"})
-        conditions_detail.append({
-            "name": cond,
-            "likelihood": min(round((score / max(total_severity, 1)) * 100), 95),
-            "type": info["type"],
-            "description": info["description"]
-        })
+    conditions_detail = [condition_detail(cond, score, total_severity) for cond, score in sorted_conditions]
 
     # First aid tips
     first_aid = get_first_aid(symptoms_lower, urgency)
     
-    return {
-        "urgency": urgency,
-        "urgency_color": urgency_color,
-        "action": action,
-        "conditions": conditions_detail,
-        "first_aid": first_aid,
-        "disclaimer": "⚠️ This is an AI-assisted preliminary assessment ONLY. Always consult a qualified healthcare professional for proper diagnosis and treatment."
-    }
+    return keyed_triage(urgency, urgency_color, action, conditions_detail, first_aid)
 
+@timed('get_first_aid')
 def get_first_aid(symptoms, urgency):
+    # Message keys; see render_triage
     tips = []
     if urgency == "EMERGENCY":
-        tips.append("Call 108 (India Emergency) immediately")
-        tips.append("Do NOT leave the patient alone")
-        tips.append("Keep patient calm and still")
+        tips.append("first_aid.call_108")
+        tips.append("first_aid.stay_with_patient")
+        tips.append("first_aid.keep_calm")
     if any(s in symptoms for s in ["fever", "high fever"]):
-        tips.append("Apply cool wet cloth on forehead")
-        tips.append("Give paracetamol if available (follow dosage)")
-        tips.append("Ensure adequate fluid intake")
+        tips.append("first_aid.cool_cloth")
+        tips.append("first_aid.paracetamol")
+        tips.append("first_aid.fluids")
     if any(s in symptoms for s in ["vomiting", "diarrhea", "nausea"]):
-        tips.append("ORS (Oral Rehydration Solution) every 15-20 mins")
-        tips.append("Avoid solid food until vomiting stops")
-        tips.append("Watch for signs of dehydration")
+        tips.append("first_aid.ors")
+        tips.append("first_aid.no_solid_food")
+        tips.append("first_aid.dehydration_signs")
     if any(s in symptoms for s in ["cough", "shortness of breath"]):
-        tips.append("Keep the patient in upright/sitting position")
-        tips.append("Ensure good ventilation in the room")
+        tips.append("first_aid.sit_upright")
+        tips.append("first_aid.ventilation")
     if any(s in symptoms for s in ["chest pain"]):
-        tips.append("🚨 Make patient sit/lie comfortably")
-        tips.append("Loosen tight clothing")
-        tips.append("Rush to emergency - could be cardiac")
+        tips.append("first_aid.sit_comfortably")
+        tips.append("first_aid.loosen_clothing")
+        tips.append("first_aid.rush_emergency")
     if not tips:
-        tips.append("Rest and stay hydrated")
-        tips.append("Monitor for worsening symptoms")
-        tips.append("Avoid self-medication without doctor advice")
+        tips.append("first_aid.rest_hydrate")
+        tips.append("first_aid.monitor")
+        tips.append("first_aid.no_self_medication")
     return tips
 
 
+# ─── Triage Message Catalogs ───────────────────────────────────────────────────
+# Each TRIAGE_MESSAGES language is compiled once per version into a complete
+# catalog (English filling any missing key), so rendering a result is one dict
+# lookup per key whatever the language, and an unknown language gets English.
+class MessageCatalogs:
+    def __init__(self, messages, default="en"):
+        base = messages[default]
+        self.catalogs = {lang: {**base, **strings} for lang, strings in messages.items()}
+        self.default = default
+
+    def resolve(self, lang):
+        # (language served, its catalog)
+        if lang not in self.catalogs:
+            lang = self.default
+        return lang, self.catalogs[lang]
+
+def render_action(catalog, keys, age):
+    return "".join(catalog[key] for key in keys).replace("{age}", str(age))
+
+def render_triage(keyed, lang, catalog, age):
+    keys = keyed["message_keys"]
+    return dict(
+        keyed,
+        lang=lang,
+        urgency_label=catalog[keys["urgency_label"]],
+        action=render_action(catalog, keys["action"], age),
+        first_aid=[catalog[key] for key in keys["first_aid"]],
+        disclaimer=catalog[keys["disclaimer"]],
+    )
+
+TRIAGE_CATALOGS = MessageCatalogs(TRIAGE_MESSAGES)
+
+
+# ─── Batch Triage Engine ───────────────────────────────────────────────────────
+class TriageBatchEngine:
+    # SYMPTOM_DATABASE as a symptom x condition weight matrix plus a severity
+    # vector, so a whole batch of patients is scored with one matrix product.
+    # Ties are broken by first-seen order, exactly like the insertion-ordered
+    # `matched` dict in analyze_symptoms.
+    CHUNK_SIZE = 256
+
+    def __init__(self, database, matcher):
+        self.matcher = matcher
+        self.key_index = {k: i for i, k in enumerate(database)}
+        self.conditions = []
+        cond_index = {}
+        for data in database.values():
+            for cond in data["conditions"]:
+                if cond not in cond_index:
+                    cond_index[cond] = len(self.conditions)
+                    self.conditions.append(cond)
+
+        n_keys, n_conds = len(self.key_index), len(self.conditions)
+        self.weights = np.zeros((n_keys, n_conds))
+        self.severity = np.zeros(n_keys)
+        # Position of each condition inside its symptom's list (n_conds = absent)
+        self.cond_pos = np.full((n_keys, n_conds), n_conds, dtype=np.int64)
+        for k, data in enumerate(database.values()):
+            self.severity[k] = data["severity_weight"]
+            for pos, cond in enumerate(data["conditions"]):
+                j = cond_index[cond]
+                self.weights[k, j] += data["severity_weight"]
+                self.cond_pos[k, j] = min(self.cond_pos[k, j], pos)
+
+    def analyze_stream(self, items, lang="en"):
+        lang, catalog = TRIAGE_CATALOGS.resolve(lang)
+        chunk = []
+        for index, item in enumerate(items):
+            chunk.append((index, item))
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield from self._analyze_chunk(chunk, lang, catalog)
+                chunk = []
+        if chunk:
+            yield from self._analyze_chunk(chunk, lang, catalog)
+
+    def _analyze_chunk(self, chunk, lang, catalog):
+        rows, errors = [], {}
+        for index, item in chunk:
+            try:
+                symptoms = normalize_symptoms(item.get('symptoms', []))
+                age = int(item.get('age', 30))
+            except (AttributeError, TypeError, ValueError):
+                errors[index] = "Invalid patient record"
+                continue
+            if not symptoms:
+                errors[index] = "Please provide at least one symptom"
+                continue
+            rows.append((index, symptoms, age))
+
+        results = dict(self._score(rows)) if rows else {}
+        ages = {index: age for index, _, age in rows}
+        for index, _ in chunk:
+            if index in errors:
+                yield {"index": index, "error": errors[index]}
+            else:
+                yield render_triage(results[index], lang, catalog, ages[index])
+
+    @timed('triage_batch.score')
+    def _score(self, rows):
+        n_keys, n_conds = self.cond_pos.shape
+        counts = np.zeros((len(rows), n_keys))
+        # First position of each symptom key in the row's match sequence
+        first_seen = np.zeros((len(rows), n_keys), dtype=np.int64)
+        match_cache = {}
+        for r, (_, symptoms, _) in enumerate(rows):
+            seq = 0
+            for symptom in symptoms:
+                if symptom not in match_cache:
+                    match_cache[symptom] = [self.key_index[k] for k in self.matcher.match(symptom)]
+                for k in match_cache[symptom]:
+                    if not counts[r, k]:
+                        first_seen[r, k] = seq
+                    counts[r, k] += 1
+                    seq += 1
+
+        scores = counts @ self.weights
+        totals = counts @ self.severity
+
+        # Tie-break rank = (first position of a matching symptom, position of the
+        # condition in that symptom's list), restricted to columns in use
+        keys_used = np.flatnonzero(counts.any(axis=0))
+        if keys_used.size == 0:
+            # Nothing in the chunk matched: every row is a no-match result
+            for index, symptoms, age in rows:
+                urgency, urgency_color, action = triage_urgency(0, age)
+                yield index, dict(index=index, **keyed_triage(
+                    urgency, urgency_color, action, [], get_first_aid(symptoms, urgency)))
+            return
+        present = self.cond_pos[keys_used] < n_conds
+        conds_used = np.flatnonzero(present.any(axis=0))
+        unseen = np.iinfo(np.int64).max
+        pos = np.where(present[:, conds_used], self.cond_pos[np.ix_(keys_used, conds_used)], unseen)
+        seen = counts[:, keys_used] > 0
+        rank = np.where(
+            seen[:, :, None] & (pos[None, :, :] != unseen),
+            first_seen[:, keys_used, None] * n_conds + pos[None, :, :],
+            unseen,
+        ).min(axis=1)
+        used_scores = scores[:, conds_used]
+        order = np.lexsort((rank, -used_scores), axis=-1)[:, :5]
+
+        for r, (index, symptoms, age) in enumerate(rows):
+            total_severity = totals[r].item()
+            urgency, urgency_color, action = triage_urgency(total_severity, age)
+            conditions_detail = [
+                condition_detail(self.conditions[conds_used[j]], used_scores[r, j].item(), total_severity)
+                for j in order[r] if rank[r, j] != unseen
+            ]
+            yield index, dict(index=index, **keyed_triage(
+                urgency, urgency_color, action, conditions_detail, get_first_aid(symptoms, urgency)))
+
+def parse_ndjson(lines):
+    # Malformed lines are passed through as None so the caller can report them by index
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def read_batch_items(allow_csv=False):
+    # Batch endpoints take a JSON array or NDJSON (one record per line); None if neither
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return parse_ndjson(request.stream)
+    if allow_csv and request.mimetype == 'text/csv':
+        return csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''))
+    items = request.get_json(silent=True)
+    return items if isinstance(items, list) else None
+
+def ndjson_response(results):
+    def generate():
+        for result in results:
+            yield json.dumps(result) + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+TRIAGE_ENGINE = TriageBatchEngine(SYMPTOM_DATABASE, SYMPTOM_MATCHER)
+
+# ─── Triage Result Cache ───────────────────────────────────────────────────────
+# Keyed on (sorted symptoms, age < 5 or > 65) for the language-neutral result,
+# plus the language for its rendering; size set by TRIAGE_CACHE_SIZE
+TRIAGE_CACHE = LRUCache(int(os.environ.get('TRIAGE_CACHE_SIZE', 4096)))
+_triage_lock = threading.Lock()
+
+def triage_sources():
+    return {"symptoms": SYMPTOM_DATABASE.version, "conditions": CONDITION_INFO.version,
+            "messages": TRIAGE_MESSAGES.version}
+
+_triage_versions = triage_sources()
+
+def refresh_triage_index():
+    # Rebuild the matcher/engine and drop cached results after a knowledge-base edit;
+    # versions are published only once the new objects are in place and the cache is clear
+    global SYMPTOM_MATCHER, TRIAGE_ENGINE, TRIAGE_CATALOGS, _triage_versions
+    if _triage_versions == triage_sources():
+        return
+    with _triage_lock:
+        versions = triage_sources()
+        if _triage_versions == versions:
+            return
+        if _triage_versions["symptoms"] != versions["symptoms"]:
+            SYMPTOM_MATCHER = SymptomMatcher(SYMPTOM_DATABASE, SYMPTOM_SYNONYMS)
+            TRIAGE_ENGINE = TriageBatchEngine(SYMPTOM_DATABASE, SYMPTOM_MATCHER)
+        if _triage_versions["messages"] != versions["messages"]:
+            TRIAGE_CATALOGS = MessageCatalogs(TRIAGE_MESSAGES)
+        TRIAGE_CACHE.clear()
+        _triage_versions = versions
+
+
 # Mock health data for dashboard
 HEALTH_DATA = {
     "regions": [
@@ -231,151 +1186,1218 @@ HEALTH_DATA = {
 }
 
 
-@app.route('/')
+# ─── Case Aggregates ───────────────────────────────────────────────────────────
+# HEALTH_DATA is the baseline; every case event then updates per-district
+# counters, a rolling 12-month ring and disease totals in O(1). Reads return a
+# materialized snapshot that is only rebuilt after new events arrive.
+def risk_for_cases(cases):
+    return 'High' if cases >= 100 else 'Medium' if cases >= 50 else 'Low'
+
+class CaseAggregates:
+    def __init__(self, baseline, now=None):
+        now = now or datetime.now()
+        self._lock = threading.Lock()
+        self._districts = {}
+        for region in baseline["regions"]:
+            district = self._district(region["name"])
+            district["cases"] = region["cases"]
+            district["diseases"][region["disease"]] = region["cases"]
+            district["dominant"] = region["disease"]
+        # Ring indexed by calendar month: (year, count); seeded as the last 12 months
+        self._months = [(now.year if m < now.month else now.year - 1, count)
+                        for m, count in enumerate(baseline["monthly_cases"])]
+        total = sum(r["cases"] for r in baseline["regions"])
+        self._disease_totals = {d: round(pct * total / 100) for d, pct in baseline["disease_distribution"].items()}
+        self._snapshot = None
+        self.version = 0
+
+    def _district(self, name):
+        key = name.strip().lower()
+        if key not in self._districts:
+            self._districts[key] = {"name": name.strip().title(), "cases": 0, "diseases": {}, "dominant": None}
+        return self._districts[key]
+
+    def record(self, district_name, disease, when=None):
+        when = when or datetime.now()
+        with self._lock:
+            district = self._district(district_name)
+            district["cases"] += 1
+            count = district["diseases"][disease] = district["diseases"].get(disease, 0) + 1
+            if count > district["diseases"].get(district["dominant"], 0):
+                district["dominant"] = disease
+            year, month_count = self._months[when.month - 1]
+            if when.year > year:
+                self._months[when.month - 1] = (when.year, 1)
+            elif when.year == year:
+                self._months[when.month - 1] = (year, month_count + 1)
+            self._disease_totals[disease] = self._disease_totals.get(disease, 0) + 1
+            self._snapshot = None
+            self.version += 1
+
+    def checkpoint(self):
+        with self._lock:
+            return {"districts": {k: dict(d, diseases=dict(d["diseases"])) for k, d in self._districts.items()},
+                    "months": list(self._months), "disease_totals": dict(self._disease_totals), "version": self.version}
+
+    def restore(self, data):
+        with self._lock:
+            self._districts = data["districts"]
+            self._months = [tuple(m) for m in data["months"]]
+            self._disease_totals = data["disease_totals"]
+            self._snapshot = None
+            self.version = max(self.version, data["version"]) + 1
+
+    def district(self, name):
+        with self._lock:
+            d = self._district(name)
+            return {"name": d["name"], "risk": risk_for_cases(d["cases"]), "cases": d["cases"], "disease": d["dominant"]}
+
+    def find(self, name):
+        # Like district(), but None for a district with no cases instead of creating it
+        with self._lock:
+            d = self._districts.get(name.strip().lower())
+        return d and self.district(name)
+
+    def snapshot(self, now=None):
+        now = now or datetime.now()
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == (now.year, now.month):
+                return self._snapshot[1]
+            regions = [{"name": d["name"], "risk": risk_for_cases(d["cases"]), "cases": d["cases"], "disease": d["dominant"]}
+                       for d in self._districts.values()]
+            # Buckets older than the rolling 12-month window read as zero
+            current = now.year * 12 + now.month - 1
+            monthly = [count if current - (year * 12 + m) < 12 else 0 for m, (year, count) in enumerate(self._months)]
+            data = {"regions": regions, "monthly_cases": monthly, "disease_distribution": self._distribution()}
+            self._snapshot = ((now.year, now.month), data)
+            return data
+
+    def _distribution(self, top=4):
+        total = sum(self._disease_totals.values()) or 1
+        named = sorted(((n, d) for d, n in self._disease_totals.items() if d != "Others"), reverse=True)[:top]
+        shares = {d: round(n * 100 / total) for n, d in named}
+        shares["Others"] = max(100 - sum(shares.values()), 0)
+        return shares
+
+def case_event_from_record(record):
+    # (district, disease) for a saved triage/case record, or None if it can't be attributed
+    region = record.get('region') or record.get('district')
+    disease = record.get('disease')
+    if not disease and record.get('conditions'):
+        top = record['conditions'][0]
+        disease = top.get('name') if isinstance(top, dict) else top
+    if isinstance(region, str) and region.strip() and isinstance(disease, str) and disease:
+        return region, disease
+    return None
+
+
+# ─── Response Cache ────────────────────────────────────────────────────────────
+# Read-mostly endpoints are serialized once per data version, with a strong
+# ETag and a pre-gzipped copy; If-None-Match answers 304 without a body.
+class ResponseCache:
+    GZIP_MIN_BYTES = 512
+
+    def __init__(self, maxsize=1024):
+        self._entries = LRUCache(maxsize)
+
+    def entry(self, key, version, build):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            body = current_app.json.dumps(build()).encode('utf-8') + b"\n"
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            gzipped = gzip.compress(body, 6) if len(body) >= self.GZIP_MIN_BYTES else None
+            entry = (version, body, gzipped, etag)
+            self._entries.put(key, entry)
+        return entry
+
+    def respond(self, key, version, build):
+        _, body, gzipped, etag = self.entry(key, version, build)
+        use_gzip = gzipped is not None and 'gzip' in request.accept_encodings
+        # Each encoding is a distinct representation, so it gets its own strong ETag
+        tag = etag + '-gz' if use_gzip else etag
+        if request.if_none_match.contains(tag):
+            response = Response(status=304)
+        else:
+            response = Response(gzipped if use_gzip else body, mimetype='application/json')
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(tag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return self._entries.stats()
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/triage')
+@bp.route('/triage')
 def triage():
     return render_template('triage.html')
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
-    return render_template('dashboard.html', data=HEALTH_DATA)
+    return render_template('dashboard.html', data=state().aggregates.snapshot())
 
-@app.route('/api/analyze', methods=['POST'])
+@bp.route('/api/analyze', methods=['POST'])
 def analyze():
     data = request.json
     symptoms = data.get('symptoms', [])
     age = int(data.get('age', 30))
     duration = data.get('duration', '1-2 days')
     additional = data.get('additional', '')
+    lang = data.get('lang') or request.args.get('lang', 'en')
+    if not isinstance(lang, str):
+        lang = TRIAGE_CATALOGS.default  # like an unknown code
     
     if not symptoms:
         return jsonify({"error": "Please provide at least one symptom"}), 400
     
-    result = analyze_symptoms(symptoms, age, duration, additional)
+    result = analyze_symptoms(symptoms, age, duration, additional, lang)
     return jsonify(result)
 
-@app.route('/api/health-data')
+@bp.route('/api/analyze-batch', methods=['POST'])
+def analyze_batch():
+    items = read_batch_items()
+    if items is None:
+        return jsonify({"error": "Expected a JSON array or NDJSON body"}), 400
+    refresh_triage_index()
+    return ndjson_response(TRIAGE_ENGINE.analyze_stream(items, request.args.get('lang', 'en')))
+
+@bp.route('/metrics')
+def metrics():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    lines, others = [], other_worker_metrics()
+    for metric in METRICS:
+        lines += metric.render(others.get(metric.name, ()))
+    caches = {"triage": TRIAGE_CACHE, "chatbot": CHATBOT_CACHE, "responses": state().responses}
+    for kind in ("hits", "misses", "size"):
+        name = f"healthai_cache_{kind}" + ("_total" if kind != "size" else "")
+        lines.append(f"# TYPE {name} {'counter' if kind != 'size' else 'gauge'}")
+        lines += [f'{name}{{cache="{cache}"}} {c.stats()[kind]}' for cache, c in caches.items()]
+    lines += ["# TYPE healthai_sse_last_event_id gauge", f"healthai_sse_last_event_id {state().broker.last_id}"]
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/knowledge-base')
+def knowledge_base_info():
+    info = {k: v for k, v in KB_INFO.items() if k != 'snapshot_stat'}
+    return jsonify(dict(info, tables={name: len(globals()[name]) for name in KB_TABLES}))
+
+@bp.route('/api/cache-stats')
+def cache_stats():
+    admission = state().admission
+    return jsonify({"triage": TRIAGE_CACHE.stats(), "chatbot": CHATBOT_CACHE.stats(), "responses": state().responses.stats(),
+                    "admission": admission.stats() if admission else None})
+
+@bp.route('/api/health-data')
 def health_data():
-    return jsonify(HEALTH_DATA)
-
-
-# ─── Medicine Suggestions ──────────────────────────────────────────────────────
-MEDICINE_SUGGESTIONS = {
-    "Common Cold": ["Paracetamol (500mg)", "Vitamin C supplements", "Steam inhalation", "Antihistamine (if runny nose)"],
-    "Flu": ["Paracetamol (500mg) every 6 hrs", "Rest and fluids", "ORS if sweating heavily", "Consult doctor for antivirals"],
-    "Malaria": ["⚠️ Prescription needed - visit doctor immediately", "Do NOT self-medicate with chloroquine without test"],
-    "Dengue": ["Paracetamol ONLY (avoid ibuprofen/aspirin)", "ORS every hour", "Platelet monitoring required"],
-    "Migraine": ["Ibuprofen 400mg or Paracetamol", "Rest in dark quiet room", "Cold compress on head"],
-    "Gastroenteritis": ["ORS after every loose motion", "Zinc tablets (10 days for children)", "Avoid dairy temporarily"],
-    "Food Poisoning": ["ORS every 15-20 mins", "Activated charcoal (if available)", "Avoid solid food for 6 hours"],
-    "Asthma": ["Use prescribed inhaler immediately", "Sit upright, breathe slowly", "Avoid triggers"],
-    "Allergy": ["Cetirizine 10mg (antihistamine)", "Avoid allergen", "Calamine lotion for skin rash"],
-    "Vertigo": ["Betahistine (consult pharmacist)", "Rest, avoid sudden movements", "Ginger tea may help"],
-    "Anemia": ["Iron + Folic acid supplements", "Eat iron-rich foods (spinach, lentils)", "Vitamin C with iron for absorption"],
-}
+    aggregates = state().aggregates
+    version = (aggregates.version, datetime.now().strftime("%Y-%m"))
+    return state().responses.respond('health-data', version, aggregates.snapshot)
+
+@bp.route('/api/case-events', methods=['POST'])
+def case_events():
+    # One event or a list: {region, disease, date (YYYY-MM-DD, optional)}
+    data = request.json
+    events = data if isinstance(data, list) else [data]
+    cases = []
+    for event in events:
+        attributed = case_event_from_record(event) if isinstance(event, dict) else None
+        if not attributed:
+            continue
+        try:
+            when = datetime.strptime(event['date'], "%Y-%m-%d") if event.get('date') else None
+        except (TypeError, ValueError):
+            continue
+        cases.append((*attributed, when))
+    state().case_log.append_many(cases)
+    return jsonify({"success": True, "recorded": len(cases), "skipped": len(events) - len(cases)})
+
 
 # ─── Nearby Hospitals (Mock data for AP regions) ────────────────────────────────
-HOSPITALS = {
+HOSPITALS = VersionedDict({
     "anantapur": [
-        {"name": "Government General Hospital Anantapur", "type": "Government", "distance": "2.1 km", "phone": "08554-272233", "emergency": True},
-        {"name": "Srinivasa Nursing Home", "type": "Private", "distance": "3.4 km", "phone": "08554-275566", "emergency": True},
-        {"name": "PHC Anantapur North", "type": "PHC", "distance": "1.2 km", "phone": "08554-277788", "emergency": False},
+        {"name": "Government General Hospital Anantapur", "type": "Government", "distance": "2.1 km", "phone": "08554-272233", "emergency": True, "lat": 14.6819, "lon": 77.6006},
+        {"name": "Srinivasa Nursing Home", "type": "Private", "distance": "3.4 km", "phone": "08554-275566", "emergency": True, "lat": 14.6952, "lon": 77.5862},
+        {"name": "PHC Anantapur North", "type": "PHC", "distance": "1.2 km", "phone": "08554-277788", "emergency": False, "lat": 14.6975, "lon": 77.604},
     ],
     "kurnool": [
-        {"name": "Government General Hospital Kurnool", "type": "Government", "distance": "1.8 km", "phone": "08518-222444", "emergency": True},
-        {"name": "Raghavendra Hospital", "type": "Private", "distance": "4.2 km", "phone": "08518-226688", "emergency": True},
+        {"name": "Government General Hospital Kurnool", "type": "Government", "distance": "1.8 km", "phone": "08518-222444", "emergency": True, "lat": 15.8281, "lon": 78.0373},
+        {"name": "Raghavendra Hospital", "type": "Private", "distance": "4.2 km", "phone": "08518-226688", "emergency": True, "lat": 15.812, "lon": 78.0511},
     ],
     "default": [
         {"name": "Nearest Government Hospital", "type": "Government", "distance": "Varies", "phone": "104 (Health Helpline)", "emergency": True},
         {"name": "Call Health Helpline", "type": "Helpline", "distance": "—", "phone": "104", "emergency": True},
         {"name": "Emergency Services", "type": "Emergency", "distance": "—", "phone": "108", "emergency": True},
     ]
-}
+})
+
+# ─── Facility Locator ──────────────────────────────────────────────────────────
+# Facilities with coordinates (HOSPITALS plus an optional FACILITY_REGISTRY CSV
+# with name,type,phone,emergency,lat,lon,district columns) are bucketed into a
+# lat/lon grid; k-nearest and radius queries search outward ring by ring, so
+# only nearby cells are ever measured.
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.19
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def load_facility_registry(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return [dict(row, lat=float(row['lat']), lon=float(row['lon']), emergency=parse_flag(row.get('emergency', '')))
+                for row in csv.DictReader(f) if row.get('lat') and row.get('lon')]
+
+FACILITY_REGISTRY = load_facility_registry(os.environ['FACILITY_REGISTRY']) if os.environ.get('FACILITY_REGISTRY') else []
+
+class FacilityIndex:
+    CELL_DEG = 0.1  # ~11 km
+    MAX_RINGS = 16  # ~175 km of rings; queries that need more scan every facility at once
+
+    def __init__(self, facilities, version=None):
+        self.version = version
+        self.facilities = [f for f in facilities if f.get('lat') is not None and f.get('lon') is not None]
+        self.lat = np.array([f['lat'] for f in self.facilities], dtype=float)
+        self.lon = np.array([f['lon'] for f in self.facilities], dtype=float)
+        self.types = np.array([str(f.get('type', '')).lower() for f in self.facilities], dtype=object)
+        self.emergency = np.array([bool(f.get('emergency')) for f in self.facilities], dtype=bool)
+        cells = {}
+        for i, (lat, lon) in enumerate(zip(self.lat, self.lon)):
+            cells.setdefault(self._cell(lat, lon), []).append(i)
+        self._cells = {cell: np.array(ids) for cell, ids in cells.items()}
+        rows = [cell[0] for cell in cells] or [0]
+        cols = [cell[1] for cell in cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.CELL_DEG)), int(math.floor(lon / self.CELL_DEG))
+
+    def _ring(self, row, col, r):
+        # Cells r steps from (row, col), clipped to the box holding every facility
+        if r == 0:
+            return [(row, col)]
+        lo_row, hi_row, lo_col, hi_col = self._bounds
+        cols = range(max(col - r, lo_col), min(col + r, hi_col) + 1)
+        rows = range(max(row - r + 1, lo_row), min(row + r - 1, hi_row) + 1)
+        cells = [(row + dr, c) for dr in (-r, r) if lo_row <= row + dr <= hi_row for c in cols]
+        cells += [(rr, col + dc) for dc in (-r, r) if lo_col <= col + dc <= hi_col for rr in rows]
+        return cells
+
+    def _filter(self, candidates, facility_type, emergency):
+        if facility_type:
+            candidates = candidates[self.types[candidates] == facility_type.lower()]
+        if emergency is not None:
+            candidates = candidates[self.emergency[candidates] == emergency]
+        return candidates
+
+    def query(self, lat, lon, k=None, radius_km=None, facility_type=None, emergency=None):
+        # Facilities sorted by distance: the k nearest and/or all within radius_km
+        row, col = self._cell(lat, lon)
+        lo_row, hi_row, lo_col, hi_col = self._bounds
+        max_ring = max(abs(row - lo_row), abs(row - hi_row), abs(col - lo_col), abs(col - hi_col))
+        ids, dists = [], []
+        for r in range(min(max_ring, self.MAX_RINGS) + 1):
+            for cell in self._ring(row, col, r):
+                candidates = self._cells.get(cell)
+                if candidates is None:
+                    continue
+                candidates = self._filter(candidates, facility_type, emergency)
+                if len(candidates):
+                    ids.append(candidates)
+                    dists.append(haversine_km(lat, lon, self.lat[candidates], self.lon[candidates]))
+            # Everything outside rings 0..r is at least this far away
+            covered = r * self.CELL_DEG * KM_PER_DEGREE * math.cos(math.radians(min(abs(lat) + (r + 1) * self.CELL_DEG, 89.0)))
+            if radius_km is not None and covered >= radius_km:
+                break
+            if radius_km is None and k and ids and sum(len(i) for i in ids) >= k:
+                if np.partition(np.concatenate(dists), k - 1)[k - 1] <= covered:
+                    break
+        else:
+            if max_ring > self.MAX_RINGS:
+                # Sparse results or a point far from the facilities: one vectorized
+                # pass costs less than walking the remaining rings
+                candidates = self._filter(np.arange(len(self.facilities)), facility_type, emergency)
+                ids, dists = [candidates], [haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])]
+        if not ids:
+            return []
+        ids, dists = np.concatenate(ids), np.concatenate(dists)
+        if radius_km is not None:
+            keep = dists <= radius_km
+            ids, dists = ids[keep], dists[keep]
+        if k and len(dists) > k:
+            nearest = np.argpartition(dists, k - 1)[:k]
+            ids, dists = ids[nearest], dists[nearest]
+        order = np.argsort(dists, kind='stable')
+        return [(self.facilities[ids[i]], float(dists[i])) for i in order]
+
+_facility_index = {"index": None}
+_facility_lock = threading.Lock()
+
+def facility_index():
+    index = _facility_index["index"]
+    if index is None or index.version != HOSPITALS.version:
+        with _facility_lock:
+            index = _facility_index["index"]
+            if index is None or index.version != HOSPITALS.version:
+                facilities = [dict(f, district=district.title()) for district, entries in HOSPITALS.items()
+                              if district != 'default' for f in entries]
+                index = _facility_index["index"] = FacilityIndex(facilities + FACILITY_REGISTRY, HOSPITALS.version)
+    return index
 
-# ─── Patient History (in-memory store) ─────────────────────────────────────────
-patient_history = []
+# ─── Patient History Store ─────────────────────────────────────────────────────
+# Backend chosen by HISTORY_STORE ("sqlite" default, or "memory"). Both return
+# pages newest-first with a cursor (the last id returned) for the next page.
+class SQLiteBacked:
+    # Shared by the SQLite stores: one WAL database file for every worker process,
+    # with one connection per thread, reopened after a fork
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript("PRAGMA journal_mode=WAL;" + self.SCHEMA)
+
+    def _connect(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+class MemoryHistoryStore:
+    def __init__(self):
+        self._records = []
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        return [record_id for record_id, _ in self.append_uploads(records)]
+
+    def append_uploads(self, records):
+        # [(id, stored)]: a record whose client_id was uploaded before is not
+        # stored again and gets the earlier record's id
+        with self._lock:
+            results = []
+            for record in records:
+                client_id = record.get('client_id')
+                if client_id is not None and str(client_id) in self._uploads:
+                    record['id'] = self._uploads[str(client_id)]
+                    results.append((record['id'], False))
+                    continue
+                record['id'] = len(self._records) + 1
+                self._records.append(record)
+                if client_id is not None:
+                    self._uploads[str(client_id)] = record['id']
+                results.append((record['id'], True))
+            return results
+
+    def page(self, limit=10, cursor=None, region=None, since=None):
+        with self._lock:
+            candidates = self._records if cursor is None else self._records[:max(cursor - 1, 0)]
+        found = []
+        for record in reversed(candidates):
+            # Not break: records uploaded by /api/sync keep their offline timestamps,
+            # so ids are not in timestamp order
+            if since and record['timestamp'] < since:
+                continue
+            if region and record.get('region') != region:
+                continue
+            found.append(record)
+            if len(found) > limit:
+                break
+        return found[:limit], (found[limit - 1]['id'] if len(found) > limit else None)
+
+class SQLiteHistoryStore(SQLiteBacked):
+    # WAL-mode SQLite with group commit: requests queue their records and a single
+    # writer thread inserts everything waiting in one transaction, so concurrent
+    # saves share an fsync and ids come from SQLite's AUTOINCREMENT.
+    BATCH_SIZE = 500
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS patient_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            region TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_timestamp ON patient_history (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_history_region ON patient_history (region, id);
+        CREATE TABLE IF NOT EXISTS history_uploads (
+            client_id TEXT PRIMARY KEY,
+            history_id INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path):
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        super().__init__(path)
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._write_loop, args=(self._queue,), daemon=True)
+                self._writer.start()
+
+    def _write_loop(self, pending):
+        conn = self._connect()
+        while True:
+            batch = [pending.get()]
+            try:
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(pending.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                with conn:
+                    # Take the write lock up front so the client_id checks below
+                    # can't race another worker's upload of the same records
+                    conn.execute("BEGIN IMMEDIATE")
+                    for slot in batch:
+                        slot['results'] = [self._insert(conn, r) for r in slot['records']]
+            except sqlite3.Error as e:
+                for slot in batch:
+                    slot['error'] = e
+            for slot in batch:
+                slot['done'].set()
+
+    @staticmethod
+    def _insert(conn, record):
+        client_id = record.get('client_id')
+        if client_id is not None:
+            row = conn.execute("SELECT history_id FROM history_uploads WHERE client_id = ?", (str(client_id),)).fetchone()
+            if row:
+                return row[0], False
+        record_id = conn.execute(
+            "INSERT INTO patient_history (timestamp, region, record) VALUES (?, ?, ?)",
+            (record['timestamp'], record.get('region'), json.dumps(record)),
+        ).lastrowid
+        if client_id is not None:
+            conn.execute("INSERT INTO history_uploads (client_id, history_id) VALUES (?, ?)", (str(client_id), record_id))
+        return record_id, True
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        return [record_id for record_id, _ in self.append_uploads(records)]
+
+    def append_uploads(self, records):
+        # [(id, stored)], as MemoryHistoryStore.append_uploads
+        self._ensure_writer()
+        slot = {"records": records, "done": threading.Event()}
+        self._queue.put(slot)
+        slot['done'].wait()
+        if 'error' in slot:
+            raise slot['error']
+        for record, (record_id, _) in zip(records, slot['results']):
+            record['id'] = record_id
+        return slot['results']
+
+    def page(self, limit=10, cursor=None, region=None, since=None):
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if region:
+            clauses.append("region = ?")
+            params.append(region)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id, record FROM patient_history {where} ORDER BY id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+        records = [dict(json.loads(record), id=record_id) for record_id, record in rows[:limit]]
+        return records, (rows[limit - 1][0] if len(rows) > limit else None)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'healthai_history.db')
 
 # ─── Outbreak Alerts ───────────────────────────────────────────────────────────
-OUTBREAK_ALERTS = [
+# Baseline alerts; each app's detector starts from a copy (see AppState)
+OUTBREAK_ALERTS = VersionedList([
     {"region": "Kadapa", "disease": "Malaria", "level": "RED", "cases_7days": 47, "message": "Active outbreak - avoid stagnant water areas"},
     {"region": "Anantapur", "disease": "Dengue", "level": "ORANGE", "cases_7days": 28, "message": "Rising cases - use mosquito repellent"},
     {"region": "Nellore", "disease": "Cholera", "level": "ORANGE", "cases_7days": 19, "message": "Water contamination suspected - boil water before drinking"},
     {"region": "Vizag", "disease": "COVID-19", "level": "YELLOW", "cases_7days": 12, "message": "Mild uptick - masks recommended in crowded spaces"},
-]
+])
 
-# ─── Hindi/Telugu Translations ─────────────────────────────────────────────────
-TRANSLATIONS = {
-    "te": {
-        "emergency": "అత్యవసర పరిస్థితి",
-        "high": "అధిక ప్రమాదం",
-        "moderate": "మోస్తరు ప్రమాదం",
-        "low": "తక్కువ ప్రమాదం",
-        "call_108": "108కి వెంటనే కాల్ చేయండి",
-        "visit_today": "ఈరోజే ఆసుపత్రికి వెళ్ళండి",
-        "visit_soon": "24-48 గంటల్లో క్లినిక్‌కు వెళ్ళండి",
-        "rest": "విశ్రాంతి తీసుకోండి, నీళ్ళు ఎక్కువగా తాగండి",
-    },
-    "hi": {
-        "emergency": "आपातकालीन स्थिति",
-        "high": "उच्च जोखिम",
-        "moderate": "मध्यम जोखिम",
-        "low": "कम जोखिम",
-        "call_108": "तुरंत 108 पर कॉल करें",
-        "visit_today": "आज ही अस्पताल जाएं",
-        "visit_soon": "24-48 घंटे में क्लिनिक जाएं",
-        "rest": "आराम करें और खूब पानी पिएं",
-    }
+# ─── Outbreak Detector ─────────────────────────────────────────────────────────
+# Each (district, disease) keeps a 7-day ring of daily counts with a running
+# window total, an EWMA baseline of daily counts and a one-sided CUSUM. An event
+# touches only its own key, and rolling over days is capped, so every update is
+# constant time. Level changes are written straight into the alert list it keeps.
+ALERT_LEVEL_ORDER = {"RED": 0, "ORANGE": 1, "YELLOW": 2}
+ALERT_PREFIXES = {"RED": "Active outbreak", "ORANGE": "Rising cases", "YELLOW": "Mild uptick"}
+ALERT_ADVICE = {
+    "Malaria": "avoid stagnant water areas",
+    "Dengue": "use mosquito repellent",
+    "Chikungunya": "use mosquito repellent",
+    "Cholera": "boil water before drinking",
+    "Typhoid": "boil water before drinking",
+    "Gastroenteritis": "boil water before drinking",
+    "COVID-19": "masks recommended in crowded spaces",
+    "Flu": "masks recommended in crowded spaces",
 }
 
-@app.route('/hospitals')
+class OutbreakDetector:
+    WINDOW_DAYS = 7
+    MAX_ROLL_DAYS = 28     # longer gaps reset the key instead of replaying empty days
+    ALPHA = 0.1            # EWMA smoothing of the daily baseline
+    CUSUM_K = 0.5          # CUSUM allowance, in baseline standard deviations
+    MIN_SD = 1.0
+    PRIOR_MEAN = 1.0       # starting baseline (cases/day) for a key with no history
+    MIN_CASES = 5          # no alert below this many cases in the window
+    # (level, z-score of the 7-day total, CUSUM) — either threshold triggers the level
+    THRESHOLDS = [("RED", 3.0, 8.0), ("ORANGE", 2.0, 5.5), ("YELLOW", 1.5, 4.0)]
+
+    def __init__(self, alerts=None):
+        self.alerts = alerts
+        self._states = {}
+        self._positions = {}
+        self._by_region = {}
+        self._revisions = {}  # key -> revision of its last alert change; kept after removal
+        if alerts is not None:
+            self._positions = {(a["region"], a["disease"]): i for i, a in enumerate(alerts)}
+            today = datetime.now().toordinal()
+            for key, pos in self._positions.items():
+                self._by_region.setdefault(key[0], set()).add(key)
+                self._states[key] = self._seeded_state(alerts[pos], today)
+        self._lock = threading.Lock()
+
+    def _seeded_state(self, alert, day):
+        # A baseline alert's key starts from its 7-day count, spread over the
+        # window so it ages out like real cases, with the daily baseline set so
+        # the detector grades that count at the alert's own level. Otherwise the
+        # first live case would re-grade (or remove) the alert.
+        total = int(alert.get("cases_7days", 0))
+        ring = [0] * self.WINDOW_DAYS
+        for i in range(self.WINDOW_DAYS):
+            ring[(day - i) % self.WINDOW_DAYS] = total // self.WINDOW_DAYS + (i < total % self.WINDOW_DAYS)
+        z_min = next((z for level, z, _ in self.THRESHOLDS if level == alert.get("level")), 0.0)
+        low, high = 0.0, total / self.WINDOW_DAYS
+        for _ in range(40):  # largest baseline at which the total still reaches z_min
+            mean = (low + high) / 2
+            sd = max(math.sqrt(mean), self.MIN_SD)
+            if (total - self.WINDOW_DAYS * mean) / (sd * math.sqrt(self.WINDOW_DAYS)) >= z_min:
+                low = mean
+            else:
+                high = mean
+        state = {"day": day, "ring": ring, "total": total, "mean": low, "var": low, "cusum": 0.0}
+        state["level"] = self._level(state)[0]
+        return state
+
+    def region_alert(self, region):
+        # The region's most severe alert (then most cases), or None
+        with self._lock:
+            alerts = [self.alerts[self._positions[key]] for key in self._by_region.get(region.strip().title(), ())]
+        return min(alerts, key=lambda a: (ALERT_LEVEL_ORDER.get(a["level"], 3), -a["cases_7days"]), default=None)
+
+    def _roll(self, state, day):
+        if day - state["day"] > self.MAX_ROLL_DAYS:
+            state.update(day=day, ring=[0] * self.WINDOW_DAYS, total=0, cusum=0.0)
+            return
+        ring = state["ring"]
+        while state["day"] < day:
+            closed = ring[state["day"] % self.WINDOW_DAYS]
+            sd = max(math.sqrt(state["var"]), self.MIN_SD)
+            state["cusum"] = max(0.0, state["cusum"] + (closed - state["mean"]) / sd - self.CUSUM_K)
+            diff = closed - state["mean"]
+            state["mean"] += self.ALPHA * diff
+            state["var"] = (1 - self.ALPHA) * (state["var"] + self.ALPHA * diff * diff)
+            state["day"] += 1
+            slot = state["day"] % self.WINDOW_DAYS
+            state["total"] -= ring[slot]
+            ring[slot] = 0
+
+    def _level(self, state):
+        if state["total"] < self.MIN_CASES:
+            return None, 0.0, 0.0
+        sd = max(math.sqrt(state["var"]), self.MIN_SD)
+        today = state["ring"][state["day"] % self.WINDOW_DAYS]
+        cusum = max(0.0, state["cusum"] + (today - state["mean"]) / sd - self.CUSUM_K)
+        z = (state["total"] - self.WINDOW_DAYS * state["mean"]) / (sd * math.sqrt(self.WINDOW_DAYS))
+        for level, z_min, cusum_min in self.THRESHOLDS:
+            if z >= z_min or cusum >= cusum_min:
+                return level, z, cusum
+        return None, z, cusum
+
+    def checkpoint(self):
+        with self._lock:
+            return {"states": [[*key, dict(state, ring=list(state["ring"]))] for key, state in self._states.items()],
+                    "alerts": list(self.alerts),
+                    "revisions": [[*key, rev] for key, rev in self._revisions.items()]}
+
+    def restore(self, data):
+        with self._lock:
+            self._states = {(region, disease): state for region, disease, state in data["states"]}
+            self._revisions = {(region, disease): rev for region, disease, rev in data["revisions"]}
+            self.alerts[:] = data["alerts"]
+            self._positions = {(a["region"], a["disease"]): i for i, a in enumerate(self.alerts)}
+            self._by_region = {}
+            for key in self._positions:
+                self._by_region.setdefault(key[0], set()).add(key)
+
+    def changes_since(self, revision):
+        # (alerts changed after revision, [(region, disease) of alerts removed since]);
+        # alerts never changed since start-up count as revision 0
+        with self._lock:
+            current = [self.alerts[pos] for key, pos in self._positions.items() if self._revisions.get(key, 0) > revision]
+            removed = [key for key, rev in self._revisions.items() if rev > revision and key not in self._positions]
+            return current, removed
+
+    def observe(self, district, disease, when=None, count=1, revision=0):
+        # Returns the alert when this event changes the key's level, else None.
+        # revision (the case-log id) is recorded against alerts the event changes
+        key = (district.strip().title(), disease)
+        day = (when or datetime.now()).toordinal()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = {"day": day, "ring": [0] * self.WINDOW_DAYS, "total": 0,
+                                             "mean": self.PRIOR_MEAN, "var": self.PRIOR_MEAN, "cusum": 0.0, "level": None}
+            if day > state["day"]:
+                self._roll(state, day)
+            elif day <= state["day"] - self.WINDOW_DAYS:
+                return None  # older than the window
+            state["ring"][day % self.WINDOW_DAYS] += count
+            state["total"] += count
+            level, z, cusum = self._level(state)
+            changed = level != state["level"]
+            state["level"] = level
+            alert = None
+            if level:
+                advice = ALERT_ADVICE.get(disease, "report new cases promptly")
+                alert = {"region": key[0], "disease": disease, "level": level, "cases_7days": state["total"],
+                         "message": f"{ALERT_PREFIXES[level]} - {advice}"}
+            self._publish(key, alert, revision)
+            if changed:
+                return alert or {"region": key[0], "disease": disease, "level": None, "cases_7days": state["total"]}
+            return None
+
+    def _publish(self, key, alert, revision):
+        if self.alerts is None:
+            return
+        pos = self._positions.get(key)
+        if alert or pos is not None:
+            self._revisions[key] = revision
+        if alert and pos is not None:
+            self.alerts[pos] = alert
+        elif alert:
+            self._positions[key] = len(self.alerts)
+            self._by_region.setdefault(key[0], set()).add(key)
+            self.alerts.append(alert)
+        elif pos is not None:
+            # Swap-remove keeps removal O(1); readers sort by level
+            last = self.alerts[-1]
+            self.alerts[pos] = last
+            self._positions[(last["region"], last["disease"])] = pos
+            self.alerts.pop()
+            del self._positions[key]
+            self._by_region[key[0]].discard(key)
+
+def sorted_alerts(alerts):
+    return sorted(alerts, key=lambda a: (ALERT_LEVEL_ORDER.get(a["level"], 3), -a["cases_7days"]))
+
+# ─── Push Channel ──────────────────────────────────────────────────────────────
+# Alert and dashboard changes go into one shared ring buffer with increasing ids.
+# Subscribers keep only their last seen id and sleep on a Condition, so an idle
+# client costs no queue; under gevent (serve.py) it costs no thread either.
+# Ids come from the case log (see below), so they may have gaps but mean the
+# same event on every worker, and Last-Event-ID survives landing on another one.
+class EventBroker:
+    def __init__(self, history=10000):
+        self._events = deque(maxlen=history)
+        self.last_id = 0
+        self._evicted_id = 0
+        self._cond = threading.Condition()
+
+    def publish(self, topic, region, data, event_id=None):
+        with self._cond:
+            event_id = event_id or self.last_id + 1
+            if len(self._events) == self._events.maxlen:
+                self._evicted_id = self._events[0][0]
+            self._events.append((event_id, topic, region, data))
+            self.last_id = event_id
+            self._cond.notify_all()
+
+    def restart_at(self, last_id):
+        # After restoring a checkpoint: earlier events are gone, so resuming before last_id resets
+        with self._cond:
+            self._events.clear()
+            self.last_id = self._evicted_id = last_id
+
+    def wait(self, last_id, timeout):
+        # Events after last_id (blocking up to timeout), and whether some were already evicted
+        with self._cond:
+            if last_id >= self.last_id:
+                self._cond.wait(timeout)
+            if last_id >= self.last_id:
+                return [], False
+            # New events are at the tail, so scan back only as far as last_id
+            fresh = list(itertools.takewhile(lambda e: e[0] > last_id, reversed(self._events)))
+            return fresh[::-1], last_id < self._evicted_id
+
+SSE_HEARTBEAT_SECONDS = 15
+
+def sse_frames(broker, last_id, regions, topics):
+    yield "retry: 5000\n\n"
+    while True:
+        events, missed = broker.wait(last_id, SSE_HEARTBEAT_SECONDS)
+        if missed:
+            # Resume point fell out of the buffer: client should refetch full state
+            last_id = events[0][0] - 1 if events else broker.last_id
+            yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+        if not events:
+            yield ": heartbeat\n\n"
+            continue
+        # Dashboard updates are per-district totals, so only the newest one per district matters
+        newest = {}
+        for event_id, topic, region, _ in events:
+            if topic == "dashboard":
+                newest[region] = event_id
+        for event_id, topic, region, data in events:
+            if topic not in topics or (regions and region and region not in regions):
+                continue
+            if topic == "dashboard" and newest[region] != event_id:
+                continue
+            yield f"id: {event_id}\nevent: {topic}\ndata: {json.dumps(data)}\n\n"
+        last_id = events[-1][0]
+
+# ─── Case Log ──────────────────────────────────────────────────────────────────
+# Every case event is appended to one ordered log. Each worker replays the log,
+# in id order, into its own aggregates, detector and broker, so all workers
+# converge on the same dashboard, alerts and event ids. Case n publishes event
+# 2n (dashboard) and, when its alert level changes, 2n+1 (alerts).
+# The SQLite log also keeps a checkpoint of that derived state every
+# CHECKPOINT_EVERY cases, so a starting worker restores it and replays only the
+# cases logged after it instead of every case ever recorded.
+class MemoryCaseLog:
+    # Single process: events are applied as they are appended
+    def __init__(self, state):
+        self.state = state
+        self.applied_id = 0
+        self.epoch = os.urandom(4).hex()  # this log's identity, for sync cursors
+        self._lock = threading.Lock()
+
+    def append_many(self, cases):
+        with self._lock:
+            for district, disease, when in cases:
+                self.state.apply_case(self.applied_id + 1, district, disease, when or datetime.now())
+                self.applied_id += 1
+
+    def sync(self):
+        pass
+
+class SQLiteCaseLog(SQLiteBacked):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS case_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            district TEXT NOT NULL,
+            disease TEXT NOT NULL,
+            at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS case_log_epoch (epoch TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS case_checkpoints (case_id INTEGER PRIMARY KEY, state TEXT NOT NULL);
+    """
+    CHECKPOINT_EVERY = 5000
+
+    def __init__(self, path, state):
+        self.state = state
+        self.applied_id = 0
+        self._apply_lock = threading.Lock()
+        super().__init__(path)
+        # Chosen when the database is created; a new database invalidates sync cursors
+        with self._connect() as conn:
+            conn.execute("INSERT INTO case_log_epoch SELECT ? WHERE NOT EXISTS (SELECT 1 FROM case_log_epoch)", (os.urandom(4).hex(),))
+            self.epoch = conn.execute("SELECT epoch FROM case_log_epoch").fetchone()[0]
+
+    def append_many(self, cases):
+        # The timestamp is fixed here so every worker replays the same event
+        if cases:
+            now = datetime.now()
+            rows = [(district, disease, (when or now).isoformat(timespec='seconds')) for district, disease, when in cases]
+            with self._connect() as conn:
+                conn.executemany("INSERT INTO case_events (district, disease, at) VALUES (?, ?, ?)", rows)
+        self.sync()
+
+    def sync(self):
+        # Apply everything appended (by any worker) since the last sync
+        with self._apply_lock:
+            conn = self._connect()
+            if not self.applied_id:
+                checkpoint = conn.execute("SELECT case_id, state FROM case_checkpoints ORDER BY case_id DESC LIMIT 1").fetchone()
+                if checkpoint:
+                    self.state.restore_cases(checkpoint[0], json.loads(checkpoint[1]))
+                    self.applied_id = checkpoint[0]
+            rows = conn.execute(
+                "SELECT id, district, disease, at FROM case_events WHERE id > ? ORDER BY id", (self.applied_id,)
+            ).fetchall()
+            for case_id, district, disease, at in rows:
+                self.state.apply_case(case_id, district, disease, datetime.fromisoformat(at))
+                self.applied_id = case_id
+                if case_id % self.CHECKPOINT_EVERY == 0:
+                    self._checkpoint(conn, case_id)
+
+    def _checkpoint(self, conn, case_id):
+        # Every worker reaches the same state at case_id, so whichever gets here first writes it
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO case_checkpoints VALUES (?, ?)",
+                         (case_id, json.dumps(self.state.checkpoint_cases())))
+            conn.execute("DELETE FROM case_checkpoints WHERE case_id < ?", (case_id,))
+
+# ─── Frontline Counters ────────────────────────────────────────────────────────
+# Per-(district, day) tallies, bumped as records are written, so the frontline
+# summary is a handful of keyed lookups however many records a district has.
+FRONTLINE_METRICS = ("visits", "referrals", "pending_reports", "due_followup")
+REFERRAL_URGENCIES = {"EMERGENCY", "HIGH"}
+
+def history_counts(record):
+    # A saved visit; HIGH/EMERGENCY triage is a referral, and a record with no
+    # attributable disease still needs its report completed
+    region = record.get('region')
+    if not isinstance(region, str) or not region.strip():
+        return []
+    key = (region.strip().title(), record['timestamp'][:10])
+    metrics = ["visits"]
+    if record.get('urgency') in REFERRAL_URGENCIES:
+        metrics.append("referrals")
+    if not case_event_from_record(record):
+        metrics.append("pending_reports")
+    return [key + (metric,) for metric in metrics]
+
+def doctor_district(doctor):
+    # "Anantapur PHC" -> "Anantapur"
+    return doctor['location'].split()[0].title()
+
+class MemoryDailyCounters:
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def get(self, district, day):
+        return {metric: self._counts.get((district, day, metric), 0) for metric in FRONTLINE_METRICS}
+
+class SQLiteDailyCounters(SQLiteBacked):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS daily_counters (
+            district TEXT NOT NULL,
+            day TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (district, day, metric)
+        ) WITHOUT ROWID;
+    """
+
+    def add(self, keys):
+        if keys:
+            with self._connect() as conn:
+                conn.executemany("INSERT INTO daily_counters VALUES (?, ?, ?, 1) "
+                                 "ON CONFLICT (district, day, metric) DO UPDATE SET count = count + 1", keys)
+
+    def get(self, district, day):
+        counts = dict(self._connect().execute(
+            "SELECT metric, count FROM daily_counters WHERE district = ? AND day = ?", (district, day)))
+        return {metric: counts.get(metric, 0) for metric in FRONTLINE_METRICS}
+
+@bp.route('/hospitals')
 def hospitals():
     return render_template('hospitals.html')
 
-@app.route('/history')
+@bp.route('/history')
 def history():
     return render_template('history.html')
 
-@app.route('/bmi')
+@bp.route('/bmi')
 def bmi():
     return render_template('bmi.html')
 
-@app.route('/api/hospitals')
+@bp.route('/api/hospitals')
 def get_hospitals():
     region = request.args.get('region', 'default').lower()
-    data = HOSPITALS.get(region, HOSPITALS['default'])
-    return jsonify(data)
+    if region not in HOSPITALS:
+        region = 'default'
+    return state().responses.respond(('hospitals', region), HOSPITALS.version, lambda: HOSPITALS[region])
+
+@bp.route('/api/hospitals/nearest')
+def nearest_hospitals():
+    # ?lat=&lon= with k (default 5) and/or radius_km; optional type= and emergency=true/false
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"error": "Please provide valid lat and lon"}), 400
+    radius_km = request.args.get('radius_km', type=float)
+    k = request.args.get('k', type=int)
+    if k is None:
+        k = 100 if radius_km is not None else 5
+    k = max(1, min(k, 100))
+    emergency = request.args.get('emergency')
+    results = facility_index().query(lat, lon, k, radius_km, request.args.get('type'), parse_flag(emergency) if emergency else None)
+    return jsonify([dict(f, distance_km=round(d, 2), distance=f"{d:.1f} km") for f, d in results])
 
-@app.route('/api/medicines')
+@bp.route('/api/medicines')
 def get_medicines():
     condition = request.args.get('condition', '')
     suggestions = MEDICINE_SUGGESTIONS.get(condition, ["Consult a doctor for appropriate medication"])
     return jsonify({"condition": condition, "medicines": suggestions})
 
-@app.route('/api/outbreak-alerts')
+@bp.route('/api/outbreak-alerts')
 def outbreak_alerts():
-    return jsonify(OUTBREAK_ALERTS)
+    alerts = state().alerts
+    return state().responses.respond('outbreak-alerts', alerts.version, lambda: sorted_alerts(alerts))
 
-@app.route('/api/save-history', methods=['POST'])
+@bp.route('/api/stream')
+def event_stream():
+    # Server-sent events. ?region=Kadapa,Guntur and ?topics=alerts,dashboard filter;
+    # Last-Event-ID (header or ?last_event_id=) resumes after a reconnect
+    regions = {r.strip().title() for r in ','.join(request.args.getlist('region')).split(',') if r.strip()}
+    topics = set(request.args.get('topics', 'alerts,dashboard').split(','))
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', state().broker.last_id, type=int)
+    return Response(stream_with_context(sse_frames(state().broker, last_id, regions, topics)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def record_history(records):
+    # Stores visit records (each with its timestamp set) and feeds the frontline
+    # counters and the case log. A re-uploaded record (same client_id) is stored
+    # and counted once. Returns [(id, stored)]
+    results = state().history.append_uploads(records)
+    fresh = [record for record, (_, stored) in zip(records, results) if stored]
+    state().counters.add([key for record in fresh for key in history_counts(record)])
+    cases = []
+    for record in fresh:
+        attributed = case_event_from_record(record)
+        if attributed:
+            cases.append((*attributed, datetime.strptime(record['timestamp'], "%Y-%m-%d %H:%M")))
+    state().case_log.append_many(cases)
+    return results
+
+@bp.route('/api/save-history', methods=['POST'])
 def save_history():
     data = request.json
     data['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-    data['id'] = len(patient_history) + 1
-    patient_history.append(data)
+    record_history([data])
     return jsonify({"success": True, "id": data['id']})
 
-@app.route('/api/get-history')
+@bp.route('/api/get-history')
 def get_history():
-    return jsonify(patient_history[-10:])  # last 10 records
+    # Last 10 records by default; page back with ?cursor=<X-Next-Cursor>
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    records, next_cursor = state().history.page(limit, request.args.get('cursor', type=int), request.args.get('region'), request.args.get('since'))
+    response = jsonify(records[::-1])  # oldest first, as before
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
 
-@app.route('/api/translate')
+@bp.route('/api/translate')
 def translate():
     lang = request.args.get('lang', 'te')
-    return jsonify(TRANSLATIONS.get(lang, TRANSLATIONS['te']))
+    if lang not in TRANSLATIONS:
+        lang = 'te'
+    return state().responses.respond(('translate', lang), TRANSLATIONS.version, lambda: TRANSLATIONS[lang])
+
+# ─── BMI Screening ─────────────────────────────────────────────────────────────
+# Adults (19+) are classified on BMI cut-offs. Children aged 2-18 are classified
+# on their BMI-for-age z-score against the BMI_FOR_AGE reference (LMS method,
+# WHO 2006/2007), which is interpolated to every month once per KB version.
+# (upper BMI bound, category, colour, advice, risk)
+BMI_CATEGORIES = [
+    (18.5, "Underweight", "#f59e0b",
+     ["Increase calorie intake with nutritious food", "Eat iron-rich foods (lentils, spinach)", "Consult doctor to rule out malnutrition or anemia", "Add protein: eggs, milk, pulses"],
+     "Risk: Anemia, Malnutrition, Weak immunity"),
+    (25, "Normal Weight", "#16a34a",
+     ["Maintain current healthy lifestyle", "Exercise 30 mins daily", "Balanced diet with fruits and vegetables", "Annual health checkup recommended"],
+     "Low health risk - Keep it up!"),
+    (30, "Overweight", "#ea580c",
+     ["Reduce oil and sugar intake", "Walk 45 mins daily", "Avoid processed/junk food", "Monitor blood pressure and sugar levels"],
+     "Risk: Diabetes, Hypertension, Heart Disease"),
+    (float('inf'), "Obese", "#dc2626",
+     ["Consult doctor for weight management plan", "Strict diet control needed", "Regular exercise under guidance", "Check for diabetes and BP regularly"],
+     "High Risk: Diabetes, Heart Attack, Joint Problems"),
+]
+_BMI_UPPER_BOUNDS = np.array([c[0] for c in BMI_CATEGORIES[:-1]])
+BMI_IDEAL_RANGE = (18.5, 24.9)
+
+# (category, colour, advice, risk) by z-score band: below -3, below -2, normal,
+# above the overweight cut-off, above the obese cut-off
+PEDIATRIC_BMI_CATEGORIES = [
+    ("Severe Thinness", "#dc2626",
+     ["Refer to a doctor or Nutrition Rehabilitation Centre", "Check for infections, worms and anemia", "Energy-dense foods: ghee, jaggery, groundnuts, eggs", "Re-check weight every 2 weeks"],
+     "High Risk: Severe malnutrition, Stunted growth, Infections"),
+    ("Thinness", "#f59e0b",
+     ["Add an extra meal or nutritious snack every day", "Eat iron-rich foods (lentils, spinach, jaggery)", "Deworming as per school schedule", "Re-check growth in 1 month"],
+     "Risk: Undernutrition, Anemia, Weak immunity"),
+    ("Normal Weight", "#16a34a",
+     ["Continue balanced meals with fruits and vegetables", "At least 60 mins of active play daily", "Deworming as per school schedule", "Re-check growth every 6 months"],
+     "Healthy growth - Keep it up!"),
+    ("Overweight", "#ea580c",
+     ["Limit sweets, sugary drinks and fried snacks", "60 mins of outdoor play or sport daily", "Less than 2 hours of screen time a day", "Family meals with more vegetables and pulses"],
+     "Risk: Adult obesity, Diabetes, High BP"),
+    ("Obese", "#dc2626",
+     ["Consult a doctor - no strict diets for children", "Replace junk food and sugary drinks with home food", "Daily sport or outdoor play", "Check blood pressure and sugar as advised"],
+     "High Risk: Diabetes, High BP, Joint Problems"),
+]
+# (overweight, obese) z cut-offs: WHO 2006 standards under 5 years, WHO 2007 reference from 5
+PEDIATRIC_BMI_CUTOFFS = {"under_5": (2.0, 3.0), "5_to_19": (1.0, 2.0)}
+PEDIATRIC_MIN_MONTHS, ADULT_MONTHS = 24, 228
+BMI_SEXES = {"male": 0, "m": 0, "boy": 0, "female": 1, "f": 1, "girl": 1}
+BMI_REFERENCE_NAME = "WHO BMI-for-age"
+
+def bmi_category(bmi):
+    # Index into BMI_CATEGORIES for an (already rounded) adult BMI
+    return int(np.searchsorted(_BMI_UPPER_BOUNDS, bmi, side='right'))
+
+def bmi_result(bmi, height_m, category):
+    _, name, color, advice, risk = BMI_CATEGORIES[category]
+    ideal_min = round(BMI_IDEAL_RANGE[0] * (height_m ** 2), 1)
+    ideal_max = round(BMI_IDEAL_RANGE[1] * (height_m ** 2), 1)
+    return {
+        "bmi": bmi,
+        "category": name,
+        "color": color,
+        "advice": advice,
+        "risk": risk,
+        "ideal_weight_range": f"{ideal_min} - {ideal_max} kg"
+    }
+
+class GrowthReference:
+    # LMS parameters per (sex, month from PEDIATRIC_MIN_MONTHS) as one array
+    def __init__(self, reference):
+        self.version = reference.version
+        months = np.arange(PEDIATRIC_MIN_MONTHS, ADULT_MONTHS)
+        self.lms = np.empty((2, 3, len(months)))
+        for sex, code in (("male", 0), ("female", 1)):
+            points = np.array(reference[sex], dtype=float)
+            for j in range(3):
+                self.lms[code, j] = np.interp(months, points[:, 0], points[:, j + 1])
+
+    def z_scores(self, bmi, months, sexes):
+        # WHO method: LMS z-score, with the tails beyond +/-3 SD measured in
+        # units of the 2-3 SD distance so extreme values aren't compressed
+        L, M, S = self.lms[sexes, :, months - PEDIATRIC_MIN_MONTHS].T
+        z = ((bmi / M) ** L - 1) / (L * S)
+        sd = lambda k: M * (1 + L * S * k) ** (1 / L)
+        z = np.where(z > 3, 3 + (bmi - sd(3)) / (sd(3) - sd(2)), z)
+        z = np.where(z < -3, -3 + (bmi - sd(-3)) / (sd(-2) - sd(-3)), z)
+        return z, sd
+
+_growth = {"reference": None}
+_growth_lock = threading.Lock()
+
+def growth_reference():
+    reference = _growth["reference"]
+    if reference is None or reference.version != BMI_FOR_AGE.version:
+        with _growth_lock:
+            reference = _growth["reference"]
+            if reference is None or reference.version != BMI_FOR_AGE.version:
+                reference = _growth["reference"] = GrowthReference(BMI_FOR_AGE)
+    return reference
+
+def bmi_screening_record(d):
+    # (weight kg, height cm, age in months, sex code or None); raises ValueError
+    # with a message for the caller
+    try:
+        weight, height = float(d.get('weight', 0)), float(d.get('height', 0))
+        if d.get('age_months') not in (None, ''):
+            months = int(float(d['age_months']))
+        elif d.get('age') not in (None, ''):
+            months = int(float(d['age']) * 12)
+        else:
+            months = None
+    except (TypeError, ValueError):
+        raise ValueError("Invalid values") from None
+    if weight <= 0 or height <= 0:
+        raise ValueError("Invalid values")
+    if months is None:
+        raise ValueError("Missing age")
+    sex = BMI_SEXES.get(str(d.get('sex') or d.get('gender') or '').strip().lower())
+    if months < PEDIATRIC_MIN_MONTHS:
+        raise ValueError("BMI-for-age screening starts at 2 years")
+    if months < ADULT_MONTHS and sex is None:
+        raise ValueError("Sex (male/female) is needed to screen children")
+    return weight, height, months, sex
 
-@app.route('/api/bmi', methods=['POST'])
+@timed('bmi_screening')
+def bmi_screening(rows):
+    # rows of bmi_screening_record tuples -> results in the same order. Adults
+    # get exactly the single-record /api/bmi output; children add z_score,
+    # percentile and the reference used
+    weight, height_cm, months = (np.array(c, dtype=float) for c in list(zip(*rows))[:3])
+    months = months.astype(np.int64)
+    height_m = height_cm / 100
+    raw = weight / (height_m ** 2)
+    bmi = np.array([round(x, 1) for x in raw.tolist()])
+    results = [bmi_result(b, h, c) for b, h, c in zip(
+        bmi.tolist(), height_m.tolist(), np.searchsorted(_BMI_UPPER_BOUNDS, bmi, side='right').tolist())]
+
+    child = np.flatnonzero(months < ADULT_MONTHS)
+    if child.size:
+        sexes = np.array([rows[i][3] for i in child], dtype=np.int64)
+        z, sd = growth_reference().z_scores(raw[child], months[child], sexes)
+        under_5 = months[child] < 60
+        over_cut = np.where(under_5, PEDIATRIC_BMI_CUTOFFS["under_5"][0], PEDIATRIC_BMI_CUTOFFS["5_to_19"][0])
+        obese_cut = np.where(under_5, PEDIATRIC_BMI_CUTOFFS["under_5"][1], PEDIATRIC_BMI_CUTOFFS["5_to_19"][1])
+        bands = (z >= -3).astype(np.int64) + (z >= -2) + (z > over_cut) + (z > obese_cut)
+        h2 = height_m[child] ** 2
+        ideal_min, ideal_max = sd(-2) * h2, sd(over_cut) * h2
+        for r, i in enumerate(child.tolist()):
+            name, color, advice, risk = PEDIATRIC_BMI_CATEGORIES[bands[r]]
+            zr = z[r].item()
+            results[i].update(
+                category=name, color=color, advice=advice, risk=risk,
+                ideal_weight_range=f"{round(ideal_min[r].item(), 1)} - {round(ideal_max[r].item(), 1)} kg",
+                z_score=round(zr, 2) + 0.0,  # no -0.0
+                percentile=round(50 * (1 + math.erf(zr / math.sqrt(2))), 1),
+                reference=BMI_REFERENCE_NAME,
+            )
+    return results
+
+def bmi_screening_batch(items, chunk_size=10000):
+    # Streams one result per roster row; memory is bounded by chunk_size
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield from _bmi_screening_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _bmi_screening_chunk(chunk)
+
+def _bmi_screening_chunk(chunk):
+    rows, ids, errors = [], [], {}
+    for index, d in chunk:
+        try:
+            rows.append(bmi_screening_record(d))
+            ids.append((index, d.get('id')))
+        except AttributeError:
+            errors[index] = "Invalid screening record"
+        except ValueError as e:
+            errors[index] = str(e)
+    results = {}
+    for (index, record_id), result in zip(ids, bmi_screening(rows) if rows else []):
+        head = {"index": index}
+        if record_id is not None:
+            head["id"] = record_id
+        results[index] = dict(head, **result)
+    for index, _ in chunk:
+        yield results[index] if index in results else {"index": index, "error": errors[index]}
+
+@bp.route('/api/bmi', methods=['POST'])
 def calculate_bmi():
     data = request.json
     weight = float(data.get('weight', 0))
@@ -385,94 +2407,273 @@ def calculate_bmi():
     if weight <= 0 or height_cm <= 0:
         return jsonify({"error": "Invalid values"}), 400
     
+    # Children are screened on BMI-for-age (and need a sex), adults as before
+    if age < 19:
+        try:
+            return jsonify(bmi_screening([bmi_screening_record(data)])[0])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
     height_m = height_cm / 100
     bmi = round(weight / (height_m ** 2), 1)
-    
-    if bmi < 18.5:
-        category = "Underweight"
-        color = "#f59e0b"
-        advice = ["Increase calorie intake with nutritious food", "Eat iron-rich foods (lentils, spinach)", "Consult doctor to rule out malnutrition or anemia", "Add protein: eggs, milk, pulses"]
-        risk = "Risk: Anemia, Malnutrition, Weak immunity"
-    elif bmi < 25:
-        category = "Normal Weight"
-        color = "#16a34a"
-        advice = ["Maintain current healthy lifestyle", "Exercise 30 mins daily", "Balanced diet with fruits and vegetables", "Annual health checkup recommended"]
-        risk = "Low health risk - Keep it up!"
-    elif bmi < 30:
-        category = "Overweight"
-        color = "#ea580c"
-        advice = ["Reduce oil and sugar intake", "Walk 45 mins daily", "Avoid processed/junk food", "Monitor blood pressure and sugar levels"]
-        risk = "Risk: Diabetes, Hypertension, Heart Disease"
-    else:
-        category = "Obese"
-        color = "#dc2626"
-        advice = ["Consult doctor for weight management plan", "Strict diet control needed", "Regular exercise under guidance", "Check for diabetes and BP regularly"]
-        risk = "High Risk: Diabetes, Heart Attack, Joint Problems"
-    
-    ideal_min = round(18.5 * (height_m ** 2), 1)
-    ideal_max = round(24.9 * (height_m ** 2), 1)
-    
-    return jsonify({
-        "bmi": bmi,
-        "category": category,
-        "color": color,
-        "advice": advice,
-        "risk": risk,
-        "ideal_weight_range": f"{ideal_min} - {ideal_max} kg"
-    })
+    return jsonify(bmi_result(bmi, height_m, bmi_category(bmi)))
 
+@bp.route('/api/bmi-batch', methods=['POST'])
+def bmi_batch():
+    # Class/camp roster as a JSON array, NDJSON or CSV (text/csv); streams NDJSON
+    items = read_batch_items(allow_csv=True)
+    if items is None:
+        return jsonify({"error": "Expected a JSON array, NDJSON or CSV body"}), 400
+    return ndjson_response(bmi_screening_batch(items))
 
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # NEW FEATURES
 # ─────────────────────────────────────────────────────────────────────────────
 
-# AI Health Chatbot KB
-CHATBOT_KB = {
-    "malaria": {"answer": "Malaria is caused by Plasmodium parasites via mosquito bites. Symptoms: high fever, chills, sweating, headache. Prevention: mosquito nets, repellent, eliminate stagnant water. Treatment requires prescription — visit doctor immediately.", "hindi": "मलेरिया मच्छर के काटने से होता है। लक्षण: तेज बुखार, ठंड। तुरंत डॉक्टर से मिलें।", "telugu": "మలేరియా దోమ కాటు వల్ల వస్తుంది. వెంటనే డాక్టర్‌ని సంప్రదించండి."},
-    "dengue": {"answer": "Dengue is spread by Aedes mosquitoes. Symptoms: sudden high fever, rash, severe joint pain. Warning: bleeding or vomiting blood = go to ER. Monitor platelet count.", "hindi": "डेंगू में तेज बुखार, दाने होते हैं। प्लेटलेट काउंट जांचें।", "telugu": "డెంగ్యూ: అకస్మాత్ జ్వరం, దద్దురు. ప్లేట్లెట్ కౌంట్ తనిఖీ చేయండి."},
-    "diabetes": {"answer": "Diabetes = high blood sugar. Symptoms: frequent urination, thirst, blurred vision. Management: diet, exercise, medication, regular sugar monitoring.", "hindi": "मधुमेह में रक्त शर्करा अधिक होती है। व्यायाम और सही खान-पान जरूरी।", "telugu": "మధుమేహం: రక్తంలో చక్కెర అధికం. ఆహార నియంత్రణ, వ్యాయామం అవసరం."},
-    "hypertension": {"answer": "High BP (above 140/90) is a silent killer. Reduce salt, exercise daily, take medications. Check BP regularly.", "hindi": "140/90 से अधिक BP खतरनाक है। नमक कम करें, व्यायाम करें।", "telugu": "140/90 కంటే ఎక్కువ BP ప్రమాదకరం. ఉప్పు తగ్గించండి."},
-    "tuberculosis": {"answer": "TB = bacterial lung infection. Symptoms: cough 2+ weeks, blood in sputum, night sweats. Free DOTS treatment at government hospitals.", "hindi": "टीबी: 2+ सप्ताह खांसी, रात को पसीना। सरकारी अस्पताल में मुफ्त इलाज।", "telugu": "క్షయ: 2+ వారాలు దగ్గు. ప్రభుత్వ ఆసుపత్రిలో ఉచిత DOTS చికిత్స."},
-    "anemia": {"answer": "Anemia = low iron/hemoglobin. Symptoms: fatigue, pale skin, dizziness. Eat iron-rich foods: spinach, lentils, jaggery. Take iron+folic acid tablets.", "hindi": "एनीमिया में आयरन कम होता है। पालक, दाल खाएं, आयरन की गोलियां लें।", "telugu": "రక్తహీనత: పాలకూర, పప్పులు తినండి. ఇనుము మాత్రలు వాడండి."},
-    "covid": {"answer": "COVID-19: fever, cough, loss of smell/taste, breathlessness. Isolate if infected. Vaccinate. Emergency if oxygen below 94%.", "hindi": "COVID-19: बुखार, खांसी, स्वाद/गंध खोना। टीका लगवाएं।", "telugu": "COVID-19: జ్వరం, దగ్గు, వాసన కోల్పోవడం. టీకా వేయించుకోండి."},
-    "cholera": {"answer": "Cholera = waterborne disease. Symptoms: sudden watery diarrhea, vomiting, dehydration. Give ORS immediately. Boil drinking water.", "hindi": "हैजा जल जनित रोग है। ORS पिएं, पानी उबालें।", "telugu": "కలరా: నీళ్ళ విరేచనాలు. ORS తీసుకోండి, నీళ్ళు మరిగించండి."},
-    "fever": {"answer": "Fever above 38C: take paracetamol, cool compress, drink fluids. See doctor if fever persists 3+ days or exceeds 103F.", "hindi": "38C से अधिक बुखार: पैरासिटामोल लें, ठंडी पट्टी लगाएं।", "telugu": "38C కంటే జ్వరం: పారాసిటమాల్ తీసుకోండి."},
-    "default": {"answer": "I can help with malaria, dengue, diabetes, TB, fever, anemia, COVID, cholera, hypertension. Please type your symptom or disease name.", "hindi": "मैं आपका AI स्वास्थ्य सहायक हूं। बीमारी का नाम या लक्षण टाइप करें।", "telugu": "నేను మీ AI ఆరోగ్య సహాయకుడిని. వ్యాధి పేరు లేదా లక్షణం టైప్ చేయండి."},
-}
+CHATBOT_LANG_FIELDS = {"hi": "hindi", "te": "telugu"}
+
+class ChatbotMatcher:
+    # Every KB key and synonym is compiled into one Aho-Corasick automaton, so a
+    # message is scanned once however large the KB grows. Short terms must start at
+    # a word boundary ("tb" is not found in "outbreak"). Each intent scores the total
+    # length of the distinct terms found for it, so a specific name ("dengue") wins
+    # over a generic one ("fever") and ties keep KB order.
+    MIN_INFIX_LENGTH = 4
+
+    def __init__(self, kb, synonyms):
+        self.version = kb.version
+        self.intents = [k for k in kb if k != 'default']
+        index = {k: i for i, k in enumerate(self.intents)}
+        patterns = {k: k for k in self.intents}
+        for key, terms in synonyms.items():
+            if key in index:
+                for term in terms:
+                    patterns.setdefault(term.lower(), key)
+        self._terms = {term: (index[key], len(term)) for term, key in patterns.items()}
+        self._goto, self._fail, self._out = build_automaton({term: term for term in patterns})
+
+    def match(self, text):
+        # [(intent, score)] best first
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for term in out[node]:
+                length = self._terms[term][1]
+                start = pos + 1 - length
+                if length >= self.MIN_INFIX_LENGTH or start == 0 or not text[start - 1].isalnum():
+                    found.add(term)
+        scores = {}
+        for term in found:
+            idx, length = self._terms[term]
+            scores[idx] = scores.get(idx, 0) + length
+        return [(self.intents[i], score) for i, score in sorted(scores.items(), key=lambda e: (-e[1], e[0]))]
+
+_chatbot = {"matcher": None}
+_chatbot_lock = threading.Lock()
+CHATBOT_CACHE = LRUCache(int(os.environ.get('CHATBOT_CACHE_SIZE', 4096)))
+
+def chatbot_matcher():
+    # Rebuilt (and the answer cache dropped) after a CHATBOT_KB edit
+    matcher = _chatbot["matcher"]
+    if matcher is None or matcher.version != CHATBOT_KB.version:
+        with _chatbot_lock:
+            matcher = _chatbot["matcher"]
+            if matcher is None or matcher.version != CHATBOT_KB.version:
+                matcher = _chatbot["matcher"] = ChatbotMatcher(CHATBOT_KB, CHATBOT_SYNONYMS)
+                CHATBOT_CACHE.clear()
+    return matcher
+
+def normalize_message(message):
+    return " ".join(str(message).lower().split())
 
 def chatbot_response(message, lang='en'):
-    msg = message.lower()
-    matched = None
-    for key in CHATBOT_KB:
-        if key in msg:
-            matched = CHATBOT_KB[key]
-            break
-    if not matched:
-        matched = CHATBOT_KB['default']
-    if lang == 'hi':
-        return matched.get('hindi', matched['answer'])
-    elif lang == 'te':
-        return matched.get('telugu', matched['answer'])
-    return matched['answer']
+    return chatbot_reply(message, lang)["response"]
+
+@timed('chatbot_response')
+def chatbot_reply(message, lang='en'):
+    # {"response", "intents"}; cached per (normalized message, language)
+    matcher = chatbot_matcher()
+    key = (normalize_message(message), lang)
+    reply = CHATBOT_CACHE.get(key)
+    if reply is None:
+        intents = matcher.match(key[0])
+        matched = CHATBOT_KB[intents[0][0]] if intents else CHATBOT_KB['default']
+        field = CHATBOT_LANG_FIELDS.get(lang)
+        reply = {"response": matched.get(field, matched['answer']) if field else matched['answer'],
+                 "intents": [intent for intent, _ in intents]}
+        CHATBOT_CACHE.put(key, reply)
+    return reply
 
 # Doctors for Telemedicine
-appointments = []
-DOCTORS = [
+DOCTORS = VersionedList([
     {"id": 1, "name": "Dr. Ramesh Kumar", "specialty": "General Physician", "available": ["9:00 AM", "10:00 AM", "11:00 AM", "2:00 PM", "3:00 PM"], "location": "Anantapur PHC"},
     {"id": 2, "name": "Dr. Priya Sharma", "specialty": "Pediatrician", "available": ["9:30 AM", "10:30 AM", "2:30 PM", "4:00 PM"], "location": "Kurnool District Hospital"},
     {"id": 3, "name": "Dr. Suresh Reddy", "specialty": "Internal Medicine", "available": ["10:00 AM", "11:30 AM", "3:00 PM", "4:30 PM"], "location": "Nellore General Hospital"},
     {"id": 4, "name": "Dr. Lakshmi Devi", "specialty": "Gynecologist", "available": ["9:00 AM", "11:00 AM", "2:00 PM"], "location": "Kadapa Womens Hospital"},
     {"id": 5, "name": "Dr. Venkat Rao", "specialty": "Cardiologist", "available": ["10:00 AM", "3:00 PM"], "location": "Vizag Telemedicine Center"},
-]
+])
 
-def predict_outbreak_risk(region, season, sanitation, water_source, vaccination_rate):
-    season_monsoon = season in ['monsoon', 'post-monsoon']
-    poor_san = sanitation == 'poor'
-    bad_water = water_source in ['river', 'pond', 'unfiltered']
-    low_vax = int(vaccination_rate) < 60
+# ─── Appointment Booking ───────────────────────────────────────────────────────
+class BookingConflict(Exception):
+    pass
+
+SLOT_TIME_RE = re.compile(r'\d{1,2}:\d{2} [AP]M')  # DOCTORS "available" format, e.g. "9:30 AM"
+
+def appointment_date(value):
+    # Canonical ISO date, so "2030-1-7" and "2030-01-07" key the same slot; ValueError if not a date
+    if not isinstance(value, str):
+        raise ValueError(f"Not a date: {value!r}")
+    return datetime.strptime(value.strip(), "%Y-%m-%d").date().isoformat()
+
+DATE_ERROR = "Please choose a date as YYYY-MM-DD"
+
+class AppointmentBook:
+    # Slot index {(doctor_id, date): {time: appointment_id}} makes the
+    # availability check and reservation a single O(1) step under one lock;
+    # per-doctor/date/patient id lists serve filtered queries without a scan.
+    def __init__(self, doctors):
+        self._doctors = doctors  # the live VersionedList: doctors added later can be booked
+        self._doctor_index = (None, {})
+        self._appointments = {}
+        self._slots = {}
+        self._by_doctor, self._by_date, self._by_patient = {}, {}, {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def doctors(self):
+        version, index = self._doctor_index
+        if version != self._doctors.version:
+            index = {d['id']: d for d in self._doctors}
+            self._doctor_index = (self._doctors.version, index)
+        return index
+
+    @staticmethod
+    def _patient_key(data):
+        return str(data.get('patient_name') or data.get('patient') or data.get('name') or '').strip().lower()
+
+    def _taken(self, doctor_id, date):
+        return self._slots.get((doctor_id, date), {})
+
+    def free_slots(self, doctor_id, date):
+        taken = self._taken(doctor_id, date)
+        return [t for t in self.doctors[doctor_id]['available'] if t not in taken]
+
+    def book(self, data, doctor_id, date, time):
+        date = appointment_date(date)
+        doctor = self.doctors.get(doctor_id)
+        if doctor is None:
+            raise KeyError(doctor_id)
+        if time not in doctor['available']:
+            raise BookingConflict(f"{doctor['name']} is not available at {time}")
+        return self._reserve(data, doctor_id, date, time, self._patient_key(data))
+
+    def _reserve(self, data, doctor_id, date, time, patient):
+        with self._lock:
+            day = self._slots.setdefault((doctor_id, date), {})
+            if time in day:
+                raise BookingConflict(f"{time} on {date} is already booked")
+            appointment = dict(data, id=self._next_id, doctor_id=doctor_id, date=date, time=time)
+            self._next_id += 1
+            day[time] = appointment['id']
+            self._appointments[appointment['id']] = appointment
+            self._by_doctor.setdefault(doctor_id, []).append(appointment['id'])
+            self._by_date.setdefault(date, []).append(appointment['id'])
+            if patient:
+                self._by_patient.setdefault(patient, []).append(appointment['id'])
+        return appointment
+
+    def query(self, doctor_id=None, date=None, patient=None, cursor=None, limit=50):
+        # Walk the smallest matching index; ids ascend, so the cursor is the last id seen
+        with self._lock:
+            indexes = []
+            if doctor_id is not None:
+                indexes.append(self._by_doctor.get(doctor_id, []))
+            if date:
+                indexes.append(self._by_date.get(date, []))
+            if patient:
+                indexes.append(self._by_patient.get(patient.strip().lower(), []))
+            ids = min(indexes, key=len) if indexes else list(self._appointments)
+            start = bisect.bisect_right(ids, cursor) if cursor is not None else 0
+            found = []
+            for appointment_id in ids[start:]:
+                appointment = self._appointments[appointment_id]
+                if doctor_id is not None and appointment['doctor_id'] != doctor_id:
+                    continue
+                if date and appointment['date'] != date:
+                    continue
+                if patient and self._patient_key(appointment) != patient.strip().lower():
+                    continue
+                found.append(appointment)
+                if len(found) > limit:
+                    break
+        return found[:limit], (found[limit - 1]['id'] if len(found) > limit else None)
+
+class SQLiteAppointmentBook(SQLiteBacked, AppointmentBook):
+    # Shared by all workers: the UNIQUE slot constraint makes SQLite the single
+    # arbiter of a booking race, whichever process the requests land on
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            doctor_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            patient TEXT,
+            record TEXT NOT NULL,
+            UNIQUE (doctor_id, date, time)
+        );
+        CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (date, id);
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient, id);
+    """
+
+    def __init__(self, path, doctors):
+        AppointmentBook.__init__(self, doctors)
+        SQLiteBacked.__init__(self, path)
+
+    def _taken(self, doctor_id, date):
+        rows = self._connect().execute("SELECT time FROM appointments WHERE doctor_id = ? AND date = ?", (doctor_id, date))
+        return {t for (t,) in rows}
+
+    def _reserve(self, data, doctor_id, date, time, patient):
+        appointment = dict(data, doctor_id=doctor_id, date=date, time=time)
+        try:
+            with self._connect() as conn:
+                appointment['id'] = conn.execute(
+                    "INSERT INTO appointments (doctor_id, date, time, patient, record) VALUES (?, ?, ?, ?, ?)",
+                    (doctor_id, date, time, patient or None, json.dumps(appointment)),
+                ).lastrowid
+        except sqlite3.IntegrityError:
+            raise BookingConflict(f"{time} on {date} is already booked") from None
+        return appointment
+
+    def query(self, doctor_id=None, date=None, patient=None, cursor=None, limit=50):
+        clauses, params = [], []
+        for column, value in (("doctor_id", doctor_id), ("date", date), ("patient", patient.strip().lower() if patient else None)):
+            if value is not None and value != '':
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if cursor is not None:
+            clauses.append("id > ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id, record FROM appointments {where} ORDER BY id LIMIT ?", params + [limit + 1]
+        ).fetchall()
+        found = [dict(json.loads(record), id=appointment_id) for appointment_id, record in rows[:limit]]
+        return found, (rows[limit - 1][0] if len(rows) > limit else None)
+
+# ─── Outbreak Risk Table ───────────────────────────────────────────────────────
+# The prediction depends only on four yes/no factors, so all 16 results are
+# computed once and indexed by monsoon<<3 | poor_san<<2 | bad_water<<1 | low_vax
+MONSOON_SEASONS = ['monsoon', 'post-monsoon']
+UNSAFE_WATER_SOURCES = ['river', 'pond', 'unfiltered']
+
+def _compute_outbreak_risk(season_monsoon, poor_san, bad_water, low_vax):
     risks = {}
     base = {"Malaria": 10, "Dengue": 10, "Cholera": 20, "Typhoid": 10, "COVID": 20}
     for d, b in base.items():
@@ -485,111 +2686,578 @@ def predict_outbreak_risk(region, season, sanitation, water_source, vaccination_
         risks[d] = {'score': s, 'level': 'HIGH' if s >= 60 else 'MEDIUM' if s >= 35 else 'LOW'}
     return sorted(risks.items(), key=lambda x: x[1]['score'], reverse=True)
 
+OUTBREAK_RISK_TABLE = [_compute_outbreak_risk(bool(c & 8), bool(c & 4), bool(c & 2), bool(c & 1)) for c in range(16)]
+OUTBREAK_RISK_JSON = [[{"disease": dis, "score": r["score"], "level": r["level"]} for dis, r in risks] for risks in OUTBREAK_RISK_TABLE]
+
+def outbreak_risk_class(season, sanitation, water_source, vaccination_rate):
+    return ((season in MONSOON_SEASONS) << 3 | (sanitation == 'poor') << 2
+            | (water_source in UNSAFE_WATER_SOURCES) << 1 | (int(vaccination_rate) < 60))
+
+def outbreak_risk_classes(seasons, sanitation, water_sources, vaccination_rates):
+    # Vectorized outbreak_risk_class over whole columns
+    return (np.isin(np.asarray(seasons, dtype=object), MONSOON_SEASONS).astype(np.int64) << 3
+            | (np.asarray(sanitation, dtype=object) == 'poor').astype(np.int64) << 2
+            | np.isin(np.asarray(water_sources, dtype=object), UNSAFE_WATER_SOURCES).astype(np.int64) << 1
+            | (np.asarray(vaccination_rates, dtype=float) < 60).astype(np.int64))
+
+@timed('predict_outbreak_risk')
+def predict_outbreak_risk(region, season, sanitation, water_source, vaccination_rate):
+    return OUTBREAK_RISK_TABLE[outbreak_risk_class(season, sanitation, water_source, vaccination_rate)]
+
+def predict_outbreak_batch(items, chunk_size=4096):
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield from _predict_outbreak_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _predict_outbreak_chunk(chunk)
+
+def _predict_outbreak_chunk(chunk):
+    rows, errors = [], {}
+    for index, item in chunk:
+        try:
+            rows.append((index, item.get('region', ''), item.get('season', 'summer'), item.get('sanitation', 'moderate'),
+                         item.get('water_source', 'tap'), float(item.get('vaccination_rate', 70))))
+        except (AttributeError, TypeError, ValueError):
+            errors[index] = "Invalid area record"
+    classes = outbreak_risk_classes(*zip(*[row[2:] for row in rows])).tolist() if rows else []
+    results = {row[0]: {"index": row[0], "region": row[1], "risks": OUTBREAK_RISK_JSON[c]} for row, c in zip(rows, classes)}
+    for index, _ in chunk:
+        yield results[index] if index in results else {"index": index, "error": errors[index]}
+
+# ─── Personal Risk Rules ───────────────────────────────────────────────────────
+PERSONAL_RISK_BASE = {"Heart Disease": 10, "Diabetes Type 2": 10, "Hypertension": 10, "Anemia": 5, "Lung Disease": 5, "Liver Disease": 5}
+PERSONAL_RISK_DISEASES = list(PERSONAL_RISK_BASE)
+
+# Points added per disease, one entry per factor returned by personal_risk_factors
+PERSONAL_RISK_RULES = [
+    {"Heart Disease": 20, "Hypertension": 15},                        # age > 45
+    {"Diabetes Type 2": 10, "Heart Disease": 10},                     # age > 60
+    {"Lung Disease": 35, "Heart Disease": 25, "Hypertension": 15},    # smoking
+    {"Liver Disease": 30, "Heart Disease": 10},                       # alcohol
+    {"Heart Disease": 15, "Diabetes Type 2": 20, "Hypertension": 10}, # no exercise
+    {"Diabetes Type 2": 15, "Anemia": 10, "Hypertension": 10},        # poor diet
+    {"Heart Disease": 20, "Hypertension": 25},                        # BP history
+    {"Diabetes Type 2": 30, "Heart Disease": 15},                     # diabetes history
+    {"Heart Disease": 15, "Diabetes Type 2": 15},                     # family history
+    {"Anemia": 20},                                                   # female under 50
+]
+_RISK_BASE_VECTOR = np.array([PERSONAL_RISK_BASE[d] for d in PERSONAL_RISK_DISEASES])
+_RISK_RULE_MATRIX = np.array([[rule.get(d, 0) for d in PERSONAL_RISK_DISEASES] for rule in PERSONAL_RISK_RULES])
+
+def personal_risk_factors(age, gender, smoking, alcohol, exercise, diet, bp_history, diabetes_history, family_history):
+    # Works on scalars or on NumPy columns; yes/no flags must already be booleans
+    return [age > 45, age > 60, smoking, alcohol, exercise == 'none', diet == 'poor',
+            bp_history, diabetes_history, family_history, (gender == 'female') & (age < 50)]
+
+@timed('personal_risk_score')
 def personal_risk_score(age, gender, smoking, alcohol, exercise, diet, bp_history, diabetes_history, family_history):
-    r = {"Heart Disease": 10, "Diabetes Type 2": 10, "Hypertension": 10, "Anemia": 5, "Lung Disease": 5, "Liver Disease": 5}
-    if age > 45: r["Heart Disease"] += 20; r["Hypertension"] += 15
-    if age > 60: r["Diabetes Type 2"] += 10; r["Heart Disease"] += 10
-    if smoking: r["Lung Disease"] += 35; r["Heart Disease"] += 25; r["Hypertension"] += 15
-    if alcohol: r["Liver Disease"] += 30; r["Heart Disease"] += 10
-    if exercise == 'none': r["Heart Disease"] += 15; r["Diabetes Type 2"] += 20; r["Hypertension"] += 10
-    if diet == 'poor': r["Diabetes Type 2"] += 15; r["Anemia"] += 10; r["Hypertension"] += 10
-    if bp_history: r["Heart Disease"] += 20; r["Hypertension"] += 25
-    if diabetes_history: r["Diabetes Type 2"] += 30; r["Heart Disease"] += 15
-    if family_history: r["Heart Disease"] += 15; r["Diabetes Type 2"] += 15
-    if gender == 'female' and age < 50: r["Anemia"] += 20
+    r = dict(PERSONAL_RISK_BASE)
+    factors = personal_risk_factors(age, gender, bool(smoking), bool(alcohol), exercise, diet, bool(bp_history), bool(diabetes_history), bool(family_history))
+    for present, rule in zip(factors, PERSONAL_RISK_RULES):
+        if present:
+            for disease, points in rule.items():
+                r[disease] += points
     return {k: min(v, 95) for k, v in sorted(r.items(), key=lambda x: x[1], reverse=True)}
 
-HEALTH_EDUCATION = [
-    {"id": 1, "title": "Preventing Malaria", "category": "Prevention", "icon": "🦟", "color": "#dc2626", "summary": "Simple steps to prevent mosquito-borne malaria.", "content": "Use mosquito nets while sleeping. Eliminate stagnant water near your home. Apply repellent. Wear full-sleeve clothes at dusk. Early symptoms: fever with chills — see doctor immediately.", "hindi": "मलेरिया से बचाव: मच्छरदानी उपयोग करें, रुके पानी को हटाएं।", "telugu": "మలేరియా నివారణ: దోమతెర ఉపయోగించండి, నిల్వ నీటిని తొలగించండి."},
-    {"id": 2, "title": "Clean Water & Sanitation", "category": "Prevention", "icon": "💧", "color": "#0ea5e9", "summary": "Safe water practices to prevent waterborne diseases.", "content": "Always boil drinking water. Use ORS for diarrhea. Wash hands before eating. Store water in covered containers. Use toilets — open defecation spreads disease.", "hindi": "पीने का पानी उबालें, हाथ धोएं, शौचालय का उपयोग करें।", "telugu": "తాగునీటిని మరిగించండి, చేతులు కడుక్కోండి."},
-    {"id": 3, "title": "Child Nutrition & Vaccination", "category": "Children", "icon": "👶", "color": "#16a34a", "summary": "Keep children healthy with nutrition and vaccines.", "content": "Breastfeed exclusively 6 months. Ensure all vaccines on time (BCG, Polio, DPT, Measles). Give iron supplements. Visit ASHA worker monthly.", "hindi": "6 माह स्तनपान कराएं, समय पर टीके लगवाएं।", "telugu": "6 నెలలు తల్లి పాలు పట్టించండి, టీకాలు వేయించండి."},
-    {"id": 4, "title": "Maternal Health", "category": "Women", "icon": "🤱", "color": "#7c3aed", "summary": "Essential care during pregnancy and after delivery.", "content": "Register pregnancy at PHC. Take 4 antenatal checkups. Take iron+folic acid daily. Deliver at hospital. Watch for: bleeding, severe headache, reduced fetal movement.", "hindi": "गर्भावस्था में 4 जांच जरूरी, आयरन की गोलियां लें, अस्पताल में प्रसव।", "telugu": "గర్భం నమోదు చేయించుకోండి, 4 తనిఖీలు తప్పనిసరి."},
-    {"id": 5, "title": "Managing Diabetes", "category": "Chronic Disease", "icon": "🩸", "color": "#ea580c", "summary": "Control blood sugar naturally and with medication.", "content": "Test blood sugar regularly. Avoid white rice, sugar, maida. Walk 30 mins daily. Never skip medicines. Low sugar warning: sweating, trembling — eat sugar immediately.", "hindi": "नियमित रक्त शर्करा जांच, सही खान-पान, दवाइयां नियमित लें।", "telugu": "క్రమంగా రక్తంలో చక్కెర పరీక్షించండి, మందులు వదలకండి."},
-    {"id": 6, "title": "Mental Health Awareness", "category": "Mental Health", "icon": "🧠", "color": "#0f766e", "summary": "Recognize depression and anxiety in rural communities.", "content": "Signs of depression: sadness, loss of interest, sleep problems. Talk to trusted person. Call iCall: 9152987821. Avoid alcohol for stress — it worsens mental health.", "hindi": "अवसाद: उदासी, रुचि कम होना। iCall: 9152987821", "telugu": "నిరాశ లక్షణాలు: దుఃఖం, ఆసక్తి తగ్గడం. iCall: 9152987821"},
-]
+def personal_risk_summary(risks):
+    overall = round(sum(risks.values()) / len(risks))
+    level = 'HIGH' if overall >= 50 else 'MEDIUM' if overall >= 30 else 'LOW'
+    return {"risks": [{"disease": k, "score": v} for k, v in risks.items()], "overall": overall, "level": level}
+
+# ─── Personal Risk Batch Pipeline ──────────────────────────────────────────────
+def personal_risk_batch(items, chunk_size=10000):
+    # Streams one result per input record; memory is bounded by chunk_size
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield from _personal_risk_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _personal_risk_chunk(chunk)
+
+def _personal_risk_chunk(chunk):
+    rows, errors = [], {}
+    for index, d in chunk:
+        try:
+            # Risk factors only compare age with 45, 50 and 60: clamping keeps any int in int64
+            rows.append((index, d.get('id'), min(max(int(d.get('age', 30)), -1), 999), d.get('gender', 'male'),
+                         parse_flag(d.get('smoking', False)), parse_flag(d.get('alcohol', False)),
+                         d.get('exercise', 'moderate'), d.get('diet', 'moderate'), parse_flag(d.get('bp_history', False)),
+                         parse_flag(d.get('diabetes_history', False)), parse_flag(d.get('family_history', False))))
+        except (AttributeError, TypeError, ValueError):
+            errors[index] = "Invalid survey record"
+
+    results = {}
+    if rows:
+        columns = list(zip(*rows))
+        age = np.array(columns[2], dtype=np.int64)
+        text = [np.array(c, dtype=object) for c in (columns[3], columns[6], columns[7])]
+        flags = [np.array(c, dtype=bool) for c in (columns[4], columns[5], columns[8], columns[9], columns[10])]
+        factors = personal_risk_factors(age, text[0], flags[0], flags[1], text[1], text[2], flags[2], flags[3], flags[4])
+        masks = np.column_stack(factors).astype(np.int64)
+        raw = _RISK_BASE_VECTOR + masks @ _RISK_RULE_MATRIX
+        order = np.argsort(-raw, axis=1, kind='stable')  # ranked before capping, as in personal_risk_score
+        scores = np.minimum(raw, 95)
+        overall = np.rint(scores.sum(axis=1) / scores.shape[1]).astype(np.int64)
+        for r, row in enumerate(rows):
+            result = {"index": row[0]}
+            if row[1] is not None:
+                result["id"] = row[1]
+            result["risks"] = [{"disease": PERSONAL_RISK_DISEASES[j], "score": int(scores[r, j])} for j in order[r]]
+            result["overall"] = int(overall[r])
+            result["level"] = 'HIGH' if overall[r] >= 50 else 'MEDIUM' if overall[r] >= 30 else 'LOW'
+            results[row[0]] = result
+
+    for index, _ in chunk:
+        yield results[index] if index in results else {"index": index, "error": errors[index]}
 
-@app.route('/chatbot')
+# ─── Health Education Index ────────────────────────────────────────────────────
+# Per-(category, lang) views are materialized once per HEALTH_EDUCATION version,
+# together with an inverted index over English, Hindi and Telugu text for search
+EDUCATION_LANG_FIELDS = {"en": "content", "hi": "hindi", "te": "telugu"}
+EDUCATION_FIELD_WEIGHTS = {"title": 3.0, "summary": 2.0, "content": 1.0, "hindi": 1.0, "telugu": 1.0}
+# Word characters plus Devanagari/Telugu vowel signs, which \w alone would split on
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0963\u0966-\u097F\u0C00-\u0C7F]+")
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.replace('\u200c', '').replace('\u200d', '').lower())
+
+class EducationIndex:
+    PREFIX_WEIGHT = 0.5
+
+    def __init__(self, articles):
+        self.version = articles.version
+        self._views = {}
+        for lang, field in EDUCATION_LANG_FIELDS.items():
+            items = [dict(e, display_content=e.get(field, e['content'])) for e in articles]
+            by_category = {"": items}
+            for item in items:
+                by_category.setdefault(item['category'], []).append(item)
+            self._views[lang] = by_category
+
+        self._postings = {}
+        for pos, article in enumerate(articles):
+            for field, weight in EDUCATION_FIELD_WEIGHTS.items():
+                for token in tokenize(article.get(field, '')):
+                    postings = self._postings.setdefault(token, {})
+                    postings[pos] = postings.get(pos, 0.0) + weight
+        self._vocabulary = sorted(self._postings)
+        self._count = len(articles)
+
+    def view(self, category, lang):
+        return self._views.get(lang, self._views["en"]).get(category, [])
+
+    def _matches(self, term):
+        # Exact term, plus words it prefixes (e.g. "vaccin" -> "vaccines") at lower weight
+        if term in self._postings:
+            yield self._postings[term], 1.0
+        if len(term) >= 3:
+            i = bisect.bisect_right(self._vocabulary, term)
+            while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+                yield self._postings[self._vocabulary[i]], self.PREFIX_WEIGHT
+                i += 1
+
+    def search(self, query, lang="en", category="", limit=10):
+        scores = {}
+        for term in set(tokenize(query)):
+            for postings, factor in self._matches(term):
+                idf = math.log(1 + self._count / len(postings))
+                for pos, weight in postings.items():
+                    scores[pos] = scores.get(pos, 0.0) + factor * idf * weight
+        items = self._views.get(lang, self._views["en"])[""]
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        results = []
+        for pos, score in ranked:
+            if category and items[pos]['category'] != category:
+                continue
+            results.append(dict(items[pos], score=round(score, 3)))
+            if len(results) >= limit:
+                break
+        return results
+
+_education = {"index": None}
+_education_lock = threading.Lock()
+
+def education_index():
+    index = _education["index"]
+    if index is None or index.version != HEALTH_EDUCATION.version:
+        with _education_lock:
+            index = _education["index"]
+            if index is None or index.version != HEALTH_EDUCATION.version:
+                index = _education["index"] = EducationIndex(HEALTH_EDUCATION)
+    return index
+
+@bp.route('/chatbot')
 def chatbot():
     return render_template('chatbot.html')
 
-@app.route('/telemedicine')
+@bp.route('/telemedicine')
 def telemedicine():
     return render_template('telemedicine.html')
 
-@app.route('/outbreak-predictor')
+@bp.route('/outbreak-predictor')
 def outbreak_predictor():
     return render_template('outbreak_predictor.html')
 
-@app.route('/health-risk')
+@bp.route('/health-risk')
 def health_risk():
     return render_template('health_risk.html')
 
-@app.route('/education')
+@bp.route('/education')
 def education():
     return render_template('education.html')
 
-@app.route('/frontline')
+@bp.route('/frontline')
 def frontline():
     return render_template('frontline.html')
 
-@app.route('/api/chatbot', methods=['POST'])
+@bp.route('/api/chatbot', methods=['POST'])
 def api_chatbot():
     data = request.json
-    response = chatbot_response(data.get('message', ''), data.get('lang', 'en'))
-    return jsonify({"response": response})
+    return jsonify(chatbot_reply(data.get('message', ''), data.get('lang', 'en')))
 
-@app.route('/api/doctors')
+@bp.route('/api/doctors')
 def get_doctors():
-    return jsonify(DOCTORS)
+    return state().responses.respond('doctors', DOCTORS.version, lambda: DOCTORS)
+
+@bp.route('/api/doctors/<int:doctor_id>/slots')
+def get_doctor_slots(doctor_id):
+    try:
+        date = appointment_date(request.args.get('date') or datetime.now().strftime("%Y-%m-%d"))
+    except ValueError:
+        return jsonify({"error": DATE_ERROR}), 400
+    if doctor_id not in state().appointments.doctors:
+        return jsonify({"error": "Unknown doctor"}), 404
+    return jsonify({"doctor_id": doctor_id, "date": date, "available": state().appointments.free_slots(doctor_id, date)})
 
-@app.route('/api/book-appointment', methods=['POST'])
+@bp.route('/api/book-appointment', methods=['POST'])
 def book_appointment():
     data = request.json
-    data['id'] = len(appointments) + 1
+    try:
+        doctor_id = int(data.get('doctor_id') or next(d['id'] for d in DOCTORS if d['name'] == data.get('doctor')))
+    except (StopIteration, TypeError, ValueError):
+        return jsonify({"error": "Please choose a valid doctor"}), 400
+    try:
+        date = appointment_date(data.get('date') or datetime.now().strftime("%Y-%m-%d"))
+    except ValueError:
+        return jsonify({"error": DATE_ERROR}), 400
+    slot_time = data.get('time') or data.get('slot')
+    if not isinstance(slot_time, str) or not SLOT_TIME_RE.fullmatch(slot_time.strip()):
+        return jsonify({"error": "Please choose a time slot, e.g. 10:00 AM"}), 400
+    slot_time = slot_time.strip()
     data['status'] = 'Confirmed'
     data['booking_time'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-    appointments.append(data)
-    return jsonify({"success": True, "appointment": data})
+    try:
+        appointment = state().appointments.book(data, doctor_id, date, slot_time)
+    except KeyError:
+        return jsonify({"error": "Please choose a valid doctor"}), 400
+    except BookingConflict as e:
+        return jsonify({"error": str(e)}), 409
+    region = data.get('region')
+    if not isinstance(region, str) or not region.strip():
+        region = doctor_district(state().appointments.doctors[doctor_id])
+    state().counters.add([(region.strip().title(), date, "due_followup")])
+    return jsonify({"success": True, "appointment": appointment})
 
-@app.route('/api/appointments')
+@bp.route('/api/appointments')
 def get_appointments():
-    return jsonify(appointments)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    date = request.args.get('date')
+    try:
+        date = appointment_date(date) if date else None
+    except ValueError:
+        return jsonify({"error": DATE_ERROR}), 400
+    appointments, next_cursor = state().appointments.query(request.args.get('doctor_id', type=int), date, request.args.get('patient'), request.args.get('cursor', type=int), limit)
+    response = jsonify(appointments)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
 
-@app.route('/api/predict-outbreak', methods=['POST'])
+@bp.route('/api/predict-outbreak', methods=['POST'])
 def predict_outbreak():
     d = request.json
-    risks = predict_outbreak_risk(d.get('region',''), d.get('season','summer'), d.get('sanitation','moderate'), d.get('water_source','tap'), d.get('vaccination_rate', 70))
-    return jsonify([{"disease": dis, "score": r["score"], "level": r["level"]} for dis, r in risks])
+    risk_class = outbreak_risk_class(d.get('season','summer'), d.get('sanitation','moderate'), d.get('water_source','tap'), d.get('vaccination_rate', 70))
+    return jsonify(OUTBREAK_RISK_JSON[risk_class])
+
+@bp.route('/api/predict-outbreak-batch', methods=['POST'])
+def predict_outbreak_batch_route():
+    # One record per village/ward: {region, season, sanitation, water_source, vaccination_rate}
+    items = read_batch_items()
+    if items is None:
+        return jsonify({"error": "Expected a JSON array or NDJSON body"}), 400
+    return ndjson_response(predict_outbreak_batch(items))
 
-@app.route('/api/personal-risk', methods=['POST'])
+@bp.route('/api/personal-risk', methods=['POST'])
 def personal_risk():
     d = request.json
     risks = personal_risk_score(int(d.get('age',30)), d.get('gender','male'), d.get('smoking',False), d.get('alcohol',False), d.get('exercise','moderate'), d.get('diet','moderate'), d.get('bp_history',False), d.get('diabetes_history',False), d.get('family_history',False))
-    overall = round(sum(risks.values()) / len(risks))
-    level = 'HIGH' if overall >= 50 else 'MEDIUM' if overall >= 30 else 'LOW'
-    return jsonify({"risks": [{"disease": k, "score": v} for k, v in risks.items()], "overall": overall, "level": level})
+    return jsonify(personal_risk_summary(risks))
+
+@bp.route('/api/personal-risk-batch', methods=['POST'])
+def personal_risk_batch_route():
+    # Household survey rows as a JSON array, NDJSON or CSV (text/csv); streams NDJSON
+    items = read_batch_items(allow_csv=True)
+    if items is None:
+        return jsonify({"error": "Expected a JSON array, NDJSON or CSV body"}), 400
+    return ndjson_response(personal_risk_batch(items))
 
-@app.route('/api/education')
+@bp.route('/api/education')
 def get_education():
     category = request.args.get('category', '')
     lang = request.args.get('lang', 'en')
-    data = [e.copy() for e in HEALTH_EDUCATION]
-    if category:
-        data = [e for e in data if e['category'] == category]
-    for item in data:
-        if lang == 'hi': item['display_content'] = item.get('hindi', item['content'])
-        elif lang == 'te': item['display_content'] = item.get('telugu', item['content'])
-        else: item['display_content'] = item['content']
-    return jsonify(data)
-
-@app.route('/api/frontline-summary')
+    return state().responses.respond(('education', category, lang), HEALTH_EDUCATION.version, lambda: education_index().view(category, lang))
+
+@bp.route('/api/education/search')
+def search_education():
+    query = ' '.join(tokenize(request.args.get('q', '')))
+    if not query:
+        return jsonify({"error": "Please provide a search query"}), 400
+    category = request.args.get('category', '')
+    lang = request.args.get('lang', 'en')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    key = ('education-search', query, category, lang, limit)
+    return state().responses.respond(key, HEALTH_EDUCATION.version, lambda: education_index().search(query, lang, category, limit))
+
+@bp.route('/api/frontline-summary')
 def frontline_summary():
-    region = request.args.get('region', 'Anantapur')
-    region_data = next((r for r in HEALTH_DATA['regions'] if r['name'] == region), HEALTH_DATA['regions'][0])
-    alert = next((a for a in OUTBREAK_ALERTS if a['region'] == region), None)
-    return jsonify({"region": region, "active_cases": region_data['cases'], "dominant_disease": region_data['disease'], "risk_level": region_data['risk'], "alert": alert, "today_visits": random.randint(8,24), "pending_reports": random.randint(2,8), "referrals_today": random.randint(1,5), "patients_due_followup": random.randint(3,12)})
+    region = request.args.get('region', 'Anantapur').strip().title()
+    region_data = state().aggregates.find(region) or {"cases": 0, "disease": None, "risk": risk_for_cases(0)}
+    counts = state().counters.get(region, datetime.now().strftime("%Y-%m-%d"))
+    return jsonify({"region": region, "active_cases": region_data['cases'], "dominant_disease": region_data['disease'], "risk_level": region_data['risk'],
+                    "alert": state().detector.region_alert(region), "today_visits": counts["visits"], "pending_reports": counts["pending_reports"],
+                    "referrals_today": counts["referrals"], "patients_due_followup": counts["due_followup"]})
 
-@app.route('/voice')
+@bp.route('/voice')
 def voice():
     return render_template('voice.html')
 
+
+# ─── Delta Sync ────────────────────────────────────────────────────────────────
+# One round trip for offline devices: GET /api/sync?since=<version> returns only
+# what changed in doctors, outbreak alerts, education, translations and chatbot
+# answers since that version; POST also uploads queued history records first.
+# A version is "<epoch>.<KB generation>.<case-log id>": KB items carry the
+# generation they last changed in (see kb_sync_history) and alerts the case that
+# last changed them, and both count the same on every worker. The epoch changes
+# with the KB history, the database or the doctor list, and a device on another
+# epoch (or with no version yet) gets everything again, flagged "full".
+SYNC_MAX_UPLOAD = 1000
+
+def sync_epoch(kb):
+    doctors = hashlib.sha256(json.dumps(DOCTORS, sort_keys=True).encode()).hexdigest()
+    return hashlib.sha256(f"{kb['epoch']}:{state().case_log.epoch}:{doctors}".encode()).hexdigest()[:8]
+
+def parse_sync_version(version):
+    # (epoch, KB generation, case id), or None for a missing/malformed version
+    try:
+        epoch, generation, case_id = str(version).split('.')
+        return epoch, int(generation), int(case_id)
+    except ValueError:
+        return None
+
+def sync_version(since):
+    # The version a device at `since` ends up at, and the parsed `since` (None
+    # when it gets everything). A worker behind the device never moves it back.
+    kb = KB_SYNC
+    current = (sync_epoch(kb), kb["generation"], state().case_log.applied_id)
+    cursor = parse_sync_version(since) if since else None
+    if cursor is None or cursor[0] != current[0]:
+        cursor = None
+    else:
+        current = (current[0], max(current[1], cursor[1]), max(current[2], cursor[2]))
+    return ".".join(map(str, current)), kb, cursor
+
+def sync_changes(kb, cursor):
+    # {dataset: {"set": {key: item}, "del": [keys]}} for datasets that changed
+    full = cursor is None
+    kb_generation, case_id = (0, -1) if full else cursor[1:]
+    changes = {}
+    if full:
+        changes["doctors"] = {"set": {str(d["id"]): d for d in DOCTORS}}
+    current, removed = state().detector.changes_since(case_id)
+    alerts = {"set": {f"{a['region']}|{a['disease']}": a for a in current}}
+    if not full:
+        alerts["del"] = [f"{region}|{disease}" for region, disease in removed]
+    changes["alerts"] = alerts
+    if kb["generation"] > kb_generation:
+        for dataset, items in kb["items"].items():
+            table = sync_items(kb["tables"][dataset], SYNC_KB_DATASETS[dataset][1])
+            changed = [(key, digest) for key, (generation, digest) in items.items() if generation > kb_generation]
+            changes[dataset] = {"set": {key: table[key] for key, digest in changed if digest is not None}}
+            if not full:
+                changes[dataset]["del"] = [key for key, digest in changed if digest is None]
+    return {dataset: {op: v for op, v in delta.items() if v} for dataset, delta in changes.items()
+            if any(delta.values())}
+
+def sync_payload(version, kb, cursor):
+    return {"version": version, "full": cursor is None, "changes": sync_changes(kb, cursor)}
+
+def upload_timestamp(value, now):
+    # Offline records keep the time they were taken; a missing, malformed or
+    # future one becomes the upload time
+    try:
+        taken = datetime.strptime(str(value), "%Y-%m-%d %H:%M")
+    except ValueError:
+        return now.strftime("%Y-%m-%d %H:%M")
+    return taken.strftime("%Y-%m-%d %H:%M") if taken <= now else now.strftime("%Y-%m-%d %H:%M")
+
+def gzip_json(payload):
+    # jsonify, gzipped when the client accepts it and the body is big enough to gain
+    body = current_app.json.dumps(payload).encode('utf-8') + b"\n"
+    if len(body) < ResponseCache.GZIP_MIN_BYTES or 'gzip' not in request.accept_encodings:
+        return Response(body, mimetype='application/json')
+    response = Response(gzip.compress(body, 6), mimetype='application/json')
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/api/sync', methods=['GET', 'POST'])
+def sync():
+    # GET ?since=<version>; POST {"since": ..., "history": [records]} uploads the
+    # records (give each a client_id so a retried upload isn't stored twice)
+    if request.method == 'GET':
+        since = request.args.get('since', '')
+        version, kb, cursor = sync_version(since)
+        return state().responses.respond(('sync', since), version, lambda: sync_payload(version, kb, cursor))
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('history', []), list) \
+            or not all(isinstance(r, dict) for r in data.get('history', [])):
+        return jsonify({"error": "Expected {\"since\": version, \"history\": [records]}"}), 400
+    records = data.get('history', [])
+    if len(records) > SYNC_MAX_UPLOAD:
+        return jsonify({"error": f"At most {SYNC_MAX_UPLOAD} records per upload"}), 413
+    now = datetime.now()
+    for record in records:
+        record['timestamp'] = upload_timestamp(record.get('timestamp'), now)
+    results = record_history(records) if records else []
+    payload = sync_payload(*sync_version(data.get('since') or request.args.get('since', '')))
+    payload["uploaded"] = [record_id for record_id, _ in results]
+    payload["duplicates"] = sum(1 for _, stored in results if not stored)
+    return gzip_json(payload)
+
+
+# ─── App Factory ───────────────────────────────────────────────────────────────
+class AppState:
+    # Everything that changes while serving. History, appointments, the case log
+    # and the frontline counters live in SQLite shared by all workers
+    # (HISTORY_STORE=memory keeps them in process, for a single worker only);
+    # aggregates, alerts, the event broker and the response cache are
+    # per-process views kept current from the case log.
+    SYNC_SECONDS = 0.5
+
+    def __init__(self, backend='sqlite', path=DEFAULT_DB_PATH, admission=None):
+        self.backend = backend
+        self.admission = admission  # AdmissionController, or None when ADMISSION=0
+        self.aggregates = CaseAggregates(HEALTH_DATA)
+        self.alerts = VersionedList(dict(a) for a in OUTBREAK_ALERTS)
+        self.detector = OutbreakDetector(self.alerts)
+        self.broker = EventBroker()
+        self.responses = ResponseCache()
+        if backend == 'memory':
+            self.history, self.appointments, self.case_log = MemoryHistoryStore(), AppointmentBook(DOCTORS), MemoryCaseLog(self)
+            self.counters = MemoryDailyCounters()
+        else:
+            self.history = SQLiteHistoryStore(path)
+            self.counters = SQLiteDailyCounters(path)
+            self.appointments = SQLiteAppointmentBook(path, DOCTORS)
+            self.case_log = SQLiteCaseLog(path, self)
+        self.case_log.sync()  # replay cases recorded by earlier runs
+        self._follower_pid = None
+
+    def apply_case(self, case_id, district, disease, when):
+        self.aggregates.record(district, disease, when)
+        transition = self.detector.observe(district, disease, when, revision=case_id)
+        summary = self.aggregates.district(district)
+        self.broker.publish("dashboard", summary["name"], summary, 2 * case_id)
+        if transition:
+            self.broker.publish("alerts", transition["region"], transition, 2 * case_id + 1)
+
+    def checkpoint_cases(self):
+        # Everything apply_case has built up, for SQLiteCaseLog checkpoints
+        return {"aggregates": self.aggregates.checkpoint(), "detector": self.detector.checkpoint()}
+
+    def restore_cases(self, case_id, data):
+        self.aggregates.restore(data["aggregates"])
+        self.detector.restore(data["detector"])
+        self.broker.restart_at(2 * case_id + 1)
+
+    def start_follower(self):
+        # Once per process (so again in each forked worker): pick up cases other
+        # workers append, which also wakes this worker's SSE subscribers, and
+        # newly compiled knowledge-base snapshots
+        if self._follower_pid == os.getpid():
+            return
+        self._follower_pid = os.getpid()
+        # A fresh fork holds the master's start-up state
+        self.case_log.sync()
+        reload_knowledge_base_if_changed()
+        threading.Thread(target=self._follow, daemon=True).start()
+
+    def _follow(self):
+        while True:
+            time.sleep(self.SYNC_SECONDS)
+            for task in (self.case_log.sync, flush_metrics, reload_knowledge_base_if_changed):
+                try:
+                    task()
+                except (sqlite3.Error, OSError, ValueError, EOFError) as e:
+                    print(f"healthai: {task.__name__} failed: {e}", file=sys.stderr)
+
+def state():
+    return current_app.extensions['healthai']
+
+def _start_follower():
+    state().start_follower()
+
+def create_app(config=None):
+    # Knowledge bases are module globals built at import; the indexes derived from
+    # them are warmed here too, so a pre-forking server (serve.py --workers) loads
+    # everything once and its workers share the pages copy-on-write
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'healthai_secret_2025')
+    app.config.update(HISTORY_STORE=os.environ.get('HISTORY_STORE', 'sqlite'),
+                      HISTORY_DB=os.environ.get('HISTORY_DB', DEFAULT_DB_PATH),
+                      ADMISSION=os.environ.get('ADMISSION', '1') != '0',
+                      ADMISSION_MAX_INFLIGHT=int(os.environ.get('ADMISSION_MAX_INFLIGHT', 16)),
+                      ADMISSION_RATE_LIMITS=os.environ.get('ADMISSION_RATE_LIMITS', '1') != '0',
+                      PROXY_COUNT=int(os.environ.get('PROXY_COUNT', 0)))
+    app.config.update(config or {})
+    if app.config['PROXY_COUNT']:
+        # Trust that many X-Forwarded-* hops, so remote_addr (and rate limits) see the real client
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'], x_proto=app.config['PROXY_COUNT'])
+    refresh_triage_index()
+    facility_index()
+    education_index()
+    chatbot_matcher()
+    admission = None
+    if app.config['ADMISSION']:
+        admission = AdmissionController(app.config['ADMISSION_MAX_INFLIGHT'], app.config['ADMISSION_RATE_LIMITS'])
+    app.extensions['healthai'] = AppState(app.config['HISTORY_STORE'], app.config['HISTORY_DB'], admission)
+    if METRICS_ENABLED:
+        app.before_request(_metrics_before_request)
+        app.after_request(_metrics_after_request)
+        app.teardown_request(_metrics_teardown_request)
+    if admission:
+        # After the metrics hooks, so request latency includes time spent queued
+        app.before_request(_admission_before_request)
+        app.teardown_request(_admission_teardown_request)
+    app.before_request(_start_follower)
+    app.register_blueprint(bp)
+    return app
+
+def __getattr__(name):
+    # `gunicorn app:app` and `flask run` still find a module-level app. It is
+    # built on first use, so importing the module (cli.py, serve.py, tests)
+    # doesn't open the history store
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == '__main__':
+    create_app().run(debug=True, port=5000)
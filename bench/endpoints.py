@@ -0,0 +1,269 @@
+"""Benchmark every /api/* route and compare against a stored baseline.
+
+    python bench/endpoints.py                                   # in-process Flask test client
+    python bench/endpoints.py --url http://127.0.0.1:8000 -c 16 # a running server (serve.py)
+    python bench/endpoints.py --save-baseline                   # record bench/baseline.json
+    python bench/endpoints.py --threshold 0.25                  # fail if any p95 is >25% slower
+
+Reports throughput and p50/p95/p99 latency per scenario. Baselines are machine
+specific: record one on the machine (or CI runner) that will run the checks.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'bench', 'baseline.json')
+# Routes that cannot be timed as request/response (infinite SSE stream)
+EXCLUDED_ROUTES = {'/api/stream'}
+
+REGIONS = ["Anantapur", "Kurnool", "Guntur", "Vizag", "Nellore", "Chittoor", "Kadapa", "Prakasam"]
+FREE_TEXT_SYMPTOMS = ["high fever since 3 days", "bukhar", "loose motion", "stomach ache", "pain", "feeling tired",
+                      "chest pain while walking", "difficulty breathing at night", "rash on arms"]
+CHAT_MESSAGES = ["What is dengue?", "I have fever and headache", "bukhar hai kya karu", "how to prevent malaria",
+                 "my child has diarrhea", "sugar level high diabetes", "TB cough for 3 weeks", "hello",
+                 "covid symptoms", "is my BP 150/95 hypertension", "anemia diet", "cholera in village"]
+
+
+# ─── Payload generators ───────────────────────────────────────────────────────
+def symptom_mix(rng, app):
+    keys = list(app.SYMPTOM_DATABASE)
+    symptoms = rng.sample(keys, rng.randint(1, 4))
+    if rng.random() < 0.3:
+        symptoms.append(rng.choice(FREE_TEXT_SYMPTOMS))
+    return {"symptoms": symptoms, "age": rng.choice([2, 8, 25, 34, 47, 58, 70, 82]), "duration": "1-2 days"}
+
+
+def risk_questionnaire(rng, _app=None):
+    return {"age": rng.randint(18, 85), "gender": rng.choice(["male", "female"]),
+            "smoking": rng.random() < 0.25, "alcohol": rng.random() < 0.3,
+            "exercise": rng.choice(["none", "moderate", "high"]), "diet": rng.choice(["poor", "moderate", "good"]),
+            "bp_history": rng.random() < 0.2, "diabetes_history": rng.random() < 0.15,
+            "family_history": rng.random() < 0.35}
+
+
+def outbreak_area(rng, _app=None):
+    return {"region": rng.choice(REGIONS), "season": rng.choice(["summer", "monsoon", "post-monsoon", "winter"]),
+            "sanitation": rng.choice(["poor", "moderate", "good"]),
+            "water_source": rng.choice(["tap", "well", "river", "pond", "unfiltered"]),
+            "vaccination_rate": rng.randint(30, 95)}
+
+
+def booking(rng, app):
+    # Many workers aiming at the same few days: a realistic mix of successes and 409 conflicts
+    doctor = rng.choice(app.DOCTORS)
+    day = (date.today() + timedelta(days=rng.randint(0, 6))).isoformat()
+    return {"doctor_id": doctor["id"], "time": rng.choice(doctor["available"]), "date": day,
+            "patient_name": f"Patient {rng.randint(1, 5000)}", "reason": "Follow-up"}
+
+
+def triage_record(rng, app):
+    record = symptom_mix(rng, app)
+    record.update(region=rng.choice(REGIONS), conditions=[{"name": rng.choice(["Malaria", "Dengue", "Typhoid"])}])
+    return record
+
+
+def roster_child(rng):
+    return {"id": f"S{rng.randint(1, 99999)}", "age": rng.randint(2, 18), "sex": rng.choice(["male", "female"]),
+            "weight": round(rng.uniform(10, 70), 1), "height": round(rng.uniform(85, 180), 1)}
+
+
+def scenarios(app):
+    # name -> (method, request factory(rng) -> (path, json body or None))
+    def get(path_fn):
+        return lambda rng: (path_fn(rng), None)
+    return {
+        "analyze": ('POST', lambda rng: ('/api/analyze', symptom_mix(rng, app))),
+        "analyze-batch": ('POST', lambda rng: ('/api/analyze-batch', [symptom_mix(rng, app) for _ in range(200)])),
+        "chatbot": ('POST', lambda rng: ('/api/chatbot', {"message": rng.choice(CHAT_MESSAGES), "lang": rng.choice(["en", "hi", "te"])})),
+        "personal-risk": ('POST', lambda rng: ('/api/personal-risk', risk_questionnaire(rng))),
+        "personal-risk-batch": ('POST', lambda rng: ('/api/personal-risk-batch', [risk_questionnaire(rng) for _ in range(500)])),
+        "predict-outbreak": ('POST', lambda rng: ('/api/predict-outbreak', outbreak_area(rng))),
+        "predict-outbreak-batch": ('POST', lambda rng: ('/api/predict-outbreak-batch', [outbreak_area(rng) for _ in range(1000)])),
+        "bmi": ('POST', lambda rng: ('/api/bmi', {"weight": rng.randint(35, 110), "height": rng.randint(140, 190), "age": rng.randint(18, 80)})),
+        "bmi-batch": ('POST', lambda rng: ('/api/bmi-batch', [roster_child(rng) for _ in range(500)])),
+        "book-appointment": ('POST', lambda rng: ('/api/book-appointment', booking(rng, app))),
+        "appointments": ('GET', get(lambda rng: f"/api/appointments?doctor_id={rng.randint(1, 5)}&limit=20")),
+        "doctor-slots": ('GET', get(lambda rng: f"/api/doctors/{rng.randint(1, 5)}/slots?date={date.today().isoformat()}")),
+        "doctors": ('GET', get(lambda rng: '/api/doctors')),
+        "save-history": ('POST', lambda rng: ('/api/save-history', triage_record(rng, app))),
+        "get-history": ('GET', get(lambda rng: f"/api/get-history?region={rng.choice(REGIONS)}")),
+        "sync": ('GET', get(lambda rng: '/api/sync')),
+        "sync-upload": ('POST', lambda rng: ('/api/sync', {"history": [dict(triage_record(rng, app), client_id=f"bench-{rng.getrandbits(48)}") for _ in range(20)]})),
+        "case-events": ('POST', lambda rng: ('/api/case-events', [{"region": rng.choice(REGIONS), "disease": "Dengue"} for _ in range(20)])),
+        "health-data": ('GET', get(lambda rng: '/api/health-data')),
+        "outbreak-alerts": ('GET', get(lambda rng: '/api/outbreak-alerts')),
+        "frontline-summary": ('GET', get(lambda rng: f"/api/frontline-summary?region={rng.choice(REGIONS)}")),
+        "hospitals": ('GET', get(lambda rng: f"/api/hospitals?region={rng.choice(['anantapur', 'kurnool', 'guntur'])}")),
+        "hospitals-nearest": ('GET', get(lambda rng: f"/api/hospitals/nearest?lat={rng.uniform(14, 16):.4f}&lon={rng.uniform(77, 79):.4f}&k=3")),
+        "medicines": ('GET', get(lambda rng: f"/api/medicines?condition={rng.choice(['Dengue', 'Flu', 'Malaria', 'Unknown'])}")),
+        "translate": ('GET', get(lambda rng: f"/api/translate?lang={rng.choice(['hi', 'te'])}")),
+        "education": ('GET', get(lambda rng: f"/api/education?lang={rng.choice(['en', 'hi', 'te'])}&category={rng.choice(['', 'Prevention', 'Children'])}")),
+        "education-search": ('GET', get(lambda rng: f"/api/education/search?q={rng.choice(['malaria', 'water', 'vaccine', 'diabetes'])}")),
+        "cache-stats": ('GET', get(lambda rng: '/api/cache-stats')),
+        "knowledge-base": ('GET', get(lambda rng: '/api/knowledge-base')),
+    }
+
+
+# ─── Clients ──────────────────────────────────────────────────────────────────
+class TestClientTransport:
+    def __init__(self, app):
+        self._local = threading.local()
+        self._app = app
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPTransport:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self._host, self._port, timeout=60)
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            return 599
+
+
+# ─── Runner ───────────────────────────────────────────────────────────────────
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(transport, method, factory, requests, concurrency, seed):
+    rng = random.Random(seed)
+    # Payloads are generated up front so only the request itself is timed
+    work = [factory(rng) for _ in range(requests)]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(item):
+        path, body = item
+        start = time.perf_counter()
+        status = transport.request(method, path, body)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status // 100] = statuses.get(status // 100, 0) + 1
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        for item in work:
+            one(item)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, work))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rps": round(requests / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "status": {f"{k}xx": v for k, v in sorted(statuses.items())},
+    }
+
+
+def compare(results, baseline, threshold, slack_ms):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        limit = base["p95_ms"] * (1 + threshold) + slack_ms
+        if result["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f}ms > {limit:.2f}ms (baseline {base['p95_ms']:.2f}ms)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HealthAI API routes")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process test client")
+    parser.add_argument("-n", "--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--slack-ms", type=float, default=0.5, help="absolute p95 noise allowance")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    # Keep benchmark writes out of the real history database
+    os.environ.setdefault('HISTORY_DB', os.path.join(tempfile.mkdtemp(prefix='healthai-bench-'), 'history.db'))
+    # Every request comes from one client; per-client rate limits would turn most of them away
+    os.environ.setdefault('ADMISSION_RATE_LIMITS', '0')
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    flask_app = app_module.create_app()
+    all_scenarios = scenarios(app_module)
+    covered = {urlsplit(factory(random.Random(0))[0]).path for _, factory in all_scenarios.values()}
+    for rule in flask_app.url_map.iter_rules():
+        if rule.rule.startswith('/api/') and rule.rule not in EXCLUDED_ROUTES and '<' not in rule.rule and rule.rule not in covered:
+            print(f"warning: no benchmark scenario for {rule.rule}", file=sys.stderr)
+
+    selected = args.only.split(',') if args.only else list(all_scenarios)
+    transport = HTTPTransport(args.url) if args.url else TestClientTransport(flask_app)
+    results = {}
+    print(f"{'scenario':<24}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  status")
+    for name in selected:
+        method, factory = all_scenarios[name]
+        run_scenario(transport, method, factory, min(20, args.requests), 1, args.seed + 1)  # warm-up
+        result = results[name] = run_scenario(transport, method, factory, args.requests, args.concurrency, args.seed)
+        print(f"{name:<24}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}  {result['status']}")
+
+    report = {"mode": "http" if args.url else "test-client", "concurrency": args.concurrency,
+              "requests": args.requests, "scenarios": results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.slack_ms)
+        if regressions:
+            print("PERFORMANCE REGRESSIONS:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+        print(f"no regressions vs {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Knowledge-base start-up cost: Python literals vs JSON sources vs binary snapshot.
+
+    python bench/kb_startup.py                 # the shipped kb/
+    python bench/kb_startup.py --scale 200     # a KB 200x larger (synthetic copies)
+
+Each load runs in a fresh interpreter and only the load itself is timed. The
+literal case imports a module of dict/list literals from its cached .pyc, which
+is how the tables were loaded before they moved to kb/.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADERS = {
+    "literals (.pyc)": "import kb_literals",
+    "json sources": "from app import read_kb_sources; read_kb_sources(KB)",
+    "snapshot (mmap)": "from app import load_snapshot; load_snapshot(SNAP)",
+}
+
+
+def scaled_tables(tables, scale):
+    # Synthetic copies with distinct keys, so the larger KB has no duplicate entries
+    out = {}
+    for name, table in tables.items():
+        if isinstance(table, list):
+            out[name] = [dict(item, id=f"{item.get('id')}-{i}") if isinstance(item, dict) else item
+                         for i in range(scale) for item in table]
+        elif name == "TRANSLATIONS":
+            out[name] = {lang: {f"{k}{'_' + str(i) if i else ''}": v for i in range(scale) for k, v in strings.items()}
+                         for lang, strings in table.items()}
+        else:
+            out[name] = {f"{k}{' ' + str(i) if i else ''}": v for i in range(scale) for k, v in table.items()}
+    return out
+
+
+def write_kb(tables, directory, manifest_version):
+    files = {name: f"{name.lower()}.json" for name in tables}
+    for name, filename in files.items():
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            json.dump(tables[name], f, ensure_ascii=False)
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump({"version": manifest_version, "tables": files}, f)
+    with open(os.path.join(directory, 'kb_literals.py'), 'w', encoding='utf-8') as f:
+        for name, table in tables.items():
+            f.write(f"{name} = {table!r}\n")
+
+
+def time_load(statement, directory, snapshot, runs):
+    code = f"import sys, time; sys.path[:0] = [{directory!r}, {ROOT!r}]; KB = {directory!r}; SNAP = {snapshot!r}\n"
+    if "app" in statement:
+        code += "import app\n"  # app's own import (and its KB load) is not what is being timed
+    code += f"t = time.perf_counter()\n{statement}\nprint(time.perf_counter() - t)\n"
+    env = dict(os.environ, HISTORY_STORE='memory', KB_DIR=directory, KB_SNAPSHOT=snapshot)
+    samples = []
+    for _ in range(runs + 1):  # the first run also writes the .pyc / snapshot
+        out = subprocess.run([sys.executable, "-c", code], env=env, cwd=directory, check=True,
+                             capture_output=True, text=True).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return statistics.median(samples[1:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark knowledge-base load time")
+    parser.add_argument("--scale", type=int, default=1, help="multiply every table by this factor")
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('HISTORY_STORE', 'memory')
+    from app import compile_knowledge_base, read_kb_sources
+
+    manifest, tables = read_kb_sources()
+    with tempfile.TemporaryDirectory(prefix='healthai-kb-') as directory:
+        write_kb(scaled_tables(tables, args.scale), directory, manifest.get("version"))
+        snapshot = os.path.join(directory, 'kb.snapshot')
+        compiled = compile_knowledge_base(directory, snapshot)
+        sizes = {"literals (.pyc)": os.path.getsize(os.path.join(directory, 'kb_literals.py')),
+                 "json sources": sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory) if f.endswith('.json')),
+                 "snapshot (mmap)": compiled["bytes"]}
+        print(f"KB x{args.scale}: median of {args.runs} fresh-interpreter loads")
+        print(f"{'loader':<20}{'ms':>10}{'bytes':>12}")
+        for label, statement in LOADERS.items():
+            ms = time_load(statement, directory, snapshot, args.runs) * 1000
+            print(f"{label:<20}{ms:>10.2f}{sizes[label]:>12}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
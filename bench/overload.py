@@ -0,0 +1,173 @@
+"""Flood a server with content traffic and check that emergency triage stays fast.
+
+    python bench/overload.py                         # admission control on, then off (ADMISSION=0)
+    python bench/overload.py --flood 400 --seconds 15 --max-p99-ms 250
+    python bench/overload.py --url http://127.0.0.1:8000   # a server you started yourself
+
+Starts serve.py (one worker) for each mode, then opens --flood keep-alive
+connections that send education, search and chatbot requests back to back.
+Refused requests are retried after Retry-After, as well-behaved clients do,
+or at once with --ignore-retry-after. Meanwhile a few probe clients send
+/api/analyze at a steady rate. Every connection uses its own loopback source
+address, so the server sees many clients, as it would in a real surge, rather
+than one client that per-client rate limits would throttle. Reports triage
+latency and what happened to the flood. Exits non-zero when the triage p99 with
+admission control on is above --max-p99-ms.
+"""
+import argparse
+import os
+import sys
+
+from gevent import monkey
+
+monkey.patch_all()
+
+import gevent  # noqa: E402
+import http.client  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from collections import Counter  # noqa: E402
+from urllib.parse import quote, urlsplit  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMPTOMS = ["fever", "cough", "headache", "chest pain", "difficulty breathing", "vomiting", "diarrhea",
+            "rash", "joint pain", "fatigue", "body ache", "chills", "sore throat", "dizziness"]
+SEARCH_TERMS = ["malaria", "dengue", "water", "nutrition", "pregnancy", "vaccination", "diabetes", "hygiene",
+                "tb", "anemia", "mosquito", "diarrhoea", "heat", "snake bite"]
+CHAT_MESSAGES = ["What is dengue?", "how to prevent malaria", "bukhar hai kya karu", "anemia diet",
+                 "my child has diarrhea", "covid symptoms", "TB cough for 3 weeks", "sugar level high diabetes"]
+
+
+def source_address(n):
+    # 127.0.0.0/8 is all loopback on Linux: one address per simulated client
+    return (f"127.{1 + n // 62500}.{n // 250 % 250 + 1}.{n % 250 + 1}", 0)
+
+
+def flood_request(rng):
+    kind = rng.random()
+    if kind < 0.4:
+        query = quote(f"{rng.choice(SEARCH_TERMS)} {rng.choice(SEARCH_TERMS)}")
+        return "GET", f"/api/education/search?q={query}&lang={rng.choice(['en', 'hi', 'te'])}", None
+    if kind < 0.8:
+        return "POST", "/api/chatbot", {"message": f"{rng.choice(CHAT_MESSAGES)} {rng.randint(1, 10**6)}",
+                                        "language": rng.choice(["en", "hi"])}
+    return "GET", f"/api/education?lang={rng.choice(['en', 'hi', 'te'])}", None
+
+
+def send(conn, method, path, body):
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status, response.getheader("Retry-After")
+
+
+def flooder(host, port, n, deadline, statuses, obey_retry_after):
+    rng = random.Random(n)
+    conn = None
+    while time.monotonic() < deadline:
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=30, source_address=source_address(n))
+            status, retry_after = send(conn, *flood_request(rng))
+            statuses[status] += 1
+            if retry_after and obey_retry_after:
+                gevent.sleep(min(float(retry_after), max(0.0, deadline - time.monotonic())))
+        except (OSError, http.client.HTTPException):
+            statuses["error"] += 1
+            conn = None
+            gevent.sleep(0.01)
+
+
+def prober(host, port, n, deadline, interval, latencies, statuses):
+    rng = random.Random(-n)
+    conn = http.client.HTTPConnection(host, port, timeout=30, source_address=source_address(n))
+    while time.monotonic() < deadline:
+        body = {"symptoms": rng.sample(SYMPTOMS, rng.randint(1, 4)), "age": rng.randint(1, 85)}
+        start = time.perf_counter()
+        try:
+            status, _ = send(conn, "POST", "/api/analyze", body)
+        except (OSError, http.client.HTTPException):
+            status = "error"
+            conn = http.client.HTTPConnection(host, port, timeout=30, source_address=source_address(n))
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+        gevent.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else float('nan')
+
+
+def run(url, args):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + args.seconds
+    latencies, probe_statuses, flood_statuses = [], Counter(), Counter()
+    # Probes take the first addresses, flood connections the rest
+    greenlets = [gevent.spawn(prober, parts.hostname, parts.port, i, deadline, 1 / args.probe_rate,
+                              latencies, probe_statuses) for i in range(args.probes)]
+    greenlets += [gevent.spawn(flooder, parts.hostname, parts.port, args.probes + i, deadline, flood_statuses,
+                               not args.ignore_retry_after) for i in range(args.flood)]
+    gevent.joinall(greenlets)
+    return {"triage_p50_ms": round(percentile(latencies, 0.50), 2), "triage_p99_ms": round(percentile(latencies, 0.99), 2),
+            "triage_max_ms": round(max(latencies) * 1000, 2) if latencies else float('nan'),
+            "triage_status": dict(probe_statuses), "flood_rps": round(sum(flood_statuses.values()) / args.seconds),
+            "flood_status": dict(flood_statuses)}
+
+
+def start_server(port, admission):
+    env = dict(os.environ, ADMISSION='1' if admission else '0',
+               HISTORY_DB=os.path.join(tempfile.mkdtemp(prefix='healthai-overload-'), 'history.db'))
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py'), '--host', '127.0.0.1',
+                               '--port', str(port), '--workers', '1'], env=env, cwd=ROOT, stdout=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            if send(conn, "GET", "/api/knowledge-base", None)[0] == 200:
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("serve.py did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Overload test: triage latency under a content flood")
+    parser.add_argument("--url", help="test a running server instead of starting serve.py")
+    parser.add_argument("--port", type=int, default=8765, help="port for the serve.py this starts")
+    parser.add_argument("--flood", type=int, default=300, help="flood connections (one client each)")
+    parser.add_argument("--probes", type=int, default=4, help="triage clients")
+    parser.add_argument("--probe-rate", type=float, default=5, help="triage requests/second per probe client")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ignore-retry-after", action="store_true",
+                        help="flood clients retry refused requests at once instead of waiting Retry-After")
+    parser.add_argument("--max-p99-ms", type=float, default=250, help="fail if triage p99 (admission on) is above this")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        modes = {"target": args.url}
+    else:
+        modes = {"admission on": True, "admission off": False}
+    results = {}
+    for label, mode in modes.items():
+        server = None if args.url else start_server(args.port, mode)
+        try:
+            results[label] = run(args.url or f"http://127.0.0.1:{args.port}", args)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+        print(f"{label:<14} " + json.dumps(results[label]))
+    p99 = results.get("admission on", results.get("target"))["triage_p99_ms"]
+    if not p99 <= args.max_p99_ms:
+        print(f"triage p99 {p99}ms exceeds {args.max_p99_ms}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
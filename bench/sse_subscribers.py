@@ -0,0 +1,88 @@
+"""Hold thousands of idle /api/stream subscribers and measure fan-out.
+
+    python serve.py --port 8000 &
+    python bench/sse_subscribers.py --url http://127.0.0.1:8000 --clients 5000
+
+Opens N SSE connections (half filtered to one district), posts case events,
+and reports how long each event took to reach every matching subscriber.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+
+async def subscribe(host, port, path, received, ready):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    ready.append(1)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"event: alerts") or line.startswith(b"event: dashboard"):
+                received.append(time.perf_counter())
+    finally:
+        writer.close()
+
+
+def post_events(url, region, count):
+    events = [{"region": region, "disease": "Malaria"} for _ in range(count)]
+    request = urllib.request.Request(url + "/api/case-events", data=json.dumps(events).encode(),
+                                     headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(request).read()
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--hold", type=float, default=20.0, help="seconds to keep subscribers idle before publishing")
+    args = parser.parse_args(argv)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(max(soft, args.clients + 256), hard), hard))
+
+    target = urlsplit(args.url)
+    received, ready, tasks = [], [], []
+    started = time.perf_counter()
+    for i in range(args.clients):
+        path = "/api/stream?region=Kadapa" if i % 2 else "/api/stream?region=Guntur"
+        tasks.append(asyncio.create_task(subscribe(target.hostname, target.port or 80, path, received, ready)))
+        if i % 500 == 499:
+            await asyncio.sleep(0.05)
+    while len(ready) < args.clients:
+        failed = [t for t in tasks if t.done() and t.exception()]
+        if failed:
+            print(f"{len(failed)} subscriber(s) failed: {failed[0].exception()!r}", file=sys.stderr)
+            return 1
+        await asyncio.sleep(0.1)
+    print(f"{args.clients} subscribers connected in {time.perf_counter() - started:.1f}s; idling {args.hold:.0f}s")
+    await asyncio.sleep(args.hold)
+
+    # One dashboard update for Kadapa should reach exactly the Kadapa half
+    published = time.perf_counter()
+    await asyncio.to_thread(post_events, args.url, "Kadapa", 1)
+    expected = (args.clients + 1) // 2
+    while len(received) < expected and time.perf_counter() - published < 30:
+        await asyncio.sleep(0.01)
+    latencies = sorted(t - published for t in received)
+    alive = sum(not t.done() for t in tasks)
+    print(f"delivered {len(received)}/{expected} events; still connected {alive}/{args.clients}")
+    if latencies:
+        print(f"fan-out latency p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms")
+    for task in tasks:
+        task.cancel()
+    return 0 if len(received) >= expected and alive == args.clients else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,175 @@
+"""Command-line batch tools for HealthAI.
+
+    python cli.py personal-risk survey.csv -o scores.csv
+    python cli.py personal-risk survey.ndjson --output-format ndjson
+    python cli.py bmi-screen roster.csv -o screening.csv
+    python cli.py replay-outbreaks cases_2025.csv --speed 86400
+    python cli.py kb-compile
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+from app import (KB_DIR, KB_SNAPSHOT, PERSONAL_RISK_DISEASES, KnowledgeBaseError, OutbreakDetector, bmi_screening_batch,
+                 case_event_from_record, compile_knowledge_base, parse_ndjson, personal_risk_batch)
+
+
+def open_input(path):
+    return sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+
+
+def open_output(path):
+    return sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+
+
+def read_records(stream, fmt):
+    # Both readers are lazy, so only one chunk of the file is in memory at a time
+    if fmt == 'csv':
+        return csv.DictReader(stream)
+    return parse_ndjson(stream)
+
+
+def guess_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def write_ndjson(results, out):
+    for result in results:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def cmd_personal_risk(args):
+    fmt = guess_format(args.input, args.format)
+    out_fmt = args.output_format or fmt
+    errors = 0
+    with open_input(args.input) as stream, open_output(args.output) as out:
+        results = personal_risk_batch(read_records(stream, fmt), chunk_size=args.chunk_size)
+        if out_fmt == 'ndjson':
+            write_ndjson(results, out)
+            return 0
+        writer = csv.writer(out)
+        writer.writerow(["index", "id"] + PERSONAL_RISK_DISEASES + ["overall", "level", "error"])
+        for result in results:
+            if "error" in result:
+                errors += 1
+                writer.writerow([result["index"], ""] + [""] * len(PERSONAL_RISK_DISEASES) + ["", "", result["error"]])
+                continue
+            scores = {r["disease"]: r["score"] for r in result["risks"]}
+            writer.writerow([result["index"], result.get("id", "")] + [scores[d] for d in PERSONAL_RISK_DISEASES]
+                            + [result["overall"], result["level"], ""])
+    if errors:
+        print(f"{errors} record(s) could not be scored", file=sys.stderr)
+    return 0
+
+
+BMI_SCREEN_COLUMNS = ["bmi", "category", "z_score", "percentile", "ideal_weight_range"]
+
+
+def cmd_bmi_screen(args):
+    fmt = guess_format(args.input, args.format)
+    out_fmt = args.output_format or fmt
+    errors = 0
+    with open_input(args.input) as stream, open_output(args.output) as out:
+        results = bmi_screening_batch(read_records(stream, fmt), chunk_size=args.chunk_size)
+        if out_fmt == 'ndjson':
+            write_ndjson(results, out)
+            return 0
+        writer = csv.writer(out)
+        writer.writerow(["index", "id"] + BMI_SCREEN_COLUMNS + ["error"])
+        for result in results:
+            if "error" in result:
+                errors += 1
+            writer.writerow([result["index"], result.get("id", "")] + [result.get(c, "") for c in BMI_SCREEN_COLUMNS]
+                            + [result.get("error", "")])
+    if errors:
+        print(f"{errors} record(s) could not be screened", file=sys.stderr)
+    return 0
+
+
+def cmd_replay_outbreaks(args):
+    # Events must be in time order; --speed N replays N times faster than real time
+    detector = OutbreakDetector()
+    fmt = guess_format(args.input, args.format)
+    transitions = skipped = 0
+    first_event = replay_start = None
+    with open_input(args.input) as stream, open_output(args.output) as out:
+        for record in read_records(stream, fmt):
+            attributed = case_event_from_record(record) if isinstance(record, dict) else None
+            try:
+                when = datetime.strptime(str(record.get('date') or record.get('timestamp'))[:10], "%Y-%m-%d")
+            except (AttributeError, ValueError):
+                attributed = None
+            if not attributed:
+                skipped += 1
+                continue
+            if args.speed:
+                if first_event is None:
+                    first_event, replay_start = when, time.monotonic()
+                delay = (when - first_event).total_seconds() / args.speed - (time.monotonic() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            alert = detector.observe(*attributed, when)
+            if alert:
+                transitions += 1
+                out.write(json.dumps(dict(alert, date=when.strftime("%Y-%m-%d")), ensure_ascii=False) + "\n")
+    print(f"{transitions} alert change(s); {skipped} record(s) skipped", file=sys.stderr)
+    return 0
+
+
+def cmd_kb_compile(args):
+    # Running servers pick up the new snapshot within a second (see AppState)
+    try:
+        result = compile_knowledge_base(args.kb_dir, args.snapshot)
+    except (KnowledgeBaseError, ValueError, OSError, KeyError) as e:
+        print(f"knowledge base not compiled: {e}", file=sys.stderr)
+        return 1
+    print(f"compiled KB version {result['version']} ({result['bytes']} bytes, digest {result['digest'][:12]}) to {args.snapshot}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="HealthAI batch tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    risk = commands.add_parser("personal-risk", help="Score a household survey file (CSV or NDJSON)")
+    risk.add_argument("input", help="input file, or - for stdin")
+    risk.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    risk.add_argument("--format", choices=["csv", "ndjson"], help="input format (default: from file extension)")
+    risk.add_argument("--output-format", choices=["csv", "ndjson"], help="output format (default: same as input)")
+    risk.add_argument("--chunk-size", type=int, default=10000, help="records scored per vectorized pass")
+    risk.set_defaults(func=cmd_personal_risk)
+
+    bmi = commands.add_parser("bmi-screen", help="Screen a class or camp roster for BMI (CSV or NDJSON: id, age, sex, weight, height)")
+    bmi.add_argument("input", help="input file, or - for stdin")
+    bmi.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    bmi.add_argument("--format", choices=["csv", "ndjson"], help="input format (default: from file extension)")
+    bmi.add_argument("--output-format", choices=["csv", "ndjson"], help="output format (default: same as input)")
+    bmi.add_argument("--chunk-size", type=int, default=10000, help="records screened per vectorized pass")
+    bmi.set_defaults(func=cmd_bmi_screen)
+
+    replay = commands.add_parser("replay-outbreaks", help="Backtest the outbreak detector on a historical case file")
+    replay.add_argument("input", help="CSV or NDJSON with region, disease and date columns, in time order")
+    replay.add_argument("-o", "--output", default="-", help="NDJSON alert changes (default: stdout)")
+    replay.add_argument("--format", choices=["csv", "ndjson"], help="input format (default: from file extension)")
+    replay.add_argument("--speed", type=float, help="pace the replay at this multiple of real time (default: as fast as possible)")
+    replay.set_defaults(func=cmd_replay_outbreaks)
+
+    kb = commands.add_parser("kb-compile", help="Validate the kb/ data files and write the binary snapshot servers load")
+    kb.add_argument("--kb-dir", default=KB_DIR, help="directory with manifest.json and the table files")
+    kb.add_argument("--snapshot", default=KB_SNAPSHOT, help="snapshot file to write")
+    kb.set_defaults(func=cmd_kb_compile)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Production server for HealthAI.
+
+    python serve.py --port 8000
+    python serve.py --port 8000 --workers 8
+
+Runs the app on gevent's WSGI server so each connection is a greenlet rather
+than an OS thread; thousands of idle /api/stream subscribers cost only memory.
+
+With --workers N the app (knowledge bases, indexes, replayed case log) is built
+once, then N worker processes are forked on the shared listening socket. The
+read-only tables stay shared copy-on-write; history, appointments and case
+events go through the SQLite store, so every worker sees the same data. Dead
+workers are replaced; SIGTERM or Ctrl-C stops them all.
+"""
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+try:
+    from gevent import monkey
+except ImportError:  # pragma: no cover - gevent is listed in requirements.txt
+    raise SystemExit("serve.py needs gevent: pip install -r requirements.txt")
+
+# Must run before app (and its threading/socket users) is imported
+monkey.patch_all()
+
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from app import create_app  # noqa: E402
+
+
+def serve(listener, app):
+    WSGIServer(listener, app, log=None).serve_forever()
+
+
+def spawn(listener, app):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            serve(listener, app)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def run_workers(listener, app, count):
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    # Objects built so far are never freed: keep the collector from touching
+    # (and so un-sharing) their pages in the workers
+    gc.freeze()
+    workers = {spawn(listener, app) for _ in range(count)}
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid in workers and not stopping:
+            workers.discard(pid)
+            print(f"worker {pid} exited ({status}); starting a replacement", file=sys.stderr)
+            time.sleep(1)  # don't spin if workers crash at start-up
+            workers.add(spawn(listener, app))
+        elif not pid:
+            time.sleep(0.5)
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve HealthAI with gevent")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backlog", type=int, default=2048, help="listen backlog for connection bursts")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                        help="worker processes to pre-fork (default: $WEB_CONCURRENCY or 1; try one per core)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and os.environ.get('HISTORY_STORE') == 'memory':
+        raise SystemExit("--workers needs the shared SQLite store; unset HISTORY_STORE=memory")
+    metrics_dir = None
+    if args.workers > 1 and not os.environ.get('METRICS_DIR'):
+        metrics_dir = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='healthai-metrics-')
+
+    app = create_app()
+    listener = socket.create_server((args.host, args.port), backlog=args.backlog)
+    print(f"HealthAI serving on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    try:
+        if args.workers > 1:
+            run_workers(listener, app, args.workers)
+        else:
+            serve(listener, app)
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
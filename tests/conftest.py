@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Tests never touch the real history database
+os.environ.setdefault('HISTORY_STORE', 'memory')
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend_app(request, tmp_path):
+    # The app on each history backend
+    from app import create_app
+    return create_app({'HISTORY_STORE': request.param, 'HISTORY_DB': str(tmp_path / 'history.db'),
+                       'ADMISSION': False})
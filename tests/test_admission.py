@@ -0,0 +1,99 @@
+import threading
+import time
+
+from app import ADMISSION_CLASSES, AdmissionController, admission_client, create_app
+
+
+def admission_app(**config):
+    return create_app(dict({"HISTORY_STORE": "memory", "ADMISSION": True, "ADMISSION_RATE_LIMITS": True}, **config))
+
+
+def test_triage_is_never_rate_limited():
+    client = admission_app().test_client()
+    statuses = {client.post('/api/analyze', json={"symptoms": ["fever"], "age": 30}).status_code for _ in range(100)}
+    assert statuses == {200}
+
+
+def test_content_is_rate_limited_per_client():
+    client = admission_app().test_client()
+    statuses = [client.get('/api/education').status_code for _ in range(40)]
+    assert statuses.count(429) == 40 - ADMISSION_CLASSES["content"][4]
+    response = client.get('/api/education')
+    assert response.status_code == 429 and int(response.headers['Retry-After']) >= 1
+
+
+def test_clients_behind_a_proxy_get_their_own_buckets():
+    client = admission_app(PROXY_COUNT=1).test_client()
+    statuses = [client.get('/api/education', headers={"X-Forwarded-For": f"10.0.{n // 250}.{n % 250}"}).status_code
+                for n in range(100)]
+    assert statuses == [200] * 100
+    shared = [client.get('/api/education', headers={"X-Forwarded-For": "10.9.9.9"}).status_code for _ in range(40)]
+    assert 429 in shared
+
+
+def test_ipv6_clients_are_keyed_by_prefix():
+    assert admission_client("2001:db8:1:2:aaaa::1") == admission_client("2001:db8:1:2:bbbb::9") == "2001:db8:1:2::/64"
+    assert admission_client("10.1.2.3") == "10.1.2.3"
+
+
+def hold(controller, cls, release):
+    controller.acquire(cls, "holder")
+    release.wait()
+    controller.release(cls)
+
+
+def test_triage_runs_over_the_limit_once_its_budget_is_spent(monkeypatch):
+    monkeypatch.setitem(ADMISSION_CLASSES, "triage", (0, 1.0, 0.05, None, None))
+    controller = AdmissionController(1, rate_limits=False)
+    release = threading.Event()
+    holder = threading.Thread(target=hold, args=(controller, "triage", release))
+    holder.start()
+    time.sleep(0.02)
+    waited, rejected = controller.acquire("triage", "clinic")
+    assert rejected is None and waited >= 0.05
+    assert controller.stats()["in_flight"]["triage"] == 2
+    controller.release("triage")
+    release.set()
+    holder.join()
+    assert controller.stats()["in_flight"]["triage"] == 0
+
+
+def test_lower_classes_are_shed_when_their_budget_is_spent(monkeypatch):
+    monkeypatch.setitem(ADMISSION_CLASSES, "content", (2, 0.5, 0.05, 10, 30))
+    controller = AdmissionController(2, rate_limits=False)
+    release = threading.Event()
+    holder = threading.Thread(target=hold, args=(controller, "content", release))
+    holder.start()
+    time.sleep(0.02)
+    waited, rejected = controller.acquire("content", "reader")  # content may use one of the two slots
+    assert waited is None and rejected[0] == 503
+    assert controller.acquire("triage", "clinic") == (0.0, None)  # the other slot is still free
+    controller.release("triage")
+    release.set()
+    holder.join()
+    assert controller.stats()["queued"] == dict.fromkeys(ADMISSION_CLASSES, 0)
+
+
+def test_triage_is_dispatched_before_queued_content():
+    controller = AdmissionController(2, rate_limits=False)
+    order, release = [], threading.Event()
+
+    def request(cls, n):
+        if controller.acquire(cls, str(n))[1] is None:
+            order.append(cls)
+            time.sleep(0.02)
+            controller.release(cls)
+
+    holder = threading.Thread(target=hold, args=(controller, "content", release))
+    holder.start()
+    time.sleep(0.01)
+    threads = [threading.Thread(target=request, args=("content", n)) for n in range(3)]
+    threads += [threading.Thread(target=request, args=("triage", n)) for n in range(2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.005)
+    release.set()
+    for t in threads + [holder]:
+        t.join()
+    assert order[:2] == ["triage", "triage"]
+    assert controller.stats()["queued"] == dict.fromkeys(ADMISSION_CLASSES, 0)
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import flask
+
+import app
+from app import AppState, SQLiteCaseLog, create_app
+
+EVENTS = [{"region": region, "disease": disease, "date": f"2030-01-{day:02d}"}
+          for day in range(1, 8) for region, disease in [("Kadapa", "Malaria"), ("Guntur", "Dengue"), ("Guntur", "Dengue")]]
+
+
+def test_module_level_app_is_built_lazily():
+    assert 'app' not in vars(app)
+    assert isinstance(app.app, flask.Flask)
+    assert app.app is app.app
+
+
+def test_module_level_app_for_wsgi_servers(tmp_path):
+    # What `gunicorn app:app` does: import the module, then look the attribute up
+    code = "import app; print(type(app.app).__name__, 'app' in vars(app))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(app.__file__),
+                         env=dict(os.environ, HISTORY_STORE="sqlite", HISTORY_DB=str(tmp_path / "history.db")),
+                         capture_output=True, text=True)
+    assert out.stdout.split() == ["Flask", "True"], out.stderr
+
+
+def test_workers_restore_a_checkpoint_and_replay_only_later_cases(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteCaseLog, "CHECKPOINT_EVERY", 8)
+    config = {"HISTORY_STORE": "sqlite", "HISTORY_DB": str(tmp_path / "history.db"), "ADMISSION": False}
+    first = create_app(config).test_client()
+    assert first.post('/api/case-events', json=EVENTS).status_code == 200
+
+    replayed = []
+    original = AppState.apply_case
+    monkeypatch.setattr(AppState, "apply_case", lambda self, case_id, *a: replayed.append(case_id) or original(self, case_id, *a))
+    second = create_app(config).test_client()
+    assert replayed == [17, 18, 19, 20, 21]  # checkpoint at case 16
+    for path in ('/api/health-data', '/api/outbreak-alerts', '/api/frontline-summary?region=Guntur'):
+        assert second.get(path).get_json() == first.get(path).get_json(), path
+
+
+def test_resume_from_before_a_restored_checkpoint_resets():
+    broker = app.EventBroker()
+    broker.restart_at(33)
+    frames = app.sse_frames(broker, 3, set(), {"alerts", "dashboard"})
+    assert next(frames).startswith("retry:")
+    assert next(frames) == "id: 33\nevent: reset\ndata: {}\n\n"
+    assert next(frames) == ": heartbeat\n\n"
+    broker.publish("alerts", "Kadapa", {"level": "RED"}, 35)
+    assert next(frames) == 'id: 35\nevent: alerts\ndata: {"level": "RED"}\n\n'
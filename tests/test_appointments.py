@@ -0,0 +1,69 @@
+import threading
+
+import app
+
+
+def book(client, **fields):
+    body = dict({"doctor_id": 1, "date": "2030-01-07", "patient_name": "Asha"}, **fields)
+    return client.post('/api/book-appointment', json=body)
+
+
+def test_missing_or_malformed_time_is_rejected(backend_app):
+    client = backend_app.test_client()
+    assert book(client).status_code == 400
+    assert book(client, time="").status_code == 400
+    assert book(client, time=900).status_code == 400
+    assert book(client, time="tomorrow").status_code == 400
+
+
+def test_conflicts_return_409(backend_app):
+    client = backend_app.test_client()
+    assert book(client, time="9:00 AM").status_code == 200
+    assert book(client, time="9:00 AM").status_code == 409  # already booked
+    assert book(client, time="9:30 AM").status_code == 409  # not one of the doctor's slots
+
+
+def test_doctors_added_later_can_be_booked(backend_app):
+    client = backend_app.test_client()
+    doctor = {"id": 99, "name": "Dr. Test", "specialty": "General Physician", "available": ["8:00 AM"],
+              "location": "Guntur PHC"}
+    app.DOCTORS.append(doctor)
+    try:
+        assert client.get('/api/doctors/99/slots?date=2030-01-07').get_json()["available"] == ["8:00 AM"]
+        assert book(client, doctor_id=99, time="8:00 AM").status_code == 200
+        assert book(client, doctor_id=99, time="8:00 AM").status_code == 409
+    finally:
+        app.DOCTORS.remove(doctor)
+    assert book(client, doctor_id=99, time="8:00 AM").status_code == 400
+
+
+def test_dates_are_validated_and_canonical(backend_app):
+    client = backend_app.test_client()
+    for date in ("garbage", 5, "2030-02-30", ["2030-01-07"], {"d": 1}):
+        assert book(client, date=date, time="9:00 AM").status_code == 400, date
+    response = book(client, date="2030-1-7", time="9:00 AM")
+    assert response.status_code == 200
+    assert response.get_json()["appointment"]["date"] == "2030-01-07"
+    assert book(client, date="2030-01-07", time="9:00 AM").status_code == 409
+    assert "9:00 AM" not in client.get('/api/doctors/1/slots?date=2030-01-07').get_json()["available"]
+    assert len(client.get('/api/appointments?date=2030-1-7').get_json()) == 1
+    assert client.get('/api/doctors/1/slots?date=garbage').status_code == 400
+
+
+def test_concurrent_bookings_win_a_slot_once(backend_app):
+    client_for = backend_app.test_client
+    barrier = threading.Barrier(20)
+    statuses = []
+
+    def attempt(n):
+        client = client_for()
+        barrier.wait()
+        date = "2030-01-08" if n % 2 else "2030-1-8"
+        statuses.append(book(client, date=date, time="10:00 AM", patient_name=f"P{n}").status_code)
+
+    threads = [threading.Thread(target=attempt, args=(n,)) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(statuses) == [200] + [409] * 19
@@ -0,0 +1,40 @@
+import json
+import random
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    from app import create_app
+    return create_app({'ADMISSION': False}).test_client()
+
+
+def scalar(client, record):
+    response = client.post('/api/bmi', json=record)
+    result = response.get_json()
+    assert (response.status_code == 400) == ("error" in result)
+    return result
+
+
+def batch(client, records):
+    response = client.post('/api/bmi-batch', json=records)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_child_without_sex_is_rejected(client):
+    response = client.post('/api/bmi', json={"weight": 39, "height": 104, "age": 10})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Sex (male/female) is needed to screen children"}
+
+
+def test_under_19_scalar_matches_batch(client):
+    rng = random.Random(5)
+    records = [{"weight": round(rng.uniform(8, 90), 1), "height": round(rng.uniform(70, 190), 1),
+                "age": rng.randint(0, 18), "sex": rng.choice(["male", "female", "M", "f", "", "other", None])}
+               for _ in range(300)]
+    records += [{"weight": 39, "height": 104, "age": 10}, {"weight": 12, "height": 85, "age": 1, "sex": "male"}]
+    for index, (record, result) in enumerate(zip(records, batch(client, records))):
+        record = {k: v for k, v in record.items() if v is not None}
+        assert dict(scalar(client, record), index=index) == result, record
@@ -0,0 +1,68 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+from app import FacilityIndex, facility_index, haversine_km
+
+
+def synthetic_facilities(n, seed=11):
+    # Spread over Andhra Pradesh-sized box, as in a state facility registry
+    rng = random.Random(seed)
+    return [{"name": f"F{i}", "type": rng.choice(["PHC", "CHC", "District Hospital"]),
+             "emergency": rng.random() < 0.2, "lat": rng.uniform(12.6, 19.9), "lon": rng.uniform(76.7, 84.8)}
+            for i in range(n)]
+
+
+def brute_force(facilities, lat, lon, k=None, radius_km=None, facility_type=None, emergency=None):
+    found = []
+    for f in facilities:
+        if facility_type and f["type"].lower() != facility_type.lower():
+            continue
+        if emergency is not None and f["emergency"] != emergency:
+            continue
+        d = float(haversine_km(lat, lon, np.array([f["lat"]]), np.array([f["lon"]]))[0])
+        if radius_km is None or d <= radius_km:
+            found.append((d, f["name"]))
+    found.sort()
+    return found[:k] if k else found
+
+
+QUERIES = [
+    dict(lat=14.68, lon=77.60, k=5),
+    dict(lat=16.5, lon=80.6, k=1, emergency=True),
+    dict(lat=16.5, lon=80.6, k=20, facility_type="district hospital", emergency=True),
+    dict(lat=15.0, lon=79.0, radius_km=25),
+    dict(lat=15.0, lon=79.0, k=3, radius_km=400),
+    dict(lat=-45.0, lon=-100.0, k=5),   # far outside the facilities' box
+    dict(lat=0.0, lon=0.0, k=5, emergency=True),
+    dict(lat=28.6, lon=77.2, radius_km=1500),
+    dict(lat=19.95, lon=84.9, k=100),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_brute_force(query):
+    facilities = synthetic_facilities(3000)
+    q = dict(query)
+    lat, lon = q.pop("lat"), q.pop("lon")
+    result = [(round(d, 6), f["name"]) for f, d in FacilityIndex(facilities).query(lat, lon, **q)]
+    expected = [(round(d, 6), name) for d, name in brute_force(facilities, lat, lon, **q)]
+    assert result == expected
+
+
+def test_shipped_facilities_far_query_is_fast():
+    index = facility_index()
+    start = time.perf_counter()
+    assert len(index.query(-45.0, -100.0, 5)) == min(5, len(index.facilities))
+    index.query(0.0, 0.0, 5)
+    assert time.perf_counter() - start < 0.1
+
+
+def test_large_registry_far_query_is_fast():
+    index = FacilityIndex(synthetic_facilities(40000))
+    start = time.perf_counter()
+    for lat, lon in [(-45.0, -100.0), (0.0, 0.0), (89.0, 179.0)]:
+        assert len(index.query(lat, lon, 5, emergency=True)) == 5
+    assert time.perf_counter() - start < 0.3
@@ -0,0 +1,30 @@
+def history(client, query=""):
+    return [r["note"] for r in client.get(f'/api/get-history?limit=100{query}').get_json()]
+
+
+def test_backdated_uploads_page_the_same_on_both_backends(backend_app):
+    client = backend_app.test_client()
+    client.post('/api/save-history', json={"note": "new", "region": "Kadapa"})
+    uploads = [{"note": 0, "timestamp": "2022-03-01 09:00", "client_id": "a"},
+               {"note": "old", "timestamp": "2019-05-01 10:00", "client_id": "b", "region": "Kadapa"},
+               {"note": 1, "timestamp": "2022-03-02 09:00", "client_id": "c", "region": "Kadapa"},
+               {"note": 2, "timestamp": "2022-03-03 09:00", "client_id": "d"}]
+    for record in uploads:  # one upload each, so ids follow upload order, not timestamps
+        assert client.post('/api/sync', json={"history": [record]}).status_code == 200
+
+    assert history(client) == ["new", 0, "old", 1, 2]
+    assert history(client, "&since=2021-01-01") == ["new", 0, 1, 2]
+    assert history(client, "&since=2021-01-01&region=Kadapa") == ["new", 1]
+    assert history(client, "&since=2030-01-01") == []
+
+
+def test_since_pages_with_cursor(backend_app):
+    client = backend_app.test_client()
+    for n in range(6):
+        client.post('/api/sync', json={"history": [{"note": n, "client_id": str(n),
+                                                    "timestamp": f"20{19 + n % 2 * 3}-01-0{n + 1} 08:00"}]})
+    first = client.get('/api/get-history?limit=2&since=2021-01-01')
+    cursor = first.headers['X-Next-Cursor']
+    rest = client.get(f'/api/get-history?limit=2&since=2021-01-01&cursor={cursor}').get_json()
+    assert [r["note"] for r in first.get_json()] == [3, 5]
+    assert [r["note"] for r in rest] == [1]
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import app
+from app import OutbreakDetector, VersionedList
+
+
+def seeded_detector():
+    return OutbreakDetector(VersionedList(dict(a) for a in app.OUTBREAK_ALERTS))
+
+
+def alert(detector, region, disease):
+    return next((a for a in detector.alerts if (a["region"], a["disease"]) == (region, disease)), None)
+
+
+def test_seeded_alerts_start_at_their_own_level():
+    detector = seeded_detector()
+    for seeded in app.OUTBREAK_ALERTS:
+        assert detector._level(detector._states[(seeded["region"], seeded["disease"])])[0] == seeded["level"]
+
+
+def test_one_live_case_keeps_the_seeded_alert():
+    detector = seeded_detector()
+    for seeded in app.OUTBREAK_ALERTS:
+        assert detector.observe(seeded["region"], seeded["disease"]) is None  # level unchanged
+        current = alert(detector, seeded["region"], seeded["disease"])
+        assert current["level"] == seeded["level"]
+        assert current["cases_7days"] == seeded["cases_7days"] + 1
+
+
+def test_seeded_cases_age_out_of_the_window():
+    detector = seeded_detector()
+    later = datetime.now() + timedelta(days=OutbreakDetector.WINDOW_DAYS)
+    assert detector.observe("Kadapa", "Malaria", when=later)["level"] is None
+    assert alert(detector, "Kadapa", "Malaria") is None
+
+
+def test_case_events_and_saved_triage_keep_frontline_alerts(backend_app):
+    client = backend_app.test_client()
+    assert client.post('/api/case-events', json={"region": "Kadapa", "disease": "Malaria"}).status_code == 200
+    client.post('/api/save-history', json={"region": "Nellore", "symptoms": ["diarrhea"],
+                                           "conditions": [{"name": "Cholera"}]})
+    kadapa = client.get('/api/frontline-summary?region=Kadapa').get_json()["alert"]
+    nellore = client.get('/api/frontline-summary?region=Nellore').get_json()["alert"]
+    assert (kadapa["level"], kadapa["cases_7days"]) == ("RED", 48)
+    assert nellore["level"] == "ORANGE" and nellore["cases_7days"] >= 19
+    alerts = {(a["region"], a["disease"]) for a in client.get('/api/outbreak-alerts').get_json()}
+    assert {("Kadapa", "Malaria"), ("Nellore", "Cholera")} <= alerts
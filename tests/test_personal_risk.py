@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from app import parse_flag, personal_risk_batch, personal_risk_score, personal_risk_summary
+
+FLAGS = ('smoking', 'alcohol', 'bp_history', 'diabetes_history', 'family_history')
+DEFAULTS = {"age": 30, "gender": "male", "exercise": "moderate", "diet": "moderate"}
+
+
+def scalar(record):
+    # /api/personal-risk on one record; CSV-style flags are parsed as the batch path does
+    d = dict(DEFAULTS, **{k: v for k, v in record.items() if k != 'id'})
+    risks = personal_risk_score(int(d['age']), d['gender'], *(parse_flag(d.get(f, False)) for f in FLAGS[:2]),
+                                d['exercise'], d['diet'], *(parse_flag(d.get(f, False)) for f in FLAGS[2:]))
+    return personal_risk_summary(risks)
+
+
+def random_record(rng):
+    record = {"age": rng.randint(0, 110), "gender": rng.choice(["male", "female", "other"]),
+              "exercise": rng.choice(["none", "moderate", "high"]), "diet": rng.choice(["poor", "moderate", "good"])}
+    record.update({f: rng.choice([True, False, "yes", "no", 1, 0, "1", "0"]) for f in FLAGS})
+    for field in list(record):  # drop some fields to exercise the defaults
+        if rng.random() < 0.1:
+            del record[field]
+    return record
+
+
+EDGE_CASES = [
+    {},
+    {"age": 45}, {"age": 46}, {"age": 50, "gender": "female"}, {"age": 49, "gender": "female"},
+    {"age": 60}, {"age": 61},
+    {"age": -5}, {"age": 0}, {"age": 150}, {"age": 10**30}, {"age": -10**30}, {"age": "72"},
+    {"age": 80, **{f: True for f in FLAGS}, "exercise": "none", "diet": "poor"},  # every rule, scores capped
+    {"gender": "female", "smoking": "no", "alcohol": "false"},
+]
+
+
+@pytest.mark.parametrize("record", EDGE_CASES)
+def test_edge_cases_match_scalar(record):
+    [result] = personal_risk_batch([record])
+    assert result == dict(scalar(record), index=0)
+
+
+def test_random_records_match_scalar():
+    rng = random.Random(7)
+    records = [random_record(rng) for _ in range(5000)]
+    for record, result in zip(records, personal_risk_batch(records, chunk_size=777)):
+        expected = dict(scalar(record), index=result["index"])
+        assert result == expected, record
+
+
+def test_invalid_records_do_not_stop_the_stream():
+    results = list(personal_risk_batch([{"age": "old"}, {"age": 40}, "not a record", {"age": None}]))
+    assert [r.get("error") for r in results] == ["Invalid survey record", None, "Invalid survey record", "Invalid survey record"]
+    assert results[1] == dict(scalar({"age": 40}), index=1)
@@ -0,0 +1,56 @@
+import random
+import string
+
+import app
+from app import SymptomMatcher
+
+
+def loop_match(symptom, database, synonyms=None):
+    # The original analyze_symptoms scan, plus synonyms found in the text
+    aliased = {key for syn, key in (synonyms or {}).items() if syn.lower() in symptom}
+    return [key for key in database if key in symptom or symptom in key or key in aliased]
+
+
+def substrings(text):
+    return {text[i:j] for i in range(len(text)) for j in range(i + 1, len(text) + 1)}
+
+
+def inputs():
+    keys = list(app.SYMPTOM_DATABASE)
+    rng = random.Random(2025)
+    texts = {""}
+    for key in keys:
+        texts |= substrings(key)
+    for syn in app.SYMPTOM_SYNONYMS:
+        texts |= substrings(syn.lower())
+    for _ in range(500):
+        words = rng.sample(keys + list(app.SYMPTOM_SYNONYMS), 3)
+        texts.add(f"{words[0]} since 3 days and {words[1]} {words[2]}".lower())
+        texts.add("".join(rng.choice(string.ascii_lowercase + " ") for _ in range(rng.randint(1, 12))))
+    return sorted(texts)
+
+
+def test_matches_original_loop_without_synonyms():
+    matcher = SymptomMatcher(app.SYMPTOM_DATABASE)
+    for text in inputs():
+        assert matcher.match(text) == loop_match(text, app.SYMPTOM_DATABASE), text
+
+
+def test_synonyms_only_match_when_contained_in_text():
+    matcher = SymptomMatcher(app.SYMPTOM_DATABASE, app.SYMPTOM_SYNONYMS)
+    for text in inputs():
+        assert matcher.match(text) == loop_match(text, app.SYMPTOM_DATABASE, app.SYMPTOM_SYNONYMS), text
+
+
+def test_synonym_fragments_do_not_match():
+    matcher = SymptomMatcher({"fever": {}, "abdominal pain": {}},
+                             {"bukhar": "fever", "stomach ache": "abdominal pain"})
+    assert matcher.match("bukhar hai") == ["fever"]
+    assert matcher.match("ache") == []
+    assert matcher.match("t") == []
+    assert matcher.match("pain") == ["abdominal pain"]
+
+
+def test_keys_follow_database_order():
+    database = {"pain": {}, "chest pain": {}, "chest": {}}
+    assert SymptomMatcher(database).match("chest pain") == ["pain", "chest pain", "chest"]
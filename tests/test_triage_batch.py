@@ -0,0 +1,82 @@
+import json
+import random
+
+import pytest
+
+from app import SYMPTOM_DATABASE, analyze_symptoms
+
+UNKNOWN = ["xyz", "qwerty", "nothing in particular"]
+
+
+def batch(client, records, lang="en"):
+    response = client.post(f'/api/analyze-batch?lang={lang}', json=records)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def scalar(record, lang="en"):
+    return analyze_symptoms(record["symptoms"], record.get("age", 30), "", lang=lang)
+
+
+def random_record(rng):
+    pool = list(SYMPTOM_DATABASE) + UNKNOWN
+    return {"symptoms": rng.sample(pool, rng.randint(1, 5)), "age": rng.randint(0, 90)}
+
+
+@pytest.fixture
+def client():
+    from app import create_app
+    return create_app({'ADMISSION': False}).test_client()
+
+
+def test_chunk_without_matches_returns_no_conditions(client):
+    records = [{"symptoms": ["xyz"], "age": 30}, {"symptoms": ["qwerty"], "age": 2}]
+    results = batch(client, records)
+    assert [r["conditions"] for r in results] == [[], []]
+    for index, (record, result) in enumerate(zip(records, results)):
+        assert result == dict(scalar(record), index=index)
+
+
+@pytest.mark.parametrize("lang", ["en", "hi"])
+def test_random_records_match_scalar(client, lang):
+    rng = random.Random(11)
+    records = [random_record(rng) for _ in range(600)]
+    records += [{"symptoms": [rng.choice(UNKNOWN)], "age": rng.randint(0, 90)} for _ in range(300)]
+    for index, (record, result) in enumerate(zip(records, batch(client, records, lang))):
+        assert result == dict(scalar(record, lang), index=index), record
+
+
+def test_edit_during_traffic_is_picked_up(client):
+    import threading
+
+    import app
+    stop = threading.Event()
+
+    def hammer():
+        while not stop.is_set():
+            analyze_symptoms(["fever", "zzfoo itch"], 40, "")
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        SYMPTOM_DATABASE["zzfoo itch"] = {"conditions": ["Zzfoo"], "severity_weight": 3}
+        stop.set()
+        for t in threads:
+            t.join()
+        [result] = batch(client, [{"symptoms": ["zzfoo itch"], "age": 40}])
+        assert "zzfoo itch" in app.SYMPTOM_MATCHER.match("zzfoo itch")
+        assert [c["name"] for c in result["conditions"]] == ["Zzfoo"]
+        assert result == dict(scalar({"symptoms": ["zzfoo itch"], "age": 40}), index=0)
+    finally:
+        stop.set()
+        del SYMPTOM_DATABASE["zzfoo itch"]
+    analyze_symptoms(["fever"], 40, "")
+    assert "zzfoo itch" not in app.TRIAGE_ENGINE.key_index
+
+
+@pytest.mark.parametrize("lang", [["hi"], {"hi": 1}, 5, "xx"])
+def test_non_string_or_unknown_lang_falls_back_to_english(client, lang):
+    response = client.post('/api/analyze', json={"symptoms": ["fever"], "age": 30, "lang": lang})
+    assert response.status_code == 200
+    assert response.get_json() == scalar({"symptoms": ["fever"], "age": 30}, "en")